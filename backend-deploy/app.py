@@ -1,10 +1,20 @@
 """
 StyleWeave API - Main FastAPI application
 """
+import asyncio
 import os
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from routes import upload, mask, outfit, jobs
+from core.body_limit import BodySizeLimitMiddleware
+from core.image_cache import close_async_client
+from core.mongo import ensure_indexes
+from core import readiness
+from worker.inference.sam_segmentation import warm_up as warm_up_sam
+
+# Load and warm up SAM at startup; /ready stays 503 until it is done
+PRELOAD_SAM = os.getenv("PRELOAD_SAM", "false").lower() == "true"
 
 app = FastAPI(
     title="StyleWeave API",
@@ -19,6 +29,18 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Streamed previews carry their job id in a header
+    expose_headers=["X-Job-Id"],
+)
+
+# Reject oversized uploads before the multipart body is parsed
+# (1 MB of slack for form fields and multipart boundaries)
+app.add_middleware(
+    BodySizeLimitMiddleware,
+    limits={
+        "/v1/upload": upload.MAX_UPLOAD_BYTES + 1024 * 1024,
+        "/v1/upload/batch": upload.MAX_BATCH_UPLOAD_BYTES,
+    }
 )
 
 # Register routers
@@ -41,3 +63,48 @@ async def root():
 async def health():
     return {"status": "healthy"}
 
+
+@app.get("/ready")
+async def ready():
+    """
+    Readiness probe: 200 once preloaded models are warm, 503 before
+    
+    Unlike /health (process is up), this gates traffic to new or scaled-out
+    nodes until the first request will be fast.
+    """
+    is_ready, components = readiness.readiness()
+    return JSONResponse(
+        status_code=200 if is_ready else 503,
+        content={
+            "status": "ready" if is_ready else "warming_up",
+            "components": components
+        }
+    )
+
+
+# Background warm-up tasks (referenced so they are not garbage collected)
+_warmup_tasks = []
+
+if PRELOAD_SAM:
+    readiness.register("sam")
+
+
+@app.on_event("startup")
+async def startup():
+    try:
+        await ensure_indexes()
+    except Exception as e:
+        print(f"Failed to create MongoDB indexes: {e}")
+    
+    if PRELOAD_SAM:
+        # Warm up on the SAM executor in the background so /health answers
+        # while weights load
+        _warmup_tasks.append(asyncio.create_task(
+            readiness.warm_up("sam", lambda: mask.sam_executor.run(warm_up_sam))
+        ))
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    # Release pooled HTTP connections used for asset fetching
+    await close_async_client()
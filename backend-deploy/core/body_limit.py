@@ -0,0 +1,104 @@
+"""
+ASGI middleware that rejects oversized request bodies before they are parsed
+
+FastAPI parses multipart forms (spooling them to disk) before the handler
+runs, so a per-file size check in the route alone still lets a client push an
+arbitrarily large body at the server. This middleware answers 413 as soon as
+the declared Content-Length exceeds the limit for the path, and aborts bodies
+that turn out larger than declared (or are chunked) once they cross it.
+"""
+import json
+
+
+class BodySizeLimitMiddleware:
+    """
+    Enforce maximum request body sizes per path prefix
+    """
+
+    def __init__(self, app, limits: dict):
+        """
+        Args:
+            app: ASGI application
+            limits: Mapping of path prefix -> maximum body size in bytes
+        """
+        self.app = app
+        # Longest prefix wins
+        self.limits = sorted(limits.items(), key=lambda item: len(item[0]), reverse=True)
+
+    def _limit_for(self, path: str):
+        for prefix, limit in self.limits:
+            if path.startswith(prefix):
+                return limit
+        return None
+
+    async def _reject(self, send, limit: int):
+        body = json.dumps({
+            "detail": f"Request body exceeds maximum size of {limit // (1024 * 1024)} MB"
+        }).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("ascii")),
+                (b"connection", b"close"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        limit = self._limit_for(scope["path"])
+        if limit is None:
+            return await self.app(scope, receive, send)
+
+        for name, value in scope.get("headers", []):
+            if name == b"content-length":
+                try:
+                    if int(value) > limit:
+                        return await self._reject(send, limit)
+                except ValueError:
+                    pass
+
+        received = 0
+        overflowed = False
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received, overflowed
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    overflowed = True
+                    raise BodyTooLarge(limit)
+            return message
+
+        async def tracking_send(message):
+            nonlocal response_started
+            if overflowed:
+                # The app may have caught BodyTooLarge while parsing (FastAPI
+                # turns form errors into a 400); answer with the 413 instead
+                if message["type"] == "http.response.start" and not response_started:
+                    response_started = True
+                    await self._reject(send, limit)
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracking_send)
+        except BodyTooLarge:
+            if not response_started:
+                await self._reject(send, limit)
+
+
+class BodyTooLarge(Exception):
+    """Raised from receive() when a body crosses its size limit"""
+
+    def __init__(self, limit: int):
+        super().__init__(f"Request body exceeds {limit} bytes")
+        self.limit = limit
@@ -1,9 +1,22 @@
 """
 Cloudinary utilities for image upload and URL generation
+
+Uploads share one pooled HTTP connection manager sized to
+CLOUDINARY_MAX_CONCURRENCY, are retried with exponential backoff on transient
+failures, and can be awaited from async handlers via
+upload_file_to_cloudinary_async (backed by a bounded thread pool).
 """
+import asyncio
+import functools
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import cloudinary
+import cloudinary.exceptions
 import cloudinary.uploader
-import os
+import cloudinary.utils
 
 # Configure Cloudinary
 cloudinary.config(
@@ -13,38 +26,161 @@ cloudinary.config(
     secure=True
 )
 
+# Upload concurrency and retry configuration
+CLOUDINARY_MAX_CONCURRENCY = int(os.getenv("CLOUDINARY_MAX_CONCURRENCY", "8"))
+CLOUDINARY_MAX_RETRIES = int(os.getenv("CLOUDINARY_MAX_RETRIES", "3"))
+CLOUDINARY_RETRY_BACKOFF = float(os.getenv("CLOUDINARY_RETRY_BACKOFF", "0.5"))
+
+# Files larger than this are sent with chunked upload_large so the SDK never
+# holds more than one chunk in memory (Cloudinary minimum is 5 MB)
+CLOUDINARY_CHUNK_SIZE = int(os.getenv("CLOUDINARY_CHUNK_SIZE_MB", "6")) * 1024 * 1024
+
+# 4xx statuses that are still worth retrying (timeout, rate limiting)
+_RETRYABLE_CLIENT_STATUSES = (408, 420, 429)
+
+# HTTP status of the last Cloudinary API response on this thread
+_last_response = threading.local()
+
+# Limits in-flight uploads across sync callers (worker, threadpool)
+_upload_slots = threading.BoundedSemaphore(CLOUDINARY_MAX_CONCURRENCY)
+
+# Thread pool backing the async API
+_upload_pool = ThreadPoolExecutor(
+    max_workers=CLOUDINARY_MAX_CONCURRENCY,
+    thread_name_prefix="cloudinary"
+)
+
+
+class _StatusRecordingHttp:
+    """
+    Wraps the SDK's PoolManager and remembers each response's HTTP status
+
+    cloudinary.uploader.call_api raises a plain cloudinary.exceptions.Error
+    for every API error (and reports http_code 200 for 400/401/403/404/500
+    with return_error=True), so the status has to be taken from the response.
+    """
+
+    def __init__(self, http):
+        self.http = http
+
+    def request(self, *args, **kwargs):
+        response = self.http.request(*args, **kwargs)
+        _last_response.status = getattr(response, "status", None)
+        return response
+
+    def __getattr__(self, name):
+        return getattr(self.http, name)
+
+
+def _is_permanent_failure(status) -> bool:
+    """Client errors (4xx) other than timeouts / rate limiting fail on every retry"""
+    return status is not None and 400 <= status < 500 and status not in _RETRYABLE_CLIENT_STATUSES
+
+
+def _configure_connection_pool():
+    """
+    Size the SDK's shared connection pool for concurrent uploads
+
+    cloudinary.uploader keeps a single module-level PoolManager whose per-host
+    pool holds one connection by default, so concurrent uploads would open and
+    throw away a new TLS connection each time.
+    """
+    try:
+        options = dict(cloudinary.CERT_KWARGS, maxsize=CLOUDINARY_MAX_CONCURRENCY)
+        cloudinary.uploader._http = cloudinary.utils.get_http_connector(
+            cloudinary.config(), options
+        )
+    except Exception as e:
+        print(f"Using default Cloudinary connection pool: {e}")
+    cloudinary.uploader._http = _StatusRecordingHttp(cloudinary.uploader._http)
+
+
+_configure_connection_pool()
+
 
 def upload_file_to_cloudinary(
-    file_path: str,
+    file_path,
     folder: str = "styleweave/uploads",
     public_id: str = None,
-    overwrite: bool = True
+    overwrite: bool = True,
+    retries: int = CLOUDINARY_MAX_RETRIES,
+    filename: str = None
 ):
     """
     Upload a file to Cloudinary
     
+    Transient failures (rate limiting, 5xx, connection errors) are retried
+    with exponential backoff and jitter; other 4xx responses (invalid image,
+    bad credentials) fail immediately. Local files larger than
+    CLOUDINARY_CHUNK_SIZE are uploaded in chunks.
+    
     Args:
-        file_path: Local path to the file
+        file_path: Local path to the file, or a seekable file-like object
         folder: Cloudinary folder path
         public_id: Optional custom public ID
         overwrite: Whether to overwrite existing files
+        retries: Number of retries after the first attempt
+        filename: Original filename to use for the asset name (optional)
     
     Returns:
         Cloudinary upload response dict
     """
-    try:
-        res = cloudinary.uploader.upload(
-            file_path,
-            folder=folder,
-            public_id=public_id,
-            overwrite=overwrite,
-            resource_type="image",
-            use_filename=True,
-            unique_filename=True
-        )
-        return res
-    except Exception as e:
-        raise Exception(f"Cloudinary upload failed: {str(e)}")
+    options = dict(
+        folder=folder,
+        public_id=public_id,
+        overwrite=overwrite,
+        resource_type="image",
+        use_filename=True,
+        unique_filename=True
+    )
+    if filename:
+        options["filename"] = filename
+    
+    chunked = (
+        isinstance(file_path, str)
+        and os.path.exists(file_path)
+        and os.path.getsize(file_path) > CLOUDINARY_CHUNK_SIZE
+    )
+    
+    attempt = 0
+    while True:
+        _last_response.status = None
+        try:
+            if hasattr(file_path, "seek"):
+                file_path.seek(0)
+            with _upload_slots:
+                if chunked:
+                    return cloudinary.uploader.upload_large(
+                        file_path, chunk_size=CLOUDINARY_CHUNK_SIZE, **options
+                    )
+                return cloudinary.uploader.upload(file_path, **options)
+        except Exception as e:
+            if attempt >= retries or _is_permanent_failure(_last_response.status):
+                raise Exception(f"Cloudinary upload failed: {str(e)}")
+            delay = CLOUDINARY_RETRY_BACKOFF * (2 ** attempt)
+            time.sleep(delay + random.uniform(0, delay))
+            attempt += 1
+
+
+async def upload_file_to_cloudinary_async(file_path, **kwargs):
+    """
+    Upload a file to Cloudinary without blocking the event loop
+    
+    Runs upload_file_to_cloudinary on a dedicated pool of
+    CLOUDINARY_MAX_CONCURRENCY threads; extra uploads queue up.
+    
+    Args:
+        file_path: Local path to the file, or a seekable file-like object
+        **kwargs: Passed through to upload_file_to_cloudinary
+    
+    Returns:
+        Cloudinary upload response dict
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _upload_pool,
+        functools.partial(upload_file_to_cloudinary, file_path, **kwargs)
+    )
 
 
 def build_cloudinary_url(
@@ -0,0 +1,75 @@
+"""
+Bounded executors for running blocking / CPU-heavy work off the event loop
+
+A BoundedExecutor wraps a fixed-size thread pool with a cap on the number of
+queued jobs. When both the workers and the queue are full, `run` raises
+ExecutorBusy immediately instead of piling up work, so routes can answer with
+503 + Retry-After and the uvicorn event loop (health checks included) keeps
+serving other requests at normal latency.
+
+Threads are used rather than processes: torch and OpenCV release the GIL for
+the heavy parts, and models loaded once stay shared across jobs.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ExecutorBusy(Exception):
+    """Raised when a BoundedExecutor has no free worker or queue slot"""
+
+
+class BoundedExecutor:
+    """
+    Thread pool with a bounded queue, awaitable from async handlers
+    """
+
+    def __init__(self, name: str, max_workers: int = 1, max_queue: int = 4):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    @property
+    def pending(self) -> int:
+        """Number of jobs currently running or waiting"""
+        return self._pending
+
+    async def run(self, fn, *args, **kwargs):
+        """
+        Run `fn(*args, **kwargs)` on the pool and await its result
+
+        Raises:
+            ExecutorBusy: if all worker and queue slots are taken
+        """
+        if not self._slots.acquire(blocking=False):
+            raise ExecutorBusy(
+                f"{self.name} executor is full "
+                f"({self.max_workers} running, {self.max_queue} queued)"
+            )
+
+        with self._lock:
+            self._pending += 1
+
+        try:
+            future = self._pool.submit(fn, *args, **kwargs)
+        except BaseException:
+            self._release()
+            raise
+
+        # The slot is held until the pool thread finishes, even if the
+        # awaiting request is cancelled (e.g. the client disconnected)
+        future.add_done_callback(lambda _: self._release())
+        return await asyncio.wrap_future(future)
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+        self._slots.release()
+
+    def shutdown(self, wait: bool = True):
+        """Stop accepting work and release the pool threads"""
+        self._pool.shutdown(wait=wait)
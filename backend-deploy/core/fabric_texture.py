@@ -0,0 +1,203 @@
+"""
+Seamless fabric textures produced at upload time
+
+Fabric swatches are turned into a repeatable texture once, at ingest, instead
+of on every preview:
+
+    1. decode + EXIF-rotate, cap the long edge at WORKING_MAX_SIDE (the same
+       resolution previews used to tile) and trim to a multiple of the mip
+       block so every level halves exactly
+    2. make the swatch tile seamlessly with offset-and-blend: the swatch is
+       rolled by half its size, which moves its seams to the center, and the
+       original is blended back over the center so only the (continuous)
+       rolled edges remain at the borders
+    3. build a small mip pyramid by repeated 2x box downsampling
+
+All levels are packed into a single atlas image (level 0 on the left, the
+smaller levels stacked in a column to its right) and recorded in the upload
+document under "texture" - deliberately not under "variants", so
+select_variant() never hands the atlas to a consumer expecting the photo.
+
+The preview compositor samples the level closest to the requested swatch
+scale with modular indexing (see worker.inference.texture_apply.sample_tiled).
+"""
+import os
+import numpy as np
+from PIL import Image, ImageOps
+from core.variants import WORKING_MAX_SIDE
+
+# Width of the offset-and-blend band as a fraction of the tile size
+FABRIC_TILE_BLEND = float(os.getenv("FABRIC_TILE_BLEND", "0.15"))
+# Number of mip levels including the full-size tile
+FABRIC_MIP_LEVELS = int(os.getenv("FABRIC_MIP_LEVELS", "4"))
+FABRIC_TEXTURE_JPEG_QUALITY = int(os.getenv("FABRIC_TEXTURE_JPEG_QUALITY", "95"))
+
+# Atlas cells start on JPEG block boundaries so levels do not bleed into each other
+_ATLAS_ALIGN = 8
+
+
+def make_tileable(img: np.ndarray, blend: float = FABRIC_TILE_BLEND) -> np.ndarray:
+    """
+    Make an image tile without visible seams (offset-and-blend)
+
+    Args:
+        img: HxWxC uint8 image
+        blend: Blend band width as a fraction of each dimension (0 disables)
+
+    Returns:
+        HxWxC uint8 image whose left/right and top/bottom edges wrap smoothly
+    """
+    h, w = img.shape[:2]
+    blend = min(max(blend, 0.0), 0.45)
+    if blend == 0 or min(h, w) < 4:
+        return img
+
+    # Rolled copy: its borders are adjacent pixels of the original, so it
+    # wraps seamlessly, but the original's seams now cross its center
+    rolled = np.roll(img, (h // 2, w // 2), axis=(0, 1))
+
+    # Weight of the original: 1 over the center (hiding the rolled seams),
+    # ramping to 0 at the borders
+    def ramp(n):
+        edge = np.minimum(np.arange(n), np.arange(n)[::-1]).astype(np.float32)
+        return np.clip(edge / max(1.0, blend * n), 0.0, 1.0)
+
+    weight = np.minimum(ramp(h)[:, None], ramp(w)[None, :])[..., None]
+    tile = rolled.astype(np.float32)
+    tile += (img.astype(np.float32) - tile) * weight
+    return np.clip(tile + 0.5, 0, 255).astype(np.uint8)
+
+
+def build_mips(tile: np.ndarray, levels: int = FABRIC_MIP_LEVELS) -> list:
+    """
+    Mip pyramid of a tile by repeated 2x box downsampling
+
+    Stops early once a level would drop below 2 pixels on either side.
+
+    Args:
+        tile: HxWx3 uint8 tile
+        levels: Maximum number of levels including `tile` itself
+
+    Returns:
+        List of HxWx3 uint8 arrays, largest first
+    """
+    mips = [tile]
+    img = Image.fromarray(tile)
+    for _ in range(1, max(1, levels)):
+        if min(img.size) < 4:
+            break
+        img = img.reduce(2)
+        mips.append(np.asarray(img))
+    return mips
+
+
+def pack_atlas(mips: list):
+    """
+    Pack mip levels into one image
+
+    Args:
+        mips: Levels from build_mips, largest first
+
+    Returns:
+        (atlas HxWx3 uint8 array, list of [x, y, w, h] rects per level)
+    """
+    h0, w0 = mips[0].shape[:2]
+    rects = [[0, 0, w0, h0]]
+    col_x = -(-w0 // _ATLAS_ALIGN) * _ATLAS_ALIGN
+    y = 0
+    for level in mips[1:]:
+        h, w = level.shape[:2]
+        rects.append([col_x, y, w, h])
+        y += -(-h // _ATLAS_ALIGN) * _ATLAS_ALIGN
+
+    col_w = max((r[2] for r in rects[1:]), default=0)
+    atlas = np.zeros((max(h0, y), col_x + col_w if col_w else w0, 3), dtype=np.uint8)
+    for (x, y, w, h), level in zip(rects, mips):
+        atlas[y:y + h, x:x + w] = level
+    return atlas, rects
+
+
+def make_fabric_texture(src_path: str, out_dir: str = None) -> dict:
+    """
+    Decode a fabric swatch once and write its tileable mip atlas
+
+    Args:
+        src_path: Path to the original image
+        out_dir: Directory for the atlas file (defaults to src_path's)
+
+    Returns:
+        {"path", "width", "height", "tile": [w, h], "mips": [[x, y, w, h], ...]}
+    """
+    out_dir = out_dir or os.path.dirname(src_path)
+    base = os.path.splitext(os.path.basename(src_path))[0]
+
+    with Image.open(src_path) as img:
+        if img.format == "JPEG":
+            img.draft("RGB", (WORKING_MAX_SIDE, WORKING_MAX_SIDE))
+        img = ImageOps.exif_transpose(img)
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        img.thumbnail((WORKING_MAX_SIDE, WORKING_MAX_SIDE), Image.LANCZOS)
+
+        # Trim so that every mip level halves exactly (keeps the tile period exact)
+        block = 2 ** (max(1, FABRIC_MIP_LEVELS) - 1)
+        while block > 1 and min(img.size) < block * 2:
+            block //= 2
+        w, h = (img.width // block) * block, (img.height // block) * block
+        left, top = (img.width - w) // 2, (img.height - h) // 2
+        swatch = np.asarray(img.crop((left, top, left + w, top + h)))
+
+    tile = make_tileable(swatch)
+    atlas, rects = pack_atlas(build_mips(tile))
+
+    path = os.path.join(out_dir, f"{base}_texture.jpg")
+    Image.fromarray(atlas).save(
+        path, "JPEG", quality=FABRIC_TEXTURE_JPEG_QUALITY, subsampling=0, optimize=True
+    )
+
+    return {
+        "path": path,
+        "width": atlas.shape[1],
+        "height": atlas.shape[0],
+        "tile": [tile.shape[1], tile.shape[0]],
+        "mips": rects,
+    }
+
+
+def texture_source(upload_doc: dict):
+    """
+    Upload-like document for a fabric's texture atlas
+
+    Args:
+        upload_doc: Document from db.uploads
+
+    Returns:
+        Document usable with core.image_cache.load_upload_image (like
+        select_variant's result, variant "texture"), or None for uploads
+        stored before textures existed
+    """
+    texture = upload_doc.get("texture")
+    if not texture:
+        return None
+
+    return {
+        "_id": f"{upload_doc['_id']}-texture",
+        "type": upload_doc.get("type"),
+        "project_id": upload_doc.get("project_id"),
+        "cloudinary": texture,
+        "variant": "texture",
+    }
+
+
+def atlas_levels(atlas: np.ndarray, mips: list) -> list:
+    """
+    Mip levels of a decoded atlas as views (no copies)
+
+    Args:
+        atlas: Decoded atlas image
+        mips: [x, y, w, h] rects from the upload's "texture" entry
+
+    Returns:
+        List of arrays, largest first
+    """
+    return [atlas[y:y + h, x:x + w] for x, y, w, h in mips]
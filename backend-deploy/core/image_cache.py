@@ -0,0 +1,467 @@
+"""
+Content-addressed on-disk image cache shared by the API routes and the worker
+
+Downloaded images are stored once per node under IMAGE_CACHE_DIR:
+
+    blobs/<sha256>   raw image bytes, named by their content hash
+    keys/<key>       small text file holding the sha256 of the blob for a key
+
+Keys are derived from the upload `_id` and Cloudinary `public_id`, so repeated
+previews, mask generations and HD renders of the same upload hit the local
+copy instead of re-fetching the `secure_url`. Identical content uploaded under
+different ids shares a single blob.
+
+The cache is bounded by IMAGE_CACHE_MAX_MB; least recently used blobs (by
+mtime, refreshed on every hit) are evicted first. Writes go through a temp
+file + os.replace so API and worker processes can share the directory.
+
+On top of the file cache, DecodedImageCache keeps decoded NumPy arrays in
+process memory (bounded by DECODED_CACHE_MAX_MB), so repeated previews of the
+same upload skip the JPEG/PNG decode as well as the download.
+
+Async handlers should use the *_async helpers, which stream misses through a
+pooled httpx.AsyncClient and decode off the event loop.
+"""
+import asyncio
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import uuid
+from collections import OrderedDict
+import cv2
+import httpx
+import requests
+
+IMAGE_CACHE_DIR = os.getenv(
+    "IMAGE_CACHE_DIR",
+    os.path.join(tempfile.gettempdir(), "styleweave_cache")
+)
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_MB", "2048")) * 1024 * 1024
+DECODED_CACHE_MAX_BYTES = int(os.getenv("DECODED_CACHE_MAX_MB", "512")) * 1024 * 1024
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+HTTP_TIMEOUT_SECONDS = float(os.getenv("HTTP_TIMEOUT_SECONDS", "30"))
+
+_CHUNK_SIZE = 64 * 1024
+_KEY_SAFE = re.compile(r"[^A-Za-z0-9_.-]")
+
+# Shared HTTP session so repeated misses reuse connections to the CDN
+_session = requests.Session()
+_async_client = None
+
+# Global cache instances
+_image_cache = None
+_decoded_cache = None
+
+
+def cache_key_for_upload(upload_doc: dict) -> str:
+    """
+    Build the cache key for an upload document
+
+    Args:
+        upload_doc: Document from db.uploads
+
+    Returns:
+        Filesystem-safe key combining the upload id and Cloudinary public id
+    """
+    public_id = upload_doc.get("cloudinary", {}).get("public_id", "")
+    return _KEY_SAFE.sub("_", f"{upload_doc['_id']}-{public_id}")
+
+
+def cache_key_for_url(url: str) -> str:
+    """Build a cache key for a bare URL (no upload document available)"""
+    return "url-" + hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """
+    Get or create the pooled async HTTP client (cached globally)
+    """
+    global _async_client
+
+    if _async_client is None:
+        _async_client = httpx.AsyncClient(
+            timeout=HTTP_TIMEOUT_SECONDS,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_CONNECTIONS
+            )
+        )
+
+    return _async_client
+
+
+async def close_async_client():
+    """Close the pooled async HTTP client (call on application shutdown)"""
+    global _async_client
+
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+
+
+class _BlobWriter:
+    """Temp file in the blob directory that hashes content as it is written"""
+
+    def __init__(self, blob_dir: str):
+        self.hasher = hashlib.sha256()
+        self.tmp_path = os.path.join(blob_dir, f".tmp-{uuid.uuid4().hex}")
+        self._file = open(self.tmp_path, "wb")
+
+    def write(self, chunk: bytes):
+        if chunk:
+            self.hasher.update(chunk)
+            self._file.write(chunk)
+
+    def close(self) -> str:
+        self._file.close()
+        return self.hasher.hexdigest()
+
+    def abort(self):
+        self._file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+class ImageCache:
+    """
+    Size-bounded, content-addressed LRU cache of image files on local disk
+    """
+
+    def __init__(self, root: str = IMAGE_CACHE_DIR, max_bytes: int = IMAGE_CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.blob_dir = os.path.join(root, "blobs")
+        self.key_dir = os.path.join(root, "keys")
+        self._lock = threading.Lock()
+        os.makedirs(self.blob_dir, exist_ok=True)
+        os.makedirs(self.key_dir, exist_ok=True)
+
+    def _blob_path(self, content_hash: str) -> str:
+        return os.path.join(self.blob_dir, content_hash)
+
+    def _key_path(self, key: str) -> str:
+        return os.path.join(self.key_dir, _KEY_SAFE.sub("_", key))
+
+    def _touch(self, path: str) -> bool:
+        """Mark a blob as recently used; returns False if it was evicted"""
+        try:
+            os.utime(path, None)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def lookup(self, key: str = None, content_hash: str = None):
+        """
+        Look up a cached image by key or content hash
+
+        Args:
+            key: Cache key (see cache_key_for_upload)
+            content_hash: Known sha256 of the content, if any
+
+        Returns:
+            Local path of the cached blob, or None on a miss
+        """
+        if content_hash:
+            path = self._blob_path(content_hash)
+            if self._touch(path):
+                return path
+
+        if key:
+            try:
+                with open(self._key_path(key), "r") as f:
+                    cached_hash = f.read().strip()
+            except FileNotFoundError:
+                return None
+            path = self._blob_path(cached_hash)
+            if self._touch(path):
+                return path
+
+        return None
+
+    def put_stream(self, key: str, chunks) -> str:
+        """
+        Store an image from an iterable of byte chunks
+
+        Args:
+            key: Cache key to associate with the content
+            chunks: Iterable of bytes
+
+        Returns:
+            Local path of the stored blob
+        """
+        writer = _BlobWriter(self.blob_dir)
+        try:
+            for chunk in chunks:
+                writer.write(chunk)
+        except Exception:
+            writer.abort()
+            raise
+
+        return self._commit(key, writer)
+
+    def _commit(self, key: str, writer: _BlobWriter) -> str:
+        """Move a finished writer into place under its content hash and map `key` to it"""
+        try:
+            content_hash = writer.close()
+            blob_path = self._blob_path(content_hash)
+            if os.path.exists(blob_path):
+                os.remove(writer.tmp_path)
+                self._touch(blob_path)
+            else:
+                os.replace(writer.tmp_path, blob_path)
+        except Exception:
+            writer.abort()
+            raise
+
+        if key:
+            key_tmp = os.path.join(self.key_dir, f".tmp-{uuid.uuid4().hex}")
+            with open(key_tmp, "w") as f:
+                f.write(content_hash)
+            os.replace(key_tmp, self._key_path(key))
+
+        self.evict()
+        return blob_path
+
+    def fetch(self, url: str, key: str = None, content_hash: str = None) -> str:
+        """
+        Return a local path for the image at `url`, downloading it on a miss
+
+        Args:
+            url: Remote URL (Cloudinary secure_url)
+            key: Cache key; defaults to a hash of the URL
+            content_hash: Known sha256 of the content, if any
+
+        Returns:
+            Local path of the cached image
+        """
+        key = key or cache_key_for_url(url)
+
+        path = self.lookup(key, content_hash)
+        if path:
+            return path
+
+        response = _session.get(url, stream=True)
+        response.raise_for_status()
+        try:
+            return self.put_stream(key, response.iter_content(chunk_size=_CHUNK_SIZE))
+        finally:
+            response.close()
+
+    async def fetch_async(self, url: str, key: str = None, content_hash: str = None) -> str:
+        """
+        Async variant of fetch() that streams misses through the pooled httpx client
+
+        Args:
+            url: Remote URL (Cloudinary secure_url)
+            key: Cache key; defaults to a hash of the URL
+            content_hash: Known sha256 of the content, if any
+
+        Returns:
+            Local path of the cached image
+        """
+        key = key or cache_key_for_url(url)
+
+        path = self.lookup(key, content_hash)
+        if path:
+            return path
+
+        writer = _BlobWriter(self.blob_dir)
+        try:
+            async with get_async_client().stream("GET", url) as response:
+                response.raise_for_status()
+                async for chunk in response.aiter_bytes(_CHUNK_SIZE):
+                    writer.write(chunk)
+        except Exception:
+            writer.abort()
+            raise
+
+        return await asyncio.to_thread(self._commit, key, writer)
+
+    def evict(self):
+        """Evict least recently used blobs until the cache fits its budget"""
+        with self._lock:
+            entries = []
+            total = 0
+            for entry in os.scandir(self.blob_dir):
+                if entry.name.startswith(".tmp-"):
+                    continue
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, entry.path))
+                total += st.st_size
+
+            if total <= self.max_bytes:
+                return
+
+            # Evict down to 90% of the budget so we don't rescan on every put
+            target = int(self.max_bytes * 0.9)
+            entries.sort()
+            for _, size, path in entries:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except FileNotFoundError:
+                    pass
+
+
+class DecodedImageCache:
+    """
+    Byte-budgeted in-memory LRU of decoded image arrays
+
+    Cached arrays are marked read-only; callers must copy before modifying.
+    """
+
+    def __init__(self, max_bytes: int = DECODED_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached array for `key` (marking it recently used), or None"""
+        with self._lock:
+            arr = self._entries.get(key)
+            if arr is not None:
+                self._entries.move_to_end(key)
+            return arr
+
+    def put(self, key, arr):
+        """Insert an array, evicting least recently used entries to fit the budget"""
+        arr.flags.writeable = False
+        if arr.nbytes > self.max_bytes:
+            return arr
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old.nbytes
+            self._entries[key] = arr
+            self.current_bytes += arr.nbytes
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= evicted.nbytes
+
+        return arr
+
+    def clear(self):
+        """Drop all cached arrays"""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+
+def get_image_cache() -> ImageCache:
+    """
+    Get or create the node-local image cache (cached globally)
+    """
+    global _image_cache
+
+    if _image_cache is None:
+        _image_cache = ImageCache()
+
+    return _image_cache
+
+
+def fetch_upload(upload_doc: dict) -> str:
+    """
+    Return a local path for an upload's image, downloading it on a miss
+
+    Args:
+        upload_doc: Document from db.uploads
+
+    Returns:
+        Local path of the cached image
+    """
+    return get_image_cache().fetch(
+        upload_doc["cloudinary"]["secure_url"],
+        key=cache_key_for_upload(upload_doc),
+        content_hash=upload_doc.get("content_hash")
+    )
+
+
+def get_decoded_cache() -> DecodedImageCache:
+    """
+    Get or create the in-process decoded image cache (cached globally)
+    """
+    global _decoded_cache
+
+    if _decoded_cache is None:
+        _decoded_cache = DecodedImageCache()
+
+    return _decoded_cache
+
+
+def load_upload_image(upload_doc: dict, flags: int = cv2.IMREAD_COLOR):
+    """
+    Return the decoded image for an upload, using the in-memory and disk caches
+
+    Args:
+        upload_doc: Document from db.uploads
+        flags: cv2.imread flags (e.g. cv2.IMREAD_GRAYSCALE for masks)
+
+    Returns:
+        Read-only NumPy array (BGR or grayscale)
+    """
+    decoded = get_decoded_cache()
+    key = (cache_key_for_upload(upload_doc), flags)
+
+    arr = decoded.get(key)
+    if arr is not None:
+        return arr
+
+    path = fetch_upload(upload_doc)
+    arr = cv2.imread(path, flags)
+    if arr is None:
+        raise ValueError(f"Failed to decode image for upload {upload_doc['_id']}")
+
+    return decoded.put(key, arr)
+
+
+async def fetch_upload_async(upload_doc: dict) -> str:
+    """
+    Async variant of fetch_upload()
+
+    Args:
+        upload_doc: Document from db.uploads
+
+    Returns:
+        Local path of the cached image
+    """
+    return await get_image_cache().fetch_async(
+        upload_doc["cloudinary"]["secure_url"],
+        key=cache_key_for_upload(upload_doc),
+        content_hash=upload_doc.get("content_hash")
+    )
+
+
+async def load_upload_image_async(upload_doc: dict, flags: int = cv2.IMREAD_COLOR):
+    """
+    Async variant of load_upload_image(); downloads and decodes off the event loop
+
+    Args:
+        upload_doc: Document from db.uploads
+        flags: cv2.imread flags (e.g. cv2.IMREAD_GRAYSCALE for masks)
+
+    Returns:
+        Read-only NumPy array (BGR or grayscale)
+    """
+    decoded = get_decoded_cache()
+    key = (cache_key_for_upload(upload_doc), flags)
+
+    arr = decoded.get(key)
+    if arr is not None:
+        return arr
+
+    path = await fetch_upload_async(upload_doc)
+    arr = await asyncio.to_thread(cv2.imread, path, flags)
+    if arr is None:
+        raise ValueError(f"Failed to decode image for upload {upload_doc['_id']}")
+
+    return decoded.put(key, arr)
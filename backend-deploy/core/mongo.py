@@ -16,3 +16,14 @@ db = client.styleweave
 # db.uploads - stores uploaded images metadata
 # db.jobs - stores job status and results
 
+
+async def ensure_indexes():
+    """
+    Create the indexes the API relies on (idempotent, run at startup)
+    """
+    # Upload deduplication looks up existing assets by content hash and type
+    await db.uploads.create_index([("content_hash", 1), ("type", 1)])
+    
+    # HD workers claim queued jobs with matching sampling settings, oldest first
+    await db.jobs.create_index([("type", 1), ("status", 1), ("batch_key", 1), ("created_at", 1)])
+
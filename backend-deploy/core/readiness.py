@@ -0,0 +1,63 @@
+"""
+Readiness tracking for the /ready endpoint
+
+/health only says the process is up. /ready says the node is actually fast:
+every component registered here (e.g. a preloaded, warmed-up model) must have
+finished warming up before load balancers should send it traffic.
+"""
+import time
+
+# Component name -> {"status": "pending"|"loading"|"ready"|"failed", ...}
+_components = {}
+
+
+def register(name: str):
+    """Declare a component that must be ready before the node is"""
+    _components[name] = {"status": "pending"}
+
+
+def mark_loading(name: str):
+    _components[name] = {"status": "loading", "started_at": time.time()}
+
+
+def mark_ready(name: str):
+    started = _components.get(name, {}).get("started_at", time.time())
+    _components[name] = {"status": "ready", "seconds": round(time.time() - started, 2)}
+
+
+def mark_failed(name: str, error: str):
+    _components[name] = {"status": "failed", "error": error}
+
+
+def readiness():
+    """
+    Current readiness of this node
+
+    Returns:
+        (ready, components) where ready is True once every registered
+        component is ready
+    """
+    components = {
+        name: {key: value for key, value in state.items() if key != "started_at"}
+        for name, state in _components.items()
+    }
+    ready = all(state["status"] == "ready" for state in components.values())
+    return ready, components
+
+
+async def warm_up(name: str, run):
+    """
+    Track an async warm-up step
+
+    Args:
+        name: Registered component name
+        run: Zero-argument coroutine function doing the load + warm-up
+    """
+    mark_loading(name)
+    try:
+        await run()
+        mark_ready(name)
+        print(f"{name} warmed up in {_components[name]['seconds']}s")
+    except Exception as e:
+        mark_failed(name, str(e))
+        print(f"{name} warm-up failed: {e}")
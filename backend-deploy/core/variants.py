@@ -0,0 +1,132 @@
+"""
+Normalized image derivatives produced at upload time
+
+Camera photos are decoded once at ingest, EXIF-rotated, and stored as
+downscaled variants next to the original:
+
+    working   long edge capped at WORKING_MAX_SIDE (preview compositing)
+    preview   long edge capped at PREVIEW_MAX_SIDE (SAM, SD inpainting)
+
+Variants are recorded in the upload document under "variants". Consumers call
+select_variant() with the resolution they actually need and get an
+upload-like document for the smallest stored image that satisfies it, so the
+hot paths never decode full-resolution originals.
+"""
+import os
+from PIL import Image, ImageOps
+
+WORKING_MAX_SIDE = int(os.getenv("WORKING_MAX_SIDE", "2048"))
+PREVIEW_MAX_SIDE = int(os.getenv("PREVIEW_MAX_SIDE", "1024"))
+VARIANT_JPEG_QUALITY = int(os.getenv("VARIANT_JPEG_QUALITY", "90"))
+
+# Variant name -> maximum long edge, largest first
+VARIANT_SIZES = {
+    "working": WORKING_MAX_SIDE,
+    "preview": PREVIEW_MAX_SIDE,
+}
+
+
+def make_variants(src_path: str, out_dir: str = None) -> dict:
+    """
+    Decode an image once and write its normalized, downscaled variants
+
+    A variant is only produced when it differs from the original, i.e. when
+    the image is larger than the variant size or needs EXIF rotation.
+
+    Args:
+        src_path: Path to the original image
+        out_dir: Directory for the variant files (defaults to src_path's)
+
+    Returns:
+        dict of variant name -> {"path", "width", "height"}
+    """
+    out_dir = out_dir or os.path.dirname(src_path)
+    base = os.path.splitext(os.path.basename(src_path))[0]
+    largest = max(VARIANT_SIZES.values())
+
+    with Image.open(src_path) as img:
+        orig_w, orig_h = img.size
+        orientation = img.getexif().get(0x0112, 1)
+
+        # Let the JPEG decoder downscale by a power of two while decoding
+        if img.format == "JPEG":
+            img.draft("RGB", (largest, largest))
+
+        img = ImageOps.exif_transpose(img)
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+
+        variants = {}
+        for name, max_side in VARIANT_SIZES.items():
+            if max(orig_w, orig_h) <= max_side and orientation == 1:
+                continue
+
+            variant = img.copy()
+            variant.thumbnail((max_side, max_side), Image.LANCZOS)
+
+            path = os.path.join(out_dir, f"{base}_{name}.jpg")
+            variant.save(path, "JPEG", quality=VARIANT_JPEG_QUALITY, optimize=True)
+            variants[name] = {
+                "path": path,
+                "width": variant.width,
+                "height": variant.height,
+            }
+
+            # Downscale the next (smaller) variant from this one
+            img = variant
+
+    return variants
+
+
+def _long_side(entry: dict):
+    width, height = entry.get("width"), entry.get("height")
+    if not width or not height:
+        return None
+    return max(width, height)
+
+
+def select_variant(upload_doc: dict, min_side: int = 0) -> dict:
+    """
+    Pick the smallest stored image whose long edge is at least `min_side`
+
+    Falls back to the largest available image when none is big enough.
+    Normalized variants win ties against the original.
+
+    Args:
+        upload_doc: Document from db.uploads
+        min_side: Minimum long edge the consumer needs
+
+    Returns:
+        Upload-like document (with "_id" and "cloudinary") usable with
+        core.image_cache.fetch_upload / load_upload_image, plus "variant"
+        naming the chosen image
+    """
+    original = upload_doc["cloudinary"]
+    candidates = [
+        (name, entry) for name, entry in upload_doc.get("variants", {}).items()
+    ]
+    # An original with unknown size is treated as the largest option
+    candidates.append(("original", original))
+
+    def size_key(candidate):
+        name, entry = candidate
+        side = _long_side(entry)
+        return (float("inf") if side is None else side, name == "original")
+
+    candidates.sort(key=size_key)
+    large_enough = [c for c in candidates if size_key(c)[0] >= min_side]
+    if not large_enough:
+        largest = size_key(candidates[-1])[0]
+        large_enough = [c for c in candidates if size_key(c)[0] == largest]
+    name, entry = large_enough[0]
+
+    if name == "original":
+        return dict(upload_doc, variant="original")
+
+    return {
+        "_id": f"{upload_doc['_id']}-{name}",
+        "type": upload_doc.get("type"),
+        "project_id": upload_doc.get("project_id"),
+        "cloudinary": entry,
+        "variant": name,
+    }
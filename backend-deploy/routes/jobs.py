@@ -1,13 +1,28 @@
 """
 Job status route - check status of background jobs
 """
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from core.mongo import db
 from bson import ObjectId
 from typing import Optional
+import asyncio
+import json
+import os
+import time
 
 router = APIRouter()
 
+# Server-sent job events: poll interval, overall limit, keep-alive interval
+JOB_EVENTS_POLL_SECONDS = float(os.getenv("JOB_EVENTS_POLL_SECONDS", "0.25"))
+JOB_EVENTS_TIMEOUT_SECONDS = float(os.getenv("JOB_EVENTS_TIMEOUT_SECONDS", "600"))
+JOB_EVENTS_KEEPALIVE_SECONDS = 15
+# How long a job may be missing before giving up (streamed previews are recorded
+# by a background task just after their response is sent)
+JOB_EVENTS_MISSING_SECONDS = 10
+
+JOB_FINAL_STATUSES = ("done", "failed", "superseded")
+
 
 @router.get("/job/{job_id}")
 async def get_job(job_id: str):
@@ -30,6 +45,64 @@ async def get_job(job_id: str):
     return job
 
 
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+@router.get("/job/{job_id}/events")
+async def job_events(job_id: str, request: Request):
+    """
+    Stream job updates as server-sent events
+    
+    Emits a "job" event with the full job document whenever its status or
+    progress changes, and closes after the job is done, failed or superseded
+    (a newer progressive preview replaced it). An "error" event is sent if
+    the job never appears or the stream times out.
+    
+    - **job_id**: Job identifier (e.g. X-Job-Id of a streamed / progressive preview)
+    """
+    try:
+        oid = ObjectId(job_id)
+    except:
+        raise HTTPException(status_code=400, detail="Invalid job_id format")
+    
+    async def events():
+        started = last_sent = time.monotonic()
+        last_state = None
+        
+        while not await request.is_disconnected():
+            now = time.monotonic()
+            if now - started > JOB_EVENTS_TIMEOUT_SECONDS:
+                yield _sse("error", {"detail": "Timed out waiting for job"})
+                return
+            
+            job = await db.jobs.find_one({"_id": oid})
+            if job is None and now - started > JOB_EVENTS_MISSING_SECONDS:
+                yield _sse("error", {"detail": "Job not found"})
+                return
+            
+            if job is not None:
+                state = (job.get("status"), job.get("progress"))
+                if state != last_state:
+                    job["_id"] = str(job["_id"])
+                    yield _sse("job", job)
+                    last_state, last_sent = state, now
+                    if job.get("status") in JOB_FINAL_STATUSES:
+                        return
+            
+            if now - last_sent > JOB_EVENTS_KEEPALIVE_SECONDS:
+                yield ": keep-alive\n\n"
+                last_sent = now
+            
+            await asyncio.sleep(JOB_EVENTS_POLL_SECONDS)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.get("/jobs")
 async def list_jobs(
     project_id: Optional[str] = None,
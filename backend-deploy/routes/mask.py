@@ -1,32 +1,81 @@
 """
-Mask generation route - generates segmentation masks using SAM/SlimSAM
+Mask routes - generate segmentation masks using SAM/SlimSAM and refine them
+with click points
 """
-from fastapi import APIRouter, HTTPException, Body
+from fastapi import APIRouter, HTTPException, Body, BackgroundTasks
 from core.mongo import db
-from core.cloudinary_utils import upload_file_to_cloudinary
+from core.cloudinary_utils import upload_file_to_cloudinary_async
+from core.executor import BoundedExecutor, ExecutorBusy
+from core.image_cache import cache_key_for_upload, load_upload_image_async
+from core.variants import select_variant, PREVIEW_MAX_SIDE
 from bson import ObjectId
 from datetime import datetime
+import base64
+import io
 import os
 import sys
-from typing import Optional
+import cv2
+from typing import List, Optional
 
 # Import worker inference (now in same directory)
-from worker.inference.sam_segmentation import run_sam_on_image_from_url
+from worker.inference.sam_segmentation import (
+    run_sam_on_image_from_url,
+    refine_mask,
+    get_mask_logits,
+    remember_mask_logits,
+    SAM_MASK_MODE,
+)
+from worker.inference.sam_models import SAM_MODELS, SAM_QUALITY, resolve_sam_model
+from worker.inference.sam_prompts import normalize_prompts
 
 router = APIRouter()
 
+# Dedicated pool for SAM so segmentation never runs on the event loop.
+# When all workers are busy and the queue is full, requests get a 503.
+sam_executor = BoundedExecutor(
+    "sam",
+    max_workers=int(os.getenv("SAM_EXECUTOR_WORKERS", "1")),
+    max_queue=int(os.getenv("SAM_EXECUTOR_QUEUE", "4"))
+)
+SAM_RETRY_AFTER_SECONDS = os.getenv("SAM_RETRY_AFTER_SECONDS", "5")
+
+# Refined masks returned to the client but not yet persisted, by id, so a
+# follow-up refinement does not have to wait for the Cloudinary upload
+_pending_masks = {}
+
 
 @router.post("/mask/generate")
 async def generate_mask(
     upload_id: str = Body(..., embed=True),
-    auto_refine: bool = Body(True, embed=True)
+    auto_refine: bool = Body(True, embed=True),
+    quality: Optional[str] = Body(None, embed=True),
+    mode: Optional[str] = Body(None, embed=True),
+    prompts: Optional[dict] = Body(None, embed=True)
 ):
     """
     Generate segmentation masks for top and bottom regions from a model image
     
     - **upload_id**: ID of the model image upload
     - **auto_refine**: Whether to apply auto-refinement to masks
+    - **quality**: "fast", "balanced" or "best" SAM model (default: SAM_MODEL_TYPE)
+    - **mode**: "guided" (per-garment box/point prompts) or "auto" (promptless)
+    - **prompts**: Optional per-garment prompts in normalized [0, 1] coordinates,
+      e.g. {"top": {"box": [x0, y0, x1, y1], "points": [[x, y]], "labels": [1]}}
     """
+    if quality is not None and quality not in SAM_QUALITY:
+        raise HTTPException(
+            status_code=400,
+            detail=f"quality must be one of {sorted(SAM_QUALITY)}"
+        )
+    sam_model = resolve_sam_model(quality)
+    
+    if mode is not None and mode not in ("guided", "auto"):
+        raise HTTPException(status_code=400, detail="mode must be 'guided' or 'auto'")
+    try:
+        garment_prompts = normalize_prompts(prompts) if prompts else None
+    except (ValueError, AttributeError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid prompts: {str(e)}")
+    
     # Fetch upload document
     try:
         upload_doc = await db.uploads.find_one({"_id": ObjectId(upload_id)})
@@ -42,12 +91,22 @@ async def generate_mask(
             detail="Upload must be of type 'model'"
         )
     
-    img_url = upload_doc["cloudinary"]["secure_url"]
+    # SAM resizes to a 1024 long edge internally, so the preview variant suffices
+    source = select_variant(upload_doc, PREVIEW_MAX_SIDE)
+    img_url = source["cloudinary"]["secure_url"]
     
     try:
-        # Run segmentation (downloads image inside function)
+        # Run segmentation on the SAM executor (downloads image inside function)
         # Returns: {"top": "/tmp/top_mask.png", "bottom": "/tmp/bottom_mask.png"}
-        masks = run_sam_on_image_from_url(img_url, auto_refine=auto_refine)
+        masks = await sam_executor.run(
+            run_sam_on_image_from_url,
+            img_url,
+            auto_refine=auto_refine,
+            cache_key=cache_key_for_upload(source),
+            quality=quality,
+            mode=mode,
+            prompts=garment_prompts
+        )
         
         responses = []
         
@@ -58,7 +117,7 @@ async def generate_mask(
             
             # Upload mask to Cloudinary
             folder = f"{os.getenv('CLOUDINARY_FOLDER', 'styleweave')}/masks"
-            res = upload_file_to_cloudinary(local_path, folder=folder)
+            res = await upload_file_to_cloudinary_async(local_path, folder=folder)
             
             # Create mask upload document
             doc = {
@@ -72,7 +131,10 @@ async def generate_mask(
                 },
                 "meta": {
                     "source_upload": upload_id,
-                    "auto_refine": auto_refine
+                    "source_variant": source["variant"],
+                    "auto_refine": auto_refine,
+                    "sam_model": sam_model,
+                    "mode": "guided" if garment_prompts else (mode or SAM_MASK_MODE)
                 },
                 "created_at": datetime.utcnow()
             }
@@ -96,11 +158,167 @@ async def generate_mask(
                 detail="Failed to generate masks"
             )
         
-        return {"masks": responses}
+        return {"masks": responses, "sam_model": sam_model}
     
+    except ExecutorBusy:
+        raise HTTPException(
+            status_code=503,
+            detail="Mask generation is at capacity, please retry shortly",
+            headers={"Retry-After": SAM_RETRY_AFTER_SECONDS}
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Mask generation failed: {str(e)}"
         )
 
+
+@router.post("/mask/refine")
+async def refine_mask_route(
+    background_tasks: BackgroundTasks,
+    mask_id: str = Body(..., embed=True),
+    points: List[List[float]] = Body(..., embed=True),
+    labels: Optional[List[int]] = Body(None, embed=True)
+):
+    """
+    Refine an existing mask with positive/negative click points
+    
+    Only the SAM prompt decoder runs, against the cached image embedding of
+    the source upload, with the previous mask as mask_input. The refined mask
+    is returned inline as a PNG data URL and persisted in the background;
+    refine it again by passing the returned id.
+    
+    - **mask_id**: ID of the mask upload (or of a previous refinement)
+    - **points**: All click points so far, normalized [0, 1] image coordinates
+    - **labels**: 1 = add to mask, 0 = remove (defaults to all 1)
+    """
+    mask_doc = _pending_masks.get(mask_id)
+    if mask_doc is None:
+        try:
+            mask_doc = await db.uploads.find_one({"_id": ObjectId(mask_id)})
+        except:
+            raise HTTPException(status_code=400, detail="Invalid mask_id format")
+    
+    if not mask_doc:
+        raise HTTPException(status_code=404, detail="Mask not found")
+    
+    garment = mask_doc.get("type", "")[len("mask_"):]
+    if not mask_doc.get("type", "").startswith("mask_") or garment not in ("top", "bottom"):
+        raise HTTPException(status_code=400, detail="Upload must be a top or bottom mask")
+    
+    try:
+        prompt = normalize_prompts({garment: {"points": points, "labels": labels}})[garment]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid points: {str(e)}")
+    
+    meta = mask_doc.get("meta", {})
+    try:
+        upload_doc = await db.uploads.find_one({"_id": ObjectId(meta.get("source_upload"))})
+    except:
+        upload_doc = None
+    if not upload_doc:
+        raise HTTPException(status_code=404, detail="Source upload of the mask not found")
+    
+    sam_model = meta.get("sam_model")
+    if sam_model not in SAM_MODELS:
+        sam_model = resolve_sam_model()
+    
+    source = select_variant(upload_doc, PREVIEW_MAX_SIDE)
+    
+    mask_logits = get_mask_logits(mask_id)
+    if mask_logits is None and "cloudinary" not in mask_doc:
+        raise HTTPException(
+            status_code=409,
+            detail="Mask is still being saved, please retry shortly",
+            headers={"Retry-After": "1"}
+        )
+    
+    try:
+        # Prefer the decoder logits of the mask; otherwise rebuild them from its image
+        previous_mask = None
+        if mask_logits is None:
+            previous_mask = await load_upload_image_async(mask_doc, cv2.IMREAD_GRAYSCALE)
+        
+        mask, logits = await sam_executor.run(
+            refine_mask,
+            source["cloudinary"]["secure_url"],
+            cache_key_for_upload(source),
+            prompt["points"],
+            prompt["labels"],
+            mask_logits=mask_logits,
+            previous_mask=previous_mask,
+            model=sam_model
+        )
+    except ExecutorBusy:
+        raise HTTPException(
+            status_code=503,
+            detail="Mask generation is at capacity, please retry shortly",
+            headers={"Retry-After": SAM_RETRY_AFTER_SECONDS}
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Mask refinement failed: {str(e)}"
+        )
+    
+    ok, png = cv2.imencode(".png", mask)
+    if not ok:
+        raise HTTPException(status_code=500, detail="Failed to encode refined mask")
+    png = png.tobytes()
+    
+    new_id = ObjectId()
+    doc = {
+        "_id": new_id,
+        "project_id": mask_doc.get("project_id"),
+        "type": mask_doc["type"],
+        "meta": {
+            "source_upload": meta.get("source_upload"),
+            "source_variant": source["variant"],
+            "refined_from": mask_id,
+            "sam_model": sam_model,
+            "points": prompt["points"].tolist(),
+            "labels": prompt["labels"].tolist()
+        },
+        "created_at": datetime.utcnow()
+    }
+    remember_mask_logits(str(new_id), logits)
+    _pending_masks[str(new_id)] = doc
+    background_tasks.add_task(_persist_refined_mask, doc, png)
+    
+    return {
+        "mask": {
+            "id": str(new_id),
+            "type": garment,
+            "width": int(mask.shape[1]),
+            "height": int(mask.shape[0]),
+            "data_url": "data:image/png;base64," + base64.b64encode(png).decode("ascii")
+        },
+        "sam_model": sam_model
+    }
+
+
+async def _persist_refined_mask(doc: dict, png: bytes):
+    """
+    Upload a refined mask to Cloudinary and record its upload document
+    
+    Args:
+        doc: Upload document without the "cloudinary" field
+        png: Encoded mask
+    """
+    mask_id = str(doc["_id"])
+    try:
+        folder = f"{os.getenv('CLOUDINARY_FOLDER', 'styleweave')}/masks"
+        res = await upload_file_to_cloudinary_async(io.BytesIO(png), folder=folder)
+        doc["cloudinary"] = {
+            "public_id": res["public_id"],
+            "secure_url": res["secure_url"],
+            "width": res.get("width"),
+            "height": res.get("height"),
+        }
+        await db.uploads.insert_one(doc)
+    except Exception as e:
+        print(f"Failed to persist refined mask {mask_id}: {e}")
+    finally:
+        _pending_masks.pop(mask_id, None)
@@ -1,131 +1,212 @@
 """
 Outfit routes - preview and HD generation
 """
-from fastapi import APIRouter, HTTPException, Body
+from fastapi import APIRouter, HTTPException, Body, BackgroundTasks, Response
+from fastapi.concurrency import run_in_threadpool
 from core.mongo import db
-from core.cloudinary_utils import upload_file_to_cloudinary
+from core.cloudinary_utils import upload_file_to_cloudinary_async
+from core.image_cache import load_upload_image_async
+from core.variants import select_variant, WORKING_MAX_SIDE
+from core.fabric_texture import texture_source, atlas_levels
 from datetime import datetime
 from bson import ObjectId
+from bson.errors import InvalidId
+import asyncio
+import io
 import os
 import sys
-import uuid
-import requests
+import cv2
 from typing import Optional
 
 # Import worker tasks (now in same directory)
-from worker.tasks import generate_hd_task
-from worker.inference.texture_apply import apply_texture_preview
+from worker.tasks import generate_hd_task, hd_batch_key
+from worker.inference.texture_apply import apply_texture_layers, apply_texture_layers_low_res
+from worker.inference.presets import HD_PRESETS, DEFAULT_HD_PRESET
 
 router = APIRouter()
 
+# In-memory preview encoding
+PREVIEW_JPEG_QUALITY = int(os.getenv("PREVIEW_JPEG_QUALITY", "90"))
+PREVIEW_WEBP_QUALITY = int(os.getenv("PREVIEW_WEBP_QUALITY", "85"))
+# Long edge of the immediate composite in progressive mode
+PREVIEW_PROGRESSIVE_SIDE = int(os.getenv("PREVIEW_PROGRESSIVE_SIDE", "512"))
+PREVIEW_FORMATS = {
+    "jpeg": (".jpg", "image/jpeg", [cv2.IMWRITE_JPEG_QUALITY, PREVIEW_JPEG_QUALITY]),
+    "webp": (".webp", "image/webp", [cv2.IMWRITE_WEBP_QUALITY, PREVIEW_WEBP_QUALITY]),
+}
 
-def download_file(url: str, dest_path: str):
-    """Download a file from URL to local path"""
-    response = requests.get(url, stream=True)
-    response.raise_for_status()
-    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
-    with open(dest_path, "wb") as f:
-        for chunk in response.iter_content(chunk_size=8192):
-            f.write(chunk)
+# Latest progressive request per (model, top fabric, bottom fabric) -> job id;
+# background refinements of older requests (e.g. while a slider is dragged)
+# are skipped. Only touched from the event loop.
+_latest_refinements = {}
+
+# Label used in 404 messages and decode flags for each asset field
+_ASSET_LABELS = {
+    "model_upload_id": "Model upload",
+    "top_fabric_upload_id": "Top fabric upload",
+    "bottom_fabric_upload_id": "Bottom fabric upload",
+    "mask_top_id": "Top mask",
+    "mask_bottom_id": "Bottom mask",
+}
+_ASSET_FLAGS = {
+    "model_upload_id": cv2.IMREAD_COLOR,
+    "top_fabric_upload_id": cv2.IMREAD_COLOR,
+    "bottom_fabric_upload_id": cv2.IMREAD_COLOR,
+    "mask_top_id": cv2.IMREAD_GRAYSCALE,
+    "mask_bottom_id": cv2.IMREAD_GRAYSCALE,
+}
+
+
+def encode_preview(image, image_format: str = "jpeg"):
+    """
+    Encode a preview image to an in-memory buffer
+    
+    Args:
+        image: BGR image array
+        image_format: Key of PREVIEW_FORMATS
+    
+    Returns:
+        (encoded bytes, media type)
+    """
+    ext, media_type, params = PREVIEW_FORMATS[image_format]
+    ok, buf = cv2.imencode(ext, image, params)
+    if not ok:
+        raise ValueError(f"Failed to encode preview as {image_format}")
+    return buf.tobytes(), media_type
+
+
+async def find_uploads(ids: dict) -> dict:
+    """
+    Look up several uploads with a single $in query
+    
+    Args:
+        ids: Mapping of field name -> upload id (None values are skipped)
+    
+    Returns:
+        Mapping of field name -> upload document
+    
+    Raises:
+        HTTPException: 400 for malformed ids, 404 for missing uploads
+    """
+    object_ids = {}
+    for name, upload_id in ids.items():
+        if not upload_id:
+            continue
+        try:
+            object_ids[name] = ObjectId(upload_id)
+        except (InvalidId, TypeError):
+            raise HTTPException(status_code=400, detail=f"Invalid {name}")
+    
+    cursor = db.uploads.find({"_id": {"$in": list(set(object_ids.values()))}})
+    found = {doc["_id"]: doc for doc in await cursor.to_list(length=None)}
+    
+    docs = {}
+    for name, oid in object_ids.items():
+        if oid not in found:
+            label = _ASSET_LABELS.get(name, "Upload")
+            raise HTTPException(status_code=404, detail=f"{label} not found")
+        docs[name] = found[oid]
+    
+    return docs
 
 
 @router.post("/outfit/apply_preview")
 async def apply_preview(
+    background_tasks: BackgroundTasks,
     project_id: str = Body(...),
     model_upload_id: str = Body(...),
     top_fabric_upload_id: Optional[str] = Body(None),
     bottom_fabric_upload_id: Optional[str] = Body(None),
     mask_top_id: Optional[str] = Body(None),
     mask_bottom_id: Optional[str] = Body(None),
-    scale: float = Body(1.0)
+    scale: float = Body(1.0),
+    top_scale: Optional[float] = Body(None),
+    bottom_scale: Optional[float] = Body(None),
+    stream: bool = Body(False),
+    image_format: str = Body("jpeg"),
+    progressive: bool = Body(False)
 ):
     """
     Apply fabric textures to model image using classical OpenCV methods (fast preview)
     
-    This uses texture tiling and seamless cloning - no GPU required, fast results.
+    This uses texture tiling and mask-aware shaded blending - no GPU required, fast results.
+    Fabrics are sampled from their upload-time seamless mip atlas when available.
+    Top and bottom are composited in one pass over the model image and encoded once.
+    
+    - **top_scale** / **bottom_scale**: Per-garment swatch scale (default: scale)
+    - **stream**: Return the encoded image itself (job id in the X-Job-Id
+      header) and upload it in the background, so the response does not
+      wait for Cloudinary; the job is recorded as "running" before the
+      response and polled with GET /v1/job/{job_id}
+    - **image_format**: 'jpeg' or 'webp'
+    - **progressive**: Return a low-resolution composite (PREVIEW_PROGRESSIVE_SIDE
+      long edge) immediately, as with stream; the full-resolution render runs
+      in the background and is delivered through GET /v1/job/{job_id} or
+      GET /v1/job/{job_id}/events (server-sent events). A newer progressive
+      request for the same model and fabrics supersedes pending ones
     """
-    # Fetch model upload
-    try:
-        model = await db.uploads.find_one({"_id": ObjectId(model_upload_id)})
-    except:
-        raise HTTPException(status_code=400, detail="Invalid model_upload_id")
+    if image_format not in PREVIEW_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"image_format must be one of: {', '.join(PREVIEW_FORMATS)}"
+        )
     
-    if not model:
-        raise HTTPException(status_code=404, detail="Model upload not found")
+    docs = await find_uploads({
+        "model_upload_id": model_upload_id,
+        "top_fabric_upload_id": top_fabric_upload_id,
+        "bottom_fabric_upload_id": bottom_fabric_upload_id,
+        "mask_top_id": mask_top_id,
+        "mask_bottom_id": mask_bottom_id,
+    })
     
-    # Create temporary directory for processing
-    tmp_dir = os.path.join("/tmp", uuid.uuid4().hex)
-    os.makedirs(tmp_dir, exist_ok=True)
+    # Composite at working resolution rather than decoding full-size originals;
+    # fabrics use their precomputed tileable texture atlas when they have one
+    sources = {}
+    for name, doc in docs.items():
+        if name.startswith("mask_"):
+            sources[name] = doc
+        elif name.endswith("_fabric_upload_id") and texture_source(doc):
+            sources[name] = texture_source(doc)
+        else:
+            sources[name] = select_variant(doc, WORKING_MAX_SIDE)
+    if progressive:
+        # The low-resolution pass starts from the smallest sufficient model variant
+        sources["low_res_model"] = select_variant(docs["model_upload_id"], PREVIEW_PROGRESSIVE_SIDE)
     
     try:
-        # Download model image
-        model_path = os.path.join(tmp_dir, "model.jpg")
-        download_file(model["cloudinary"]["secure_url"], model_path)
+        # Fetch and decode all assets concurrently (served from the image caches after the first hit)
+        names = list(sources)
+        images = dict(zip(names, await asyncio.gather(*(
+            load_upload_image_async(sources[name], _ASSET_FLAGS.get(name, cv2.IMREAD_COLOR)) for name in names
+        ))))
+        model_img = images["model_upload_id"]
         
-        # Download top fabric if provided
-        top_path = None
-        if top_fabric_upload_id:
-            try:
-                top = await db.uploads.find_one({"_id": ObjectId(top_fabric_upload_id)})
-                if not top:
-                    raise HTTPException(status_code=404, detail="Top fabric upload not found")
-                top_path = os.path.join(tmp_dir, "top.jpg")
-                download_file(top["cloudinary"]["secure_url"], top_path)
-            except ValueError:
-                raise HTTPException(status_code=400, detail="Invalid top_fabric_upload_id")
+        # Texture atlases are split into their mip levels (views, no copies)
+        for name, source in sources.items():
+            if source.get("variant") == "texture" and images[name] is not None:
+                images[name] = atlas_levels(images[name], source["cloudinary"]["mips"])
         
-        # Download bottom fabric if provided
-        bottom_path = None
-        if bottom_fabric_upload_id:
-            try:
-                bottom = await db.uploads.find_one({"_id": ObjectId(bottom_fabric_upload_id)})
-                if not bottom:
-                    raise HTTPException(status_code=404, detail="Bottom fabric upload not found")
-                bottom_path = os.path.join(tmp_dir, "bottom.jpg")
-                download_file(bottom["cloudinary"]["secure_url"], bottom_path)
-            except ValueError:
-                raise HTTPException(status_code=400, detail="Invalid bottom_fabric_upload_id")
+        # One layer per garment with both a fabric and a mask; the bottom goes
+        # first so the top is drawn over it where the masks overlap
+        layers = []
+        for fabric_name, mask_name, layer_scale in (
+            ("bottom_fabric_upload_id", "mask_bottom_id", bottom_scale),
+            ("top_fabric_upload_id", "mask_top_id", top_scale),
+        ):
+            if images.get(fabric_name) is not None and images.get(mask_name) is not None:
+                layers.append((
+                    images[fabric_name],
+                    images[mask_name],
+                    scale if layer_scale is None else layer_scale
+                ))
         
-        # Download masks if provided
-        mask_top_path = None
-        if mask_top_id:
-            try:
-                mask_top = await db.uploads.find_one({"_id": ObjectId(mask_top_id)})
-                if not mask_top:
-                    raise HTTPException(status_code=404, detail="Top mask not found")
-                mask_top_path = os.path.join(tmp_dir, "mask_top.png")
-                download_file(mask_top["cloudinary"]["secure_url"], mask_top_path)
-            except ValueError:
-                raise HTTPException(status_code=400, detail="Invalid mask_top_id")
-        
-        mask_bottom_path = None
-        if mask_bottom_id:
-            try:
-                mask_bottom = await db.uploads.find_one({"_id": ObjectId(mask_bottom_id)})
-                if not mask_bottom:
-                    raise HTTPException(status_code=404, detail="Bottom mask not found")
-                mask_bottom_path = os.path.join(tmp_dir, "mask_bottom.png")
-                download_file(mask_bottom["cloudinary"]["secure_url"], mask_bottom_path)
-            except ValueError:
-                raise HTTPException(status_code=400, detail="Invalid mask_bottom_id")
-        
-        # Apply texture preview (classical OpenCV method)
-        # For now, apply top fabric if available
-        if top_path and mask_top_path:
-            out_local = apply_texture_preview(
-                model_path, top_path, mask_top_path, scale=scale
-            )
-        elif bottom_path and mask_bottom_path:
-            out_local = apply_texture_preview(
-                model_path, bottom_path, mask_bottom_path, scale=scale
+        if progressive:
+            # Low-resolution pass only; the full-resolution one runs after the response
+            data, media_type = await run_in_threadpool(
+                _render_low_res_preview, images["low_res_model"], model_img.shape[1], layers, image_format
             )
         else:
-            # No fabric/mask combination available, return original
-            out_local = model_path
-        
-        # Upload result to Cloudinary
-        folder = f"{os.getenv('CLOUDINARY_FOLDER', 'styleweave')}/previews"
-        res = upload_file_to_cloudinary(out_local, folder=folder)
+            data, media_type = await run_in_threadpool(_render_preview, model_img, layers, image_format)
         
         # Create job document for preview
         job_doc = {
@@ -138,19 +219,51 @@ async def apply_preview(
                 "bottom_fabric_upload_id": bottom_fabric_upload_id,
                 "mask_top_id": mask_top_id,
                 "mask_bottom_id": mask_bottom_id,
-                "scale": scale
-            },
-            "result": {
-                "cloudinary": {
-                    "public_id": res["public_id"],
-                    "secure_url": res["secure_url"]
-                }
+                "scale": scale,
+                "top_scale": top_scale,
+                "bottom_scale": bottom_scale,
+                "image_format": image_format,
+                "progressive": progressive
             },
             "progress": 100,
             "created_at": datetime.utcnow(),
             "updated_at": datetime.utcnow()
         }
         
+        if stream or progressive:
+            # Respond with the pixels now; the job is recorded as running so
+            # GET /v1/job/{job_id} finds it, and the upload follows
+            job_doc.update(status="running", progress=0)
+            job_result = await db.jobs.insert_one(job_doc)
+            job_id = job_result.inserted_id
+            if progressive:
+                # Only the latest full-resolution render per model + fabrics is kept
+                refinement_key = (model_upload_id, top_fabric_upload_id, bottom_fabric_upload_id)
+                _latest_refinements[refinement_key] = job_id
+                background_tasks.add_task(
+                    _persist_preview, job_id,
+                    render=lambda: _render_preview(model_img, layers, image_format)[0],
+                    refinement_key=refinement_key
+                )
+            else:
+                background_tasks.add_task(_persist_preview, job_id, data)
+            return Response(
+                content=data,
+                media_type=media_type,
+                headers={"X-Job-Id": str(job_id)}
+            )
+        
+        # Upload result to Cloudinary
+        folder = f"{os.getenv('CLOUDINARY_FOLDER', 'styleweave')}/previews"
+        res = await upload_file_to_cloudinary_async(io.BytesIO(data), folder=folder)
+        
+        job_doc["result"] = {
+            "cloudinary": {
+                "public_id": res["public_id"],
+                "secure_url": res["secure_url"]
+            }
+        }
+        
         job_result = await db.jobs.insert_one(job_doc)
         job_doc["_id"] = str(job_result.inserted_id)
         
@@ -165,15 +278,105 @@ async def apply_preview(
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Preview generation failed: {str(e)}")
+
+
+def _render_preview(model_img, layers: list, image_format: str):
+    """
+    Composite all layers in one pass and encode in memory
     
-    finally:
-        # Cleanup temporary files
+    Args:
+        model_img: Decoded model image (BGR)
+        layers: List of (fabric, mask, scale), bottom-most first
+        image_format: Key of PREVIEW_FORMATS
+    
+    Returns:
+        (encoded bytes, media type)
+    """
+    out_img = apply_texture_layers(model_img, layers) if layers else model_img
+    return encode_preview(out_img, image_format)
+
+
+def _render_low_res_preview(model_img, base_width: int, layers: list, image_format: str):
+    """
+    Progressive first pass: composite at PREVIEW_PROGRESSIVE_SIDE and encode
+    
+    Args:
+        model_img: Decoded model image (BGR), any variant
+        base_width: Width of the working-resolution model the layer scales refer to
+        layers: List of (fabric, mask, scale), bottom-most first
+        image_format: Key of PREVIEW_FORMATS
+    
+    Returns:
+        (encoded bytes, media type)
+    """
+    out_img = apply_texture_layers_low_res(model_img, layers, PREVIEW_PROGRESSIVE_SIDE, base_width)
+    return encode_preview(out_img, image_format)
+
+
+def _superseded_by(refinement_key, job_id):
+    """Id of a newer progressive request for the same key, or None"""
+    if refinement_key is None:
+        return None
+    latest = _latest_refinements.get(refinement_key)
+    return latest if latest is not None and latest != job_id else None
+
+
+async def _persist_preview(job_id, data: bytes = None, render=None, refinement_key=None):
+    """
+    Upload a streamed preview and mark its job done
+    
+    Progressive refinements (refinement_key set) that a newer request for
+    the same model and fabrics has replaced are marked "superseded" instead
+    of being rendered or uploaded.
+    
+    Args:
+        job_id: ObjectId of the job, already recorded with status "running"
+        data: Encoded preview image
+        render: Blocking callable returning the encoded image, used when
+            data is None (run in the threadpool)
+        refinement_key: Key in _latest_refinements for progressive requests
+    """
+    try:
+        newer = _superseded_by(refinement_key, job_id)
+        if newer is None and data is None:
+            data = await run_in_threadpool(render)
+            # A newer request may have arrived while rendering
+            newer = _superseded_by(refinement_key, job_id)
+        if newer is not None:
+            await db.jobs.update_one({"_id": job_id}, {"$set": {
+                "status": "superseded",
+                "superseded_by": str(newer),
+                "updated_at": datetime.utcnow()
+            }})
+            return
+        
+        folder = f"{os.getenv('CLOUDINARY_FOLDER', 'styleweave')}/previews"
+        res = await upload_file_to_cloudinary_async(io.BytesIO(data), folder=folder)
+        
+        await db.jobs.update_one({"_id": job_id}, {"$set": {
+            "status": "done",
+            "progress": 100,
+            "result": {
+                "cloudinary": {
+                    "public_id": res["public_id"],
+                    "secure_url": res["secure_url"]
+                }
+            },
+            "updated_at": datetime.utcnow()
+        }})
+    except Exception as e:
+        print(f"Failed to persist preview {job_id}: {e}")
         try:
-            import shutil
-            if os.path.exists(tmp_dir):
-                shutil.rmtree(tmp_dir)
-        except:
+            await db.jobs.update_one({"_id": job_id}, {"$set": {
+                "status": "failed",
+                "error": str(e),
+                "updated_at": datetime.utcnow()
+            }})
+        except Exception:
             pass
+    finally:
+        if refinement_key is not None and _latest_refinements.get(refinement_key) == job_id:
+            del _latest_refinements[refinement_key]
 
 
 @router.post("/outfit/generate_hd")
@@ -184,14 +387,24 @@ async def generate_hd(
     bottom_fabric_upload_id: Optional[str] = Body(None),
     mask_top_id: Optional[str] = Body(None),
     mask_bottom_id: Optional[str] = Body(None),
-    prompt: str = Body("")
+    prompt: str = Body(""),
+    preset: str = Body(DEFAULT_HD_PRESET)
 ):
     """
     Queue an HD render job using Stable Diffusion inpainting
     
     This creates a background job that will process the request asynchronously.
     Use GET /v1/job/{job_id} to check status.
+    
+    - **preset**: Speed / quality trade-off - 'draft' (fastest, LCM-LoRA when
+      available), 'standard' (DPM-Solver++, 20 steps) or 'final' (UniPC, 30 steps)
     """
+    if preset not in HD_PRESETS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"preset must be one of: {', '.join(HD_PRESETS)}"
+        )
+    
     # Validate that at least one fabric and mask are provided
     if not (top_fabric_upload_id or bottom_fabric_upload_id):
         raise HTTPException(
@@ -216,12 +429,15 @@ async def generate_hd(
             "bottom_fabric_upload_id": bottom_fabric_upload_id,
             "mask_top_id": mask_top_id,
             "mask_bottom_id": mask_bottom_id,
-            "prompt": prompt
+            "prompt": prompt,
+            "preset": preset
         },
         "progress": 0,
         "created_at": datetime.utcnow(),
         "updated_at": datetime.utcnow()
     }
+    # Workers batch queued jobs that share this key into one pipeline call
+    doc["batch_key"] = hd_batch_key(doc["params"])
     
     try:
         result = await db.jobs.insert_one(doc)
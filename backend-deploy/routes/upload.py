@@ -2,15 +2,207 @@
 Upload route - handles image uploads (model, top_fabric, bottom_fabric)
 """
 from fastapi import APIRouter, File, UploadFile, Form, HTTPException
-from core.cloudinary_utils import upload_file_to_cloudinary
+from fastapi.concurrency import run_in_threadpool
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+from core.cloudinary_utils import upload_file_to_cloudinary_async
 from core.mongo import db
+from core.variants import make_variants
+from core.fabric_texture import make_fabric_texture
 from datetime import datetime
+from typing import List
+import asyncio
+import hashlib
 import uuid
 import os
 import tempfile
 
 router = APIRouter()
 
+# Maximum accepted size of a single uploaded image
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", "25")) * 1024 * 1024
+
+# Size of each chunk copied from the request spool to disk
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Batch ingestion limits
+MAX_BATCH_FILES = int(os.getenv("MAX_BATCH_FILES", "500"))
+MAX_BATCH_UPLOAD_BYTES = int(os.getenv("MAX_BATCH_UPLOAD_MB", "1024")) * 1024 * 1024
+BATCH_UPLOAD_CONCURRENCY = int(os.getenv("BATCH_UPLOAD_CONCURRENCY", "8"))
+
+UPLOAD_TYPES = ["model", "top_fabric", "bottom_fabric"]
+
+# Upload types that get a tileable texture atlas (see core.fabric_texture)
+FABRIC_TYPES = ["top_fabric", "bottom_fabric"]
+
+
+async def spool_upload(file: UploadFile, max_bytes: int = MAX_UPLOAD_BYTES):
+    """
+    Stream an UploadFile to a temp file in fixed-size chunks
+    
+    Size and SHA-256 are computed on the fly, so memory use stays at one
+    chunk regardless of the image size.
+    
+    Args:
+        file: Incoming upload
+        max_bytes: Maximum accepted size
+    
+    Returns:
+        (tmp_path, size, content_hash)
+    
+    Raises:
+        HTTPException: 413 if the file exceeds max_bytes
+    """
+    suffix = os.path.splitext(file.filename or "image")[1]
+    tmp_path = os.path.join(tempfile.gettempdir(), f"{uuid.uuid4().hex}{suffix}")
+    hasher = hashlib.sha256()
+    size = 0
+    
+    try:
+        with open(tmp_path, "wb") as f:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"File exceeds maximum size of {max_bytes // (1024 * 1024)} MB"
+                    )
+                hasher.update(chunk)
+                await run_in_threadpool(f.write, chunk)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    
+    return tmp_path, size, hasher.hexdigest()
+
+
+async def upload_with_variants(tmp_path: str, folder: str, filename: str = None, texture: bool = False):
+    """
+    Upload an image and its normalized variants (see core.variants) to Cloudinary
+    
+    Variants are generated off the event loop and uploaded concurrently with
+    the original. Images PIL cannot decode are stored without variants.
+    Fabric uploads (texture=True) additionally get a seamless mip atlas.
+    
+    Args:
+        tmp_path: Local path of the spooled original
+        folder: Cloudinary folder for the original
+        filename: Original filename
+        texture: Also build and upload a tileable texture atlas
+    
+    Returns:
+        (cloudinary response for the original, variants dict, texture dict or
+        None) for the upload document
+    """
+    try:
+        variant_files = await run_in_threadpool(make_variants, tmp_path)
+    except Exception as e:
+        print(f"Skipping variants for {filename or tmp_path}: {e}")
+        variant_files = {}
+    
+    texture_file = None
+    if texture:
+        try:
+            texture_file = await run_in_threadpool(make_fabric_texture, tmp_path)
+        except Exception as e:
+            print(f"Skipping texture for {filename or tmp_path}: {e}")
+    
+    try:
+        names = list(variant_files)
+        uploads = [
+            upload_file_to_cloudinary_async(tmp_path, folder=folder, filename=filename),
+            *(
+                upload_file_to_cloudinary_async(variant_files[name]["path"], folder=f"{folder}/variants")
+                for name in names
+            )
+        ]
+        if texture_file:
+            uploads.append(upload_file_to_cloudinary_async(texture_file["path"], folder=f"{folder}/texture"))
+        results = await asyncio.gather(*uploads)
+    finally:
+        derived = list(variant_files.values()) + ([texture_file] if texture_file else [])
+        for entry in derived:
+            try:
+                os.remove(entry["path"])
+            except:
+                pass
+    
+    variants = {}
+    for name, res in zip(names, results[1:]):
+        variants[name] = {
+            "public_id": res["public_id"],
+            "secure_url": res["secure_url"],
+            "width": res.get("width") or variant_files[name]["width"],
+            "height": res.get("height") or variant_files[name]["height"],
+        }
+    
+    texture_entry = None
+    if texture_file:
+        res = results[-1]
+        texture_entry = {
+            "public_id": res["public_id"],
+            "secure_url": res["secure_url"],
+            "width": texture_file["width"],
+            "height": texture_file["height"],
+            "tile": texture_file["tile"],
+            "mips": texture_file["mips"],
+        }
+    
+    return results[0], variants, texture_entry
+
+
+def build_upload_doc(
+    res: dict,
+    project_id: str,
+    type: str,
+    file: UploadFile,
+    size: int,
+    content_hash: str,
+    variants: dict = None,
+    texture: dict = None
+):
+    """
+    Build a db.uploads document from a Cloudinary response
+    
+    Args:
+        res: Cloudinary upload response
+        project_id: Optional project identifier
+        type: Upload type
+        file: Original upload (for filename / content type)
+        size: Size in bytes
+        content_hash: SHA-256 of the content
+        variants: Normalized variants from upload_with_variants
+        texture: Fabric texture atlas from upload_with_variants
+    
+    Returns:
+        Upload document (without _id)
+    """
+    doc = {
+        "project_id": project_id,
+        "type": type,
+        "cloudinary": {
+            "public_id": res["public_id"],
+            "secure_url": res["secure_url"],
+            "width": res.get("width"),
+            "height": res.get("height"),
+        },
+        "content_hash": content_hash,
+        "variants": variants or {},
+        "meta": {
+            "original_filename": file.filename,
+            "content_type": file.content_type,
+            "size": size
+        },
+        "created_at": datetime.utcnow()
+    }
+    if texture:
+        doc["texture"] = texture
+    return doc
+
 
 @router.post("/upload")
 async def upload_file(
@@ -24,8 +216,14 @@ async def upload_file(
     - **file**: Image file to upload
     - **project_id**: Optional project identifier
     - **type**: Type of upload - 'model', 'top_fabric', or 'bottom_fabric'
+    
+    Identical content (same SHA-256) previously uploaded with the same type is
+    not re-uploaded; the existing upload document is returned instead. New
+    uploads also store EXIF-rotated, downscaled variants (see core.variants);
+    fabrics also get a seamless tileable texture with mip levels
+    (see core.fabric_texture).
     """
-    if type not in ["model", "top_fabric", "bottom_fabric"]:
+    if type not in UPLOAD_TYPES:
         raise HTTPException(
             status_code=400,
             detail="type must be 'model', 'top_fabric', or 'bottom_fabric'"
@@ -35,52 +233,182 @@ async def upload_file(
     if not file.content_type or not file.content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="File must be an image")
     
-    # Save to temporary file
-    suffix = os.path.splitext(file.filename or "image")[1]
-    tmp_path = os.path.join(tempfile.gettempdir(), f"{uuid.uuid4().hex}{suffix}")
+    tmp_path = None
     
     try:
-        # Write uploaded file to temp location
-        with open(tmp_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
+        # Stream uploaded file to temp location
+        tmp_path, size, content_hash = await spool_upload(file)
+        
+        # Return the existing asset if identical content was uploaded before
+        existing = await db.uploads.find_one({"content_hash": content_hash, "type": type})
+        if existing:
+            existing["_id"] = str(existing["_id"])
+            return {"success": True, "upload": existing, "deduplicated": True}
         
-        # Upload to Cloudinary
+        # Upload original and normalized variants to Cloudinary
         folder = f"{os.getenv('CLOUDINARY_FOLDER', 'styleweave')}/{type}"
-        res = upload_file_to_cloudinary(tmp_path, folder=folder)
+        res, variants, texture = await upload_with_variants(
+            tmp_path, folder, filename=file.filename, texture=type in FABRIC_TYPES
+        )
         
         # Create upload document
-        doc = {
-            "project_id": project_id,
-            "type": type,
-            "cloudinary": {
-                "public_id": res["public_id"],
-                "secure_url": res["secure_url"],
-                "width": res.get("width"),
-                "height": res.get("height"),
-            },
-            "meta": {
-                "original_filename": file.filename,
-                "content_type": file.content_type,
-                "size": len(content)
-            },
-            "created_at": datetime.utcnow()
-        }
+        doc = build_upload_doc(res, project_id, type, file, size, content_hash, variants, texture)
         
         # Insert into MongoDB
         result = await db.uploads.insert_one(doc)
         doc["_id"] = str(result.inserted_id)
         
-        return {"success": True, "upload": doc}
+        return {"success": True, "upload": doc, "deduplicated": False}
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
     
     finally:
         # Cleanup temp file
         try:
-            if os.path.exists(tmp_path):
+            if tmp_path and os.path.exists(tmp_path):
                 os.remove(tmp_path)
         except:
             pass
 
+
+@router.post("/upload/batch")
+async def upload_batch(
+    files: List[UploadFile] = File(...),
+    project_id: str = Form(None),
+    type: str = Form(...)
+):
+    """
+    Upload many images of one type in a single request (e.g. a fabric catalog)
+    
+    Files are streamed, hashed and uploaded to Cloudinary with bounded
+    parallelism; already-known content is deduplicated and all new upload
+    documents are written with a single insert_many.
+    
+    - **files**: Image files to upload
+    - **project_id**: Optional project identifier
+    - **type**: Type of upload - 'model', 'top_fabric', or 'bottom_fabric'
+    
+    Returns per-item status: 'uploaded', 'deduplicated' or 'failed'.
+    """
+    if type not in UPLOAD_TYPES:
+        raise HTTPException(
+            status_code=400,
+            detail="type must be 'model', 'top_fabric', or 'bottom_fabric'"
+        )
+    
+    if len(files) > MAX_BATCH_FILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_BATCH_FILES} files per batch"
+        )
+    
+    semaphore = asyncio.Semaphore(BATCH_UPLOAD_CONCURRENCY)
+    items = [{"filename": f.filename} for f in files]
+    spooled = [None] * len(files)
+    
+    async def spool(i, file):
+        if not file.content_type or not file.content_type.startswith("image/"):
+            items[i].update(status="failed", error="File must be an image")
+            return
+        async with semaphore:
+            try:
+                spooled[i] = await spool_upload(file)
+            except HTTPException as e:
+                items[i].update(status="failed", error=e.detail)
+            except Exception as e:
+                items[i].update(status="failed", error=f"Upload failed: {str(e)}")
+    
+    try:
+        # 1. Stream every file to disk, hashing on the fly
+        await asyncio.gather(*(spool(i, f) for i, f in enumerate(files)))
+        
+        # 2. One lookup for all content already known
+        hashes = list({entry[2] for entry in spooled if entry})
+        existing = {}
+        if hashes:
+            cursor = db.uploads.find({"content_hash": {"$in": hashes}, "type": type})
+            for doc in await cursor.to_list(length=None):
+                doc["_id"] = str(doc["_id"])
+                existing.setdefault(doc["content_hash"], doc)
+        
+        # 3. Upload each new distinct content once
+        first_index = {}
+        for i, entry in enumerate(spooled):
+            if entry and entry[2] not in existing:
+                first_index.setdefault(entry[2], i)
+        
+        new_docs = {}
+        
+        async def upload(content_hash, i):
+            tmp_path, size, _ = spooled[i]
+            async with semaphore:
+                try:
+                    folder = f"{os.getenv('CLOUDINARY_FOLDER', 'styleweave')}/{type}"
+                    res, variants, texture = await upload_with_variants(
+                        tmp_path, folder, filename=files[i].filename, texture=type in FABRIC_TYPES
+                    )
+                    new_docs[content_hash] = build_upload_doc(
+                        res, project_id, type, files[i], size, content_hash, variants, texture
+                    )
+                except Exception as e:
+                    items[i].update(status="failed", error=str(e))
+        
+        await asyncio.gather(*(upload(h, i) for h, i in first_index.items()))
+        
+        # 4. Single insert for all new documents
+        if new_docs:
+            ordered_hashes = list(new_docs)
+            # Ids are assigned up front so documents that were written keep
+            # theirs when others in the same insert_many fail
+            for content_hash in ordered_hashes:
+                new_docs[content_hash]["_id"] = ObjectId()
+            try:
+                await db.uploads.insert_many(
+                    [new_docs[h] for h in ordered_hashes], ordered=False
+                )
+            except BulkWriteError as e:
+                for error in e.details.get("writeErrors", []):
+                    content_hash = ordered_hashes[error["index"]]
+                    del new_docs[content_hash]
+                    items[first_index[content_hash]].update(
+                        status="failed", error=f"Upload failed: {error.get('errmsg')}"
+                    )
+            for doc in new_docs.values():
+                doc["_id"] = str(doc["_id"])
+        
+        # 5. Per-item status
+        for i, entry in enumerate(spooled):
+            if not entry or items[i].get("status") == "failed":
+                continue
+            content_hash = entry[2]
+            if content_hash in existing:
+                items[i].update(status="deduplicated", upload=existing[content_hash])
+            elif content_hash in new_docs:
+                # Later copies of content uploaded earlier in this batch
+                status = "uploaded" if first_index[content_hash] == i else "deduplicated"
+                items[i].update(status=status, upload=new_docs[content_hash])
+            else:
+                items[i].update(status="failed", error=items[first_index[content_hash]].get("error"))
+        
+        counts = {}
+        for item in items:
+            counts[item["status"]] = counts.get(item["status"], 0) + 1
+        
+        return {"success": "failed" not in counts, "counts": counts, "items": items}
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Batch upload failed: {str(e)}")
+    
+    finally:
+        # Cleanup temp files
+        for entry in spooled:
+            try:
+                if entry and os.path.exists(entry[0]):
+                    os.remove(entry[0])
+            except:
+                pass
@@ -2,7 +2,7 @@
 Pydantic schemas for request/response validation
 """
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Optional, List, Literal
 from datetime import datetime
 
 
@@ -10,17 +10,22 @@ class UploadResponse(BaseModel):
     """Upload response schema"""
     success: bool
     upload: dict
+    deduplicated: bool = False
 
 
 class MaskGenerateRequest(BaseModel):
     """Mask generation request"""
     upload_id: str
     auto_refine: bool = True
+    quality: Optional[Literal["fast", "balanced", "best"]] = None
+    mode: Optional[Literal["guided", "auto"]] = None
+    prompts: Optional[dict] = None
 
 
 class MaskResponse(BaseModel):
     """Mask generation response"""
     masks: List[dict]
+    sam_model: Optional[str] = None
 
 
 class PreviewRequest(BaseModel):
@@ -32,6 +37,11 @@ class PreviewRequest(BaseModel):
     mask_top_id: Optional[str] = None
     mask_bottom_id: Optional[str] = None
     scale: float = 1.0
+    top_scale: Optional[float] = None
+    bottom_scale: Optional[float] = None
+    stream: bool = False
+    image_format: str = "jpeg"
+    progressive: bool = False
 
 
 class HDGenerateRequest(BaseModel):
@@ -43,6 +53,7 @@ class HDGenerateRequest(BaseModel):
     mask_top_id: Optional[str] = None
     mask_bottom_id: Optional[str] = None
     prompt: str = ""
+    preset: Literal["draft", "standard", "final"] = "standard"
 
 
 class JobResponse(BaseModel):
@@ -13,12 +13,33 @@ For better fabric conditioning, consider:
 3. ControlNet for more precise control
 """
 import torch
-from diffusers import StableDiffusionInpaintPipeline
-from PIL import Image
+from diffusers import (
+    StableDiffusionInpaintPipeline,
+    DPMSolverMultistepScheduler,
+    UniPCMultistepScheduler,
+    LCMScheduler,
+)
+from diffusers.utils import USE_PEFT_BACKEND
+from PIL import Image, ImageFilter
 import numpy as np
 import os
 import uuid
 
+from worker.inference.runtime import (
+    INFERENCE_BACKEND,
+    available_cpus,
+    configure_torch_threads,
+    cpu_precision,
+    ort_session_options,
+    quantize_int8,
+)
+from worker.inference.presets import HD_PRESETS, HD_DRAFT_FALLBACK, DEFAULT_HD_PRESET
+from worker.inference.regional_attention import (
+    encode_regional_prompts,
+    region_weights_from_masks,
+    regional_attention,
+)
+
 # Model configuration
 MODEL_ID = os.getenv("SD_MODEL_ID", "runwayml/stable-diffusion-inpainting")
 # Alternative models:
@@ -29,56 +50,291 @@ MODEL_ID = os.getenv("SD_MODEL_ID", "runwayml/stable-diffusion-inpainting")
 _device = "cuda" if torch.cuda.is_available() else "cpu"
 _dtype = torch.float16 if _device == "cuda" else torch.float32
 
+DEFAULT_PROMPT = "Realistic clothing fabric matching reference"
+
+# Inpaint top and bottom together in one denoising pass (regional prompting)
+SD_SINGLE_PASS = os.getenv("SD_SINGLE_PASS", "true").lower() == "true"
+
+# Denoise only a padded box around the mask at native resolution
+SD_CROP_TO_MASK = os.getenv("SD_CROP_TO_MASK", "true").lower() == "true"
+SD_CROP_PADDING = float(os.getenv("SD_CROP_PADDING", "0.15"))
+SD_FEATHER_RADIUS = int(os.getenv("SD_FEATHER_RADIUS", "8"))
+
+# Pre-exported models for the CPU backends (INFERENCE_BACKEND=onnx|openvino);
+# when unset, MODEL_ID is exported on first load
+SD_ONNX_MODEL_ID = os.getenv("SD_ONNX_MODEL_ID")
+SD_OPENVINO_MODEL_ID = os.getenv("SD_OPENVINO_MODEL_ID")
+
+# LCM-LoRA for the "draft" preset, e.g. "latent-consistency/lcm-lora-sdv1-5"
+LCM_LORA_ID = os.getenv("LCM_LORA_ID")
+
+# Denoising steps of the startup warm-up run
+SD_WARMUP_STEPS = int(os.getenv("SD_WARMUP_STEPS", "2"))
+
 # Global pipeline cache
 PIPELINE = None
 
+# Backend PIPELINE was loaded with ("torch", "onnx" or "openvino")
+PIPELINE_BACKEND = "torch"
+
+# Scheduler instances by name ("default" is the one MODEL_ID ships with)
+_schedulers = {}
+
+# Whether LCM-LoRA is loaded into PIPELINE (None = not tried yet)
+_lcm_loaded = None
+
 
 def get_pipeline():
     """
     Get or create the inpainting pipeline (cached globally)
     
-    The pipeline is loaded once and reused for all requests.
+    The pipeline is loaded once and reused for all requests. INFERENCE_BACKEND
+    selects an ONNX Runtime or OpenVINO export for CPU workers; if that
+    backend is unavailable the diffusers/torch pipeline is used.
     """
-    global PIPELINE
+    global PIPELINE, PIPELINE_BACKEND
     
     if PIPELINE is None:
         print(f"Loading Stable Diffusion inpainting model: {MODEL_ID}")
-        print(f"Device: {_device}, Dtype: {_dtype}")
         
-        PIPELINE = StableDiffusionInpaintPipeline.from_pretrained(
-            MODEL_ID,
-            torch_dtype=_dtype
-        ).to(_device)
-        
-        # Enable attention slicing for memory efficiency
-        PIPELINE.enable_attention_slicing()
-        
-        # Enable memory efficient attention if available
-        if hasattr(PIPELINE, "enable_xformers_memory_efficient_attention"):
+        if INFERENCE_BACKEND in _CPU_LOADERS:
             try:
-                PIPELINE.enable_xformers_memory_efficient_attention()
-            except:
-                pass
+                PIPELINE = _CPU_LOADERS[INFERENCE_BACKEND]()
+                PIPELINE_BACKEND = INFERENCE_BACKEND
+            except Exception as e:
+                print(f"{INFERENCE_BACKEND} backend unavailable, falling back to diffusers: {e}")
+        
+        if PIPELINE is None:
+            PIPELINE = _load_torch_pipeline()
+            PIPELINE_BACKEND = "torch"
         
-        print("Pipeline loaded successfully")
+        print(f"Pipeline loaded successfully (backend: {PIPELINE_BACKEND})")
     
     return PIPELINE
 
 
+def _load_torch_pipeline():
+    """
+    diffusers pipeline; on CPU honours CPU_PRECISION (bf16 weights or int8
+    dynamically quantized UNet) and the cgroup-aware thread count
+    """
+    dtype = _dtype
+    precision = "fp16" if _device == "cuda" else "fp32"
+    if _device == "cpu":
+        configure_torch_threads()
+        precision = cpu_precision()
+        if precision == "bf16":
+            dtype = torch.bfloat16
+    
+    print(f"Device: {_device}, Dtype: {dtype}, Precision: {precision}")
+    
+    pipe = StableDiffusionInpaintPipeline.from_pretrained(
+        MODEL_ID,
+        torch_dtype=dtype
+    ).to(_device)
+    
+    if precision == "int8":
+        quantize_int8(pipe.unet)
+    
+    # Enable attention slicing for memory efficiency
+    pipe.enable_attention_slicing()
+    
+    # Enable memory efficient attention if available
+    if hasattr(pipe, "enable_xformers_memory_efficient_attention"):
+        try:
+            pipe.enable_xformers_memory_efficient_attention()
+        except:
+            pass
+    
+    return pipe
+
+
+def _load_onnx_pipeline():
+    """
+    ONNX Runtime pipeline via optimum (CPUExecutionProvider)
+    
+    ONNX Runtime has no bf16 CPU kernels; for int8 point SD_ONNX_MODEL_ID at
+    a quantized export.
+    """
+    from optimum.onnxruntime import ORTStableDiffusionInpaintPipeline
+    
+    if cpu_precision() != "fp32" and not SD_ONNX_MODEL_ID:
+        print("ONNX backend exports fp32; set SD_ONNX_MODEL_ID to a quantized export for int8")
+    
+    return ORTStableDiffusionInpaintPipeline.from_pretrained(
+        SD_ONNX_MODEL_ID or MODEL_ID,
+        export=SD_ONNX_MODEL_ID is None,
+        provider="CPUExecutionProvider",
+        session_options=ort_session_options()
+    )
+
+
+def _load_openvino_pipeline():
+    """
+    OpenVINO pipeline via optimum-intel, with bf16 inference precision or
+    int8 weight compression per CPU_PRECISION
+    """
+    from optimum.intel import OVStableDiffusionInpaintPipeline
+    
+    precision = cpu_precision()
+    kwargs = {}
+    if precision == "int8" and not SD_OPENVINO_MODEL_ID:
+        kwargs["load_in_8bit"] = True
+    
+    return OVStableDiffusionInpaintPipeline.from_pretrained(
+        SD_OPENVINO_MODEL_ID or MODEL_ID,
+        export=SD_OPENVINO_MODEL_ID is None,
+        ov_config={
+            "INFERENCE_NUM_THREADS": str(available_cpus()),
+            "INFERENCE_PRECISION_HINT": "bf16" if precision == "bf16" else "f32",
+        },
+        **kwargs
+    )
+
+
+_CPU_LOADERS = {
+    "onnx": _load_onnx_pipeline,
+    "openvino": _load_openvino_pipeline,
+}
+
+
+def native_resolution(pipe) -> int:
+    """Pixel size the pipeline's UNet was trained at (512 for SD 1.x)"""
+    return pipe.unet.config.get("sample_size", 64) * pipe.vae_scale_factor
+
+
+def get_scheduler(pipe, name: str):
+    """
+    Get a scheduler by name, built once from the model's own scheduler config
+    
+    Args:
+        pipe: Inpainting pipeline
+        name: "default", "dpmpp", "unipc" or "lcm"
+    """
+    if "default" not in _schedulers:
+        _schedulers["default"] = pipe.scheduler
+    
+    if name not in _schedulers:
+        config = _schedulers["default"].config
+        if name == "dpmpp":
+            _schedulers[name] = DPMSolverMultistepScheduler.from_config(
+                config, algorithm_type="dpmsolver++", use_karras_sigmas=True
+            )
+        elif name == "unipc":
+            _schedulers[name] = UniPCMultistepScheduler.from_config(config)
+        elif name == "lcm":
+            _schedulers[name] = LCMScheduler.from_config(config)
+        else:
+            raise ValueError(f"Unknown scheduler: {name}")
+    
+    return _schedulers[name]
+
+
+def load_lcm_lora(pipe) -> bool:
+    """
+    Load LCM-LoRA into the pipeline once (requires LCM_LORA_ID and peft)
+    
+    Returns:
+        True if LCM-LoRA is available
+    """
+    global _lcm_loaded
+    
+    if _lcm_loaded is None:
+        _lcm_loaded = False
+        if LCM_LORA_ID and USE_PEFT_BACKEND and PIPELINE_BACKEND == "torch":
+            try:
+                pipe.load_lora_weights(LCM_LORA_ID, adapter_name="lcm")
+                _lcm_loaded = True
+                print(f"Loaded LCM-LoRA: {LCM_LORA_ID}")
+            except Exception as e:
+                print(f"LCM-LoRA unavailable, draft preset uses DPM-Solver++: {e}")
+    
+    return _lcm_loaded
+
+
+def use_preset(pipe, preset: str = None) -> dict:
+    """
+    Swap the pipeline's scheduler (and LCM-LoRA) in place for a preset
+    
+    Args:
+        pipe: Inpainting pipeline
+        preset: Name from HD_PRESETS, or None for the model's default scheduler
+    
+    Returns:
+        Preset settings ("scheduler", "steps", "guidance_scale"), or None
+        for the default scheduler
+    """
+    if preset is None:
+        settings = None
+        scheduler = "default"
+    elif preset in HD_PRESETS:
+        settings = HD_PRESETS[preset]
+        if settings["scheduler"] == "lcm" and not load_lcm_lora(pipe):
+            settings = HD_DRAFT_FALLBACK
+        scheduler = settings["scheduler"]
+    else:
+        raise ValueError(f"Unknown preset: {preset}")
+    
+    if _lcm_loaded:
+        if scheduler == "lcm":
+            pipe.enable_lora()
+        else:
+            pipe.disable_lora()
+    
+    pipe.scheduler = get_scheduler(pipe, scheduler)
+    return settings
+
+
+def warm_up(preset: str = None, steps: int = SD_WARMUP_STEPS):
+    """
+    Load the pipeline and run a tiny inference at native resolution
+    
+    Runs at worker startup so the first job does not pay for weight loading,
+    scheduler / LoRA setup and first-call kernel compilation.
+    
+    Args:
+        preset: Preset whose scheduler to prepare (defaults to DEFAULT_HD_PRESET)
+        steps: Denoising steps for the warm-up run
+    """
+    pipe = get_pipeline()
+    use_preset(pipe, preset or DEFAULT_HD_PRESET)
+    
+    size = native_resolution(pipe)
+    pipe(
+        prompt="warm-up",
+        image=Image.new("RGB", (size, size)),
+        mask_image=Image.new("L", (size, size), 255),
+        height=size,
+        width=size,
+        num_inference_steps=steps
+    )
+
+
 def run_inpainting(
     model_img_path: str,
     top_fabric_path: str = None,
     bottom_fabric_path: str = None,
     mask_top_path: str = None,
     mask_bottom_path: str = None,
-    prompt: str = "Realistic clothing fabric matching reference",
+    prompt: str = DEFAULT_PROMPT,
     guidance_scale: float = 7.5,
     steps: int = 30,
-    strength: float = 0.8
+    strength: float = 0.8,
+    single_pass: bool = None,
+    crop_to_mask: bool = None,
+    preset: str = None
 ):
     """
     Run Stable Diffusion inpainting to apply fabric to masked regions
     
+    When both garments are requested and single-pass mode is on, their masks
+    are merged and inpainted in one denoising pass with regional prompting,
+    so a two-garment job costs about the same as a single-garment one.
+    
+    With crop-to-mask on, only a padded box around the mask is denoised at the
+    pipeline's native resolution and blended back into the full-resolution
+    image with a feathered mask; pixels outside the box are left untouched.
+    
     Args:
         model_img_path: Path to model image
         top_fabric_path: Path to top fabric image (optional)
@@ -89,61 +345,322 @@ def run_inpainting(
         guidance_scale: Guidance scale (higher = more adherence to prompt)
         steps: Number of inference steps
         strength: Inpainting strength (0-1)
+        single_pass: Inpaint all garments in one pass (defaults to SD_SINGLE_PASS)
+        crop_to_mask: Denoise only around the mask (defaults to SD_CROP_TO_MASK)
+        preset: HD preset ("draft", "standard", "final"); overrides the
+            scheduler, steps and guidance_scale
     
     Returns:
         Path to output image
     """
+    job = {
+        "model_img_path": model_img_path,
+        "top_fabric_path": top_fabric_path,
+        "bottom_fabric_path": bottom_fabric_path,
+        "mask_top_path": mask_top_path,
+        "mask_bottom_path": mask_bottom_path,
+        "prompt": prompt,
+    }
+    return run_inpainting_batch(
+        [job],
+        guidance_scale=guidance_scale,
+        steps=steps,
+        strength=strength,
+        single_pass=single_pass,
+        crop_to_mask=crop_to_mask,
+        preset=preset
+    )[0]
+
+
+def run_inpainting_batch(
+    jobs: list,
+    guidance_scale: float = 7.5,
+    steps: int = 30,
+    strength: float = 0.8,
+    single_pass: bool = None,
+    crop_to_mask: bool = None,
+    max_batch: int = None,
+    preset: str = None
+):
+    """
+    Run inpainting for several jobs, batching compatible pipeline calls
+    
+    Garment passes from different jobs that denoise at the same resolution
+    with the same number of regions go through the pipeline as one batch.
+    
+    Args:
+        jobs: List of dicts with run_inpainting's path and prompt arguments
+        guidance_scale: Guidance scale shared by all jobs
+        steps: Number of inference steps shared by all jobs
+        strength: Inpainting strength shared by all jobs
+        single_pass: Inpaint all garments in one pass (defaults to SD_SINGLE_PASS)
+        crop_to_mask: Denoise only around the mask (defaults to SD_CROP_TO_MASK)
+        max_batch: Largest batch per pipeline call (unbounded if None)
+        preset: HD preset; overrides the scheduler, steps and guidance_scale
+    
+    Returns:
+        List of output image paths, one per job
+    """
     pipe = get_pipeline()
     
-    # Load model image
-    model_img = Image.open(model_img_path).convert("RGB")
+    settings = use_preset(pipe, preset)
+    if settings:
+        steps = settings["steps"]
+        guidance_scale = settings["guidance_scale"]
     
-    # For simplicity, we'll do sequential inpainting if both top and bottom are provided
-    # Alternatively, you can merge masks and do a single pass
+    if single_pass is None:
+        single_pass = SD_SINGLE_PASS
+    if crop_to_mask is None:
+        crop_to_mask = SD_CROP_TO_MASK
     
-    current_img = model_img
+    if PIPELINE_BACKEND != "torch":
+        # Regional prompting needs torch attention processors
+        single_pass = False
     
-    # Apply top fabric if provided
-    if top_fabric_path and mask_top_path:
-        mask_top = Image.open(mask_top_path).convert("L")
+    images = [Image.open(job["model_img_path"]).convert("RGB") for job in jobs]
+    passes = [_garment_passes(job, single_pass) for job in jobs]
+    
+    for index in range(max((len(p) for p in passes), default=0)):
+        works = []
+        for i, job in enumerate(jobs):
+            if index >= len(passes[i]):
+                continue
+            work = _prepare_group(
+                pipe, images[i], passes[i][index], job.get("prompt") or DEFAULT_PROMPT, crop_to_mask
+            )
+            if work:
+                work["job"] = i
+                works.append(work)
         
-        # Enhance prompt with fabric description
-        top_prompt = f"{prompt}, top fabric texture"
+        # Batch passes that share a resolution and region count
+        buckets = {}
+        for work in works:
+            buckets.setdefault((work["size"], len(work["regions"])), []).append(work)
         
-        print(f"Inpainting top region with prompt: {top_prompt}")
+        for bucket in buckets.values():
+            size = max_batch or len(bucket)
+            for start in range(0, len(bucket), size):
+                chunk = bucket[start:start + size]
+                results = _denoise_batch(pipe, chunk, guidance_scale, steps, strength)
+                for work, result in zip(chunk, results):
+                    images[work["job"]] = _composite_group(images[work["job"]], work, result)
+    
+    # Save outputs
+    out_paths = []
+    for image in images:
+        out_path = os.path.join("/tmp", f"inpaint_{os.getpid()}_{uuid.uuid4().hex}.png")
+        image.save(out_path)
+        out_paths.append(out_path)
+    
+    return out_paths
+
+
+def _garment_passes(job: dict, single_pass: bool) -> list:
+    """
+    Group a job's garments into denoising passes
+    
+    Returns:
+        List of passes, each a list of (prompt, PIL "L" mask) regions
+    """
+    prompt = job.get("prompt") or DEFAULT_PROMPT
+    
+    regions = []
+    if job.get("top_fabric_path") and job.get("mask_top_path"):
+        regions.append((f"{prompt}, top fabric texture", Image.open(job["mask_top_path"]).convert("L")))
+    if job.get("bottom_fabric_path") and job.get("mask_bottom_path"):
+        regions.append((f"{prompt}, bottom fabric texture", Image.open(job["mask_bottom_path"]).convert("L")))
+    
+    if single_pass and len(regions) > 1:
+        # Merge garment masks and denoise once; each garment keeps its own prompt
+        return [regions]
+    
+    # Sequential inpainting, one full pass per garment
+    return [[region] for region in regions]
+
+
+def mask_bbox(mask: np.ndarray, padding: float = 0.15):
+    """
+    Padded bounding box around the non-zero pixels of a mask
+    
+    Args:
+        mask: 2D uint8 mask
+        padding: Padding on each side as a fraction of the box size
+    
+    Returns:
+        (left, top, right, bottom) clamped to the image, or None for an empty mask
+    """
+    ys, xs = np.nonzero(mask)
+    if len(xs) == 0:
+        return None
+    
+    left, right = int(xs.min()), int(xs.max()) + 1
+    top, bottom = int(ys.min()), int(ys.max()) + 1
+    pad_x = int((right - left) * padding)
+    pad_y = int((bottom - top) * padding)
+    
+    height, width = mask.shape
+    return (
+        max(0, left - pad_x),
+        max(0, top - pad_y),
+        min(width, right + pad_x),
+        min(height, bottom + pad_y)
+    )
+
+
+def native_size(box_size: tuple, native: int, multiple: int = 8) -> tuple:
+    """
+    Scale a (width, height) so its long edge matches the model's native resolution
+    
+    Both sides are rounded to a multiple of `multiple` (the latent stride).
+    """
+    width, height = box_size
+    ratio = native / max(width, height)
+    return (
+        max(multiple, int(round(width * ratio / multiple)) * multiple),
+        max(multiple, int(round(height * ratio / multiple)) * multiple)
+    )
+
+
+def _prepare_group(pipe, image, regions, base_prompt, crop_to_mask):
+    """
+    Build the pipeline input for one denoising pass over `regions`
+    
+    Args:
+        pipe: Inpainting pipeline
+        image: Current model image (PIL RGB)
+        regions: List of (prompt, PIL "L" mask) per garment
+        base_prompt: Prompt for everything outside the garment masks
+        crop_to_mask: Denoise only a padded box around the masks
+    
+    Returns:
+        Work dict ("image", "masks", "regions", "base_prompt", "size", "box",
+        "merged"), or None when there is nothing to inpaint
+    """
+    masks = [mask.resize(image.size) for _, mask in regions]
+    merged = np.maximum.reduce([np.asarray(mask) for mask in masks])
+    native = native_resolution(pipe)
+    
+    work = {
+        "image": image,
+        "masks": masks,
+        "regions": regions,
+        "base_prompt": base_prompt,
+        "size": (native, native),
+        "box": None,
+        "merged": merged,
+    }
+    if not crop_to_mask:
+        return work
+    
+    box = mask_bbox(merged, SD_CROP_PADDING)
+    if box is None:
+        print("Skipping inpainting: mask is empty")
+        return None
+    
+    box_size = (box[2] - box[0], box[3] - box[1])
+    size = native_size(box_size, native, pipe.vae_scale_factor)
+    
+    work.update(
+        image=image.crop(box).resize(size, Image.LANCZOS),
+        masks=[mask.crop(box).resize(size, Image.BILINEAR) for mask in masks],
+        size=size,
+        box=box
+    )
+    return work
+
+
+def _composite_group(image, work, result):
+    """
+    Put a denoised result back into the model image
+    
+    Full-frame results replace the image; crops are blended back with a
+    feathered mask so the seam is invisible.
+    """
+    box = work["box"]
+    if box is None:
+        return result
+    
+    box_size = (box[2] - box[0], box[3] - box[1])
+    result = result.resize(box_size, Image.LANCZOS)
+    
+    alpha = Image.fromarray(work["merged"]).crop(box)
+    if SD_FEATHER_RADIUS > 0:
+        alpha = alpha.filter(ImageFilter.MaxFilter(2 * (SD_FEATHER_RADIUS // 2) + 1))
+        alpha = alpha.filter(ImageFilter.GaussianBlur(SD_FEATHER_RADIUS))
+    
+    out = image.copy()
+    out.paste(result, box[:2], alpha)
+    return out
+
+
+def _denoise_batch(pipe, works, guidance_scale, steps, strength):
+    """
+    Run one batched pipeline call for works sharing a size and region count
+    
+    Single-garment works use plain prompts; multi-garment works use regional
+    prompting with per-sample region weights.
+    
+    Returns:
+        List of inpainted PIL images, one per work
+    """
+    width, height = works[0]["size"]
+    
+    if PIPELINE_BACKEND != "torch":
+        # ONNX / OpenVINO pipelines take one image per call and no strength
+        return [
+            pipe(
+                prompt=work["regions"][0][0],
+                image=work["image"],
+                mask_image=work["masks"][0],
+                height=height,
+                width=width,
+                guidance_scale=guidance_scale,
+                num_inference_steps=steps
+            ).images[0]
+            for work in works
+        ]
+    
+    if len(works[0]["regions"]) == 1:
+        prompts = [work["regions"][0][0] for work in works]
+        print(f"Inpainting batch of {len(works)} with prompts: {prompts}")
         
-        current_img = pipe(
-            prompt=top_prompt,
-            image=current_img,
-            mask_image=mask_top,
+        return pipe(
+            prompt=prompts,
+            image=[work["image"] for work in works],
+            mask_image=[work["masks"][0] for work in works],
+            height=height,
+            width=width,
             guidance_scale=guidance_scale,
             num_inference_steps=steps,
             strength=strength
-        ).images[0]
+        ).images
     
-    # Apply bottom fabric if provided
-    if bottom_fabric_path and mask_bottom_path:
-        mask_bottom = Image.open(mask_bottom_path).convert("L")
-        
-        # Enhance prompt with fabric description
-        bottom_prompt = f"{prompt}, bottom fabric texture"
-        
-        print(f"Inpainting bottom region with prompt: {bottom_prompt}")
-        
-        current_img = pipe(
-            prompt=bottom_prompt,
-            image=current_img,
-            mask_image=mask_bottom,
+    latent_size = (height // pipe.vae_scale_factor, width // pipe.vae_scale_factor)
+    prompt_embeds, negative_prompt_embeds, region_weights, merged_masks = [], [], [], []
+    for work in works:
+        prompts = [work["base_prompt"]] + [region_prompt for region_prompt, _ in work["regions"]]
+        positive, negative = encode_regional_prompts(pipe, prompts)
+        prompt_embeds.append(positive)
+        negative_prompt_embeds.append(negative)
+        region_weights.append(region_weights_from_masks(work["masks"], latent_size))
+        merged_masks.append(Image.fromarray(
+            np.maximum.reduce([np.asarray(mask) for mask in work["masks"]])
+        ))
+    
+    print(f"Inpainting batch of {len(works)} with {len(works[0]['regions'])} regions each in one pass")
+    
+    with regional_attention(pipe, torch.cat(region_weights)):
+        return pipe(
+            prompt_embeds=torch.cat(prompt_embeds),
+            negative_prompt_embeds=torch.cat(negative_prompt_embeds),
+            image=[work["image"] for work in works],
+            mask_image=merged_masks,
+            height=height,
+            width=width,
             guidance_scale=guidance_scale,
             num_inference_steps=steps,
             strength=strength
-        ).images[0]
-    
-    # Save output
-    out_path = os.path.join("/tmp", f"inpaint_{os.getpid()}_{uuid.uuid4().hex}.png")
-    current_img.save(out_path)
-    
-    return out_path
+        ).images
 
 
 # Advanced: Fabric conditioning via image embedding (future enhancement)
@@ -0,0 +1,195 @@
+"""
+Mask post-processing for SAM output
+
+Everything runs on the stacked (N, H, W) mask array at a reduced working
+resolution: the stack is subsampled by an integer stride in one slicing
+operation (no per-mask full-resolution resize), OpenCV processes the low-res
+stack as one multi-channel image where it can (morphology, blur), and each
+mask is upsampled once at the end. A full-resolution top/bottom pair costs a
+few milliseconds:
+
+    1. subsample to roughly MASK_REFINE_SIDE on the long edge
+    2. morphological open + close (removes specks, closes small gaps)
+    3. keep the largest connected component, plus any component at least
+       MASK_KEEP_COMPONENT_RATIO of its area (e.g. the second trouser leg)
+    4. fill enclosed holes
+    5. feather, then upsample to the original size
+
+Centroid-based top/bottom selection for promptless SAM output uses the same
+subsampled stack and a batched reduction.
+"""
+import os
+
+import cv2
+import numpy as np
+
+MASK_REFINE_SIDE = int(os.getenv("MASK_REFINE_SIDE", "512"))
+MASK_MORPH_RADIUS = int(os.getenv("MASK_MORPH_RADIUS", "2"))
+MASK_KEEP_COMPONENT_RATIO = float(os.getenv("MASK_KEEP_COMPONENT_RATIO", "0.2"))
+MASK_FEATHER_RADIUS = float(os.getenv("MASK_FEATHER_RADIUS", "2"))
+
+
+def _stride_for(shape: tuple, work_side: int) -> int:
+    """Integer subsampling stride bringing the long edge near work_side"""
+    return max(1, int(np.ceil(max(shape) / max(work_side, 1))))
+
+
+def _to_binary(masks: np.ndarray) -> np.ndarray:
+    """Boolean or uint8 0-255 masks as uint8 0/255 (no np.where on full res)"""
+    inside = masks if masks.dtype == bool else masks > 127
+    return inside.view(np.uint8) * np.uint8(255)
+
+
+def _binary_stack(masks: np.ndarray, stride: int) -> np.ndarray:
+    """
+    Subsample a mask stack to an (h, w, N) uint8 0/255 image
+
+    Args:
+        masks: (N, H, W) boolean or uint8 0-255 masks
+        stride: Subsampling stride
+    """
+    small = np.asarray(masks)[:, ::stride, ::stride]
+    return np.ascontiguousarray(np.moveaxis(_to_binary(small), 0, -1))
+
+
+def mask_centroids_y(masks: np.ndarray, work_side: int = MASK_REFINE_SIDE) -> np.ndarray:
+    """
+    Vertical centroid of each mask in a stack
+
+    Computed on the subsampled stack; accurate to the subsampling stride.
+
+    Args:
+        masks: (N, H, W) boolean or uint8 0-255 masks
+        work_side: Long edge of the working resolution
+
+    Returns:
+        (N,) float array of centroid rows in full-resolution pixels; inf for
+        empty masks
+    """
+    masks = np.asarray(masks)
+    stride = _stride_for(masks.shape[1:], work_side)
+    small = masks[:, ::stride, ::stride]
+    row_counts = (small if small.dtype == bool else small > 127).sum(axis=2)
+    areas = row_counts.sum(axis=1)
+    rows = np.arange(row_counts.shape[1], dtype=np.float64) * stride
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        centroids = row_counts @ rows / areas
+    centroids[areas == 0] = np.inf
+    return centroids
+
+
+def select_top_bottom(masks: np.ndarray, image_size: tuple):
+    """
+    Pick the top and bottom garment masks from promptless SAM output
+
+    The highest mask whose centroid lies in the upper half is the top, the
+    highest one in the lower half is the bottom (empty masks count as lower
+    half, after every non-empty one).
+
+    Args:
+        masks: (N, H, W) candidate masks
+        image_size: (height, width) of the image
+
+    Returns:
+        (top, bottom) as (H, W) uint8 0/255 masks (zeros when none qualifies)
+    """
+    img_h, img_w = image_size
+    empty = np.zeros((img_h, img_w), dtype=np.uint8)
+    if len(masks) == 0:
+        return empty, empty.copy()
+
+    masks = np.asarray(masks)
+    centroids = mask_centroids_y(masks)
+    order = np.argsort(centroids, kind="stable")
+    upper = centroids[order] < img_h * 0.5
+
+    selected = []
+    for candidates in (order[upper], order[~upper]):
+        if len(candidates):
+            selected.append(_to_binary(masks[candidates[0]]))
+        else:
+            selected.append(empty.copy())
+    return tuple(selected)
+
+
+def _keep_components(mask: np.ndarray, keep_ratio: float) -> np.ndarray:
+    """Largest component of a 0/255 mask plus those >= keep_ratio of it"""
+    count, labels, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    if count <= 2:
+        return mask
+
+    areas = stats[1:, cv2.CC_STAT_AREA]
+    keep = np.zeros(count, dtype=bool)
+    keep[1:] = areas >= areas.max() * max(keep_ratio, 1e-9)
+    keep[1 + np.argmax(areas)] = True
+    lut = keep.astype(np.uint8) * np.uint8(255)
+    return lut[labels]
+
+
+def _fill_holes(mask: np.ndarray) -> np.ndarray:
+    """Fill background regions of a 0/255 mask not connected to the border"""
+    h, w = mask.shape
+    padded = np.zeros((h + 2, w + 2), dtype=np.uint8)
+    padded[1:-1, 1:-1] = mask
+    flood = padded.copy()
+    cv2.floodFill(flood, np.zeros((h + 4, w + 4), dtype=np.uint8), (0, 0), 255)
+    holes = cv2.bitwise_not(flood)[1:-1, 1:-1]
+    return cv2.bitwise_or(mask, holes)
+
+
+def auto_refine(
+    masks: np.ndarray,
+    work_side: int = MASK_REFINE_SIDE,
+    morph_radius: int = MASK_MORPH_RADIUS,
+    keep_ratio: float = MASK_KEEP_COMPONENT_RATIO,
+    feather_radius: float = MASK_FEATHER_RADIUS
+) -> np.ndarray:
+    """
+    Clean up a stack of garment masks
+
+    Args:
+        masks: (N, H, W) boolean or uint8 0-255 masks
+        work_side: Long edge of the working resolution
+        morph_radius: Open/close kernel radius at working resolution
+        keep_ratio: Keep components at least this fraction of the largest
+        feather_radius: Edge feather (Gaussian sigma) in output pixels; 0 keeps
+            hard edges
+
+    Returns:
+        (N, H, W) uint8 masks, 0-255 (soft edges when feathered)
+    """
+    masks = np.asarray(masks)
+    n, h, w = masks.shape
+    refined = np.zeros((n, h, w), dtype=np.uint8)
+    if n == 0:
+        return refined
+
+    stride = _stride_for((h, w), work_side)
+    small = _binary_stack(masks, stride)
+
+    if morph_radius > 0:
+        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2 * morph_radius + 1,) * 2)
+        small = cv2.morphologyEx(small, cv2.MORPH_OPEN, kernel).reshape(small.shape)
+        small = cv2.morphologyEx(small, cv2.MORPH_CLOSE, kernel).reshape(small.shape)
+
+    # Component labelling is single-channel only
+    small = np.stack([
+        _fill_holes(_keep_components(np.ascontiguousarray(small[..., i]), keep_ratio))
+        for i in range(n)
+    ], axis=-1)
+
+    sigma = feather_radius / stride
+    if sigma > 0:
+        small = cv2.GaussianBlur(small, (0, 0), sigma).reshape(small.shape)
+
+    for i in range(n):
+        channel = np.ascontiguousarray(small[..., i])
+        if stride > 1:
+            cv2.resize(channel, (w, h), dst=refined[i], interpolation=cv2.INTER_LINEAR)
+        else:
+            refined[i] = channel
+        if feather_radius <= 0:
+            cv2.threshold(refined[i], 127, 255, cv2.THRESH_BINARY, dst=refined[i])
+
+    return refined
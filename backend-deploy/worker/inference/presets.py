@@ -0,0 +1,25 @@
+"""
+HD render presets - speed / quality trade-off for SD inpainting
+
+Each preset names a scheduler and step count. The scheduler is swapped on the
+cached pipeline in place (see inpaint_sd.use_preset), never reloaded.
+
+    draft      LCM-LoRA, 6 steps (falls back to DPM-Solver++ when LCM_LORA_ID
+               is not set or cannot be loaded)
+    standard   DPM-Solver++ (Karras sigmas), 20 steps
+    final      UniPC, 30 steps
+
+Kept free of torch/diffusers imports so the API can validate preset names.
+"""
+import os
+
+HD_PRESETS = {
+    "draft": {"scheduler": "lcm", "steps": 6, "guidance_scale": 1.5},
+    "standard": {"scheduler": "dpmpp", "steps": 20, "guidance_scale": 7.5},
+    "final": {"scheduler": "unipc", "steps": 30, "guidance_scale": 7.5},
+}
+
+# Used for "draft" when LCM-LoRA is unavailable
+HD_DRAFT_FALLBACK = {"scheduler": "dpmpp", "steps": 12, "guidance_scale": 7.5}
+
+DEFAULT_HD_PRESET = os.getenv("DEFAULT_HD_PRESET", "standard")
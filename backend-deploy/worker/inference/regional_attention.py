@@ -0,0 +1,208 @@
+"""
+Regional prompting for Stable Diffusion inpainting
+
+Lets a single denoising pass give different garments their own text
+conditioning. The prompt embeddings of every region are concatenated along
+the token axis; a custom cross-attention processor attends to each region's
+tokens separately and blends the results with per-pixel region weights
+(downsampled to each UNet level). Self-attention is left untouched.
+
+Usage:
+    prompt_embeds, negative_embeds = encode_regional_prompts(pipe, prompts)
+    with regional_attention(pipe, region_weights):
+        pipe(prompt_embeds=prompt_embeds, negative_prompt_embeds=negative_embeds, ...)
+
+`region_weights` is a (batch, regions, h, w) tensor at latent resolution,
+with region 0 conventionally being the base (background) prompt.
+"""
+import math
+from contextlib import contextmanager
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from PIL import Image
+
+
+class RegionalCrossAttnProcessor:
+    """
+    Cross-attention processor that blends per-region prompt attention
+    """
+
+    def __init__(self, region_weights: torch.Tensor):
+        """
+        Args:
+            region_weights: (batch, regions, h, w) weights at latent resolution
+        """
+        self.region_weights = region_weights
+        self.num_regions = region_weights.shape[1]
+        self._cache = {}
+
+    def _weights_for(self, batch: int, seq_len: int, dtype, device):
+        """Region weights resized to a UNet level, shaped (batch, seq_len, regions)"""
+        key = (batch, seq_len, dtype, device)
+        if key in self._cache:
+            return self._cache[key]
+
+        b, r, h, w = self.region_weights.shape
+        size = None
+        for factor in (1, 2, 4, 8, 16):
+            lh, lw = math.ceil(h / factor), math.ceil(w / factor)
+            if lh * lw == seq_len:
+                size = (lh, lw)
+                break
+        if size is None:
+            raise ValueError(f"Cannot map {seq_len} tokens onto a {h}x{w} latent")
+
+        weights = F.interpolate(
+            self.region_weights.to(device=device, dtype=torch.float32),
+            size=size,
+            mode="bilinear",
+            align_corners=False
+        )
+        weights = weights / weights.sum(dim=1, keepdim=True).clamp(min=1e-6)
+        weights = weights.flatten(2).transpose(1, 2)
+        if batch != b:
+            # Classifier-free guidance (and num_images_per_prompt) repeat the batch
+            weights = weights.repeat(batch // b, 1, 1)
+
+        weights = weights.to(dtype)
+        self._cache[key] = weights
+        return weights
+
+    def __call__(
+        self,
+        attn,
+        hidden_states,
+        encoder_hidden_states=None,
+        attention_mask=None,
+        temb=None,
+        scale: float = 1.0
+    ):
+        if encoder_hidden_states is None:
+            raise ValueError("RegionalCrossAttnProcessor is only for cross-attention layers")
+
+        residual = hidden_states
+        input_ndim = hidden_states.ndim
+        if input_ndim == 4:
+            batch, channel, height, width = hidden_states.shape
+            hidden_states = hidden_states.view(batch, channel, height * width).transpose(1, 2)
+
+        batch_size, seq_len, _ = hidden_states.shape
+
+        if attn.group_norm is not None:
+            hidden_states = attn.group_norm(hidden_states.transpose(1, 2)).transpose(1, 2)
+
+        query = attn.to_q(hidden_states)
+        if attn.norm_cross:
+            encoder_hidden_states = attn.norm_encoder_hidden_states(encoder_hidden_states)
+        key = attn.to_k(encoder_hidden_states)
+        value = attn.to_v(encoder_hidden_states)
+
+        head_dim = key.shape[-1] // attn.heads
+        query = query.view(batch_size, -1, attn.heads, head_dim).transpose(1, 2)
+        key = key.view(batch_size, -1, attn.heads, head_dim).transpose(1, 2)
+        value = value.view(batch_size, -1, attn.heads, head_dim).transpose(1, 2)
+
+        tokens = key.shape[2] // self.num_regions
+        weights = self._weights_for(batch_size, seq_len, query.dtype, query.device)
+
+        out = None
+        for r in range(self.num_regions):
+            region = F.scaled_dot_product_attention(
+                query,
+                key[:, :, r * tokens:(r + 1) * tokens],
+                value[:, :, r * tokens:(r + 1) * tokens],
+                dropout_p=0.0,
+                is_causal=False
+            )
+            region = region * weights[:, None, :, r:r + 1]
+            out = region if out is None else out + region
+
+        hidden_states = out.transpose(1, 2).reshape(batch_size, -1, attn.heads * head_dim)
+        hidden_states = hidden_states.to(query.dtype)
+        hidden_states = attn.to_out[0](hidden_states)
+        hidden_states = attn.to_out[1](hidden_states)
+
+        if input_ndim == 4:
+            hidden_states = hidden_states.transpose(-1, -2).reshape(batch, channel, height, width)
+
+        if attn.residual_connection:
+            hidden_states = hidden_states + residual
+
+        return hidden_states / attn.rescale_output_factor
+
+
+def encode_regional_prompts(pipe, prompts: list, negative_prompt: str = None):
+    """
+    Encode one prompt per region and concatenate them along the token axis
+
+    Args:
+        pipe: Stable Diffusion pipeline
+        prompts: List of prompt strings, one per region (base first)
+        negative_prompt: Optional negative prompt shared by all regions
+
+    Returns:
+        (prompt_embeds, negative_prompt_embeds), each (1, regions * 77, dim)
+    """
+    positives, negatives = [], []
+    for prompt in prompts:
+        prompt_embeds, negative_embeds = pipe.encode_prompt(
+            prompt,
+            pipe._execution_device,
+            1,
+            True,
+            negative_prompt
+        )
+        positives.append(prompt_embeds)
+        negatives.append(negative_embeds)
+
+    return torch.cat(positives, dim=1), torch.cat(negatives, dim=1)
+
+
+def region_weights_from_masks(masks: list, latent_size: tuple) -> torch.Tensor:
+    """
+    Build region weights from garment masks
+
+    The base region covers everything the garment masks do not; overlapping
+    garments share their pixels.
+
+    Args:
+        masks: List of PIL "L" masks (white = garment), one per garment region
+        latent_size: (height, width) of the latent grid
+
+    Returns:
+        (1, 1 + len(masks), h, w) float tensor
+    """
+    h, w = latent_size
+    garments = [
+        np.asarray(m.resize((w, h), Image.BILINEAR), dtype=np.float32) / 255.0
+        for m in masks
+    ]
+    coverage = np.clip(np.sum(garments, axis=0), 0.0, 1.0)
+    base = 1.0 - coverage
+
+    weights = np.stack([base] + garments)[None]
+    return torch.from_numpy(weights)
+
+
+@contextmanager
+def regional_attention(pipe, region_weights: torch.Tensor):
+    """
+    Temporarily install RegionalCrossAttnProcessor on all cross-attention layers
+
+    Args:
+        pipe: Stable Diffusion pipeline
+        region_weights: (batch, regions, h, w) weights at latent resolution
+    """
+    original = pipe.unet.attn_processors
+    processor = RegionalCrossAttnProcessor(region_weights)
+
+    pipe.unet.set_attn_processor({
+        name: processor if name.endswith("attn2.processor") else current
+        for name, current in original.items()
+    })
+    try:
+        yield processor
+    finally:
+        pipe.unet.set_attn_processor(original)
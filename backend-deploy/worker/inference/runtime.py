@@ -0,0 +1,148 @@
+"""
+Inference runtime settings shared by the SD and SAM backends
+
+Selects the inference backend and numeric precision from the environment and
+sizes CPU thread pools to the container's cgroup CPU quota rather than the
+host's core count (os.cpu_count() reports every host core, which makes torch
+and ONNX Runtime oversubscribe a throttled container).
+
+    INFERENCE_BACKEND   torch (default) | onnx | openvino
+    CPU_PRECISION       fp32 (default) | bf16 | int8
+    INFERENCE_THREADS   explicit thread count (default: cgroup quota)
+
+Backends other than torch need optional packages (see
+worker/requirements-cpu.txt); loaders fall back to the torch/diffusers path
+when they are missing.
+"""
+import math
+import os
+
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch").lower()
+CPU_PRECISION = os.getenv("CPU_PRECISION", "fp32").lower()
+INFERENCE_THREADS = os.getenv("INFERENCE_THREADS")
+
+_threads_configured = False
+
+
+def cgroup_cpu_limit():
+    """
+    CPU quota of the current cgroup in cores (cgroup v2, then v1)
+
+    Returns:
+        Float number of cores, or None when unlimited / unknown
+    """
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()[:2]
+        if quota != "max":
+            return int(quota) / int(period)
+        return None
+    except (OSError, ValueError):
+        pass
+
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        if quota > 0 and period > 0:
+            return quota / period
+    except (OSError, ValueError):
+        pass
+
+    return None
+
+
+def available_cpus() -> int:
+    """
+    Number of CPUs this process can actually use
+
+    The smallest of the scheduler affinity mask, the cgroup quota (rounded
+    up) and INFERENCE_THREADS when set.
+    """
+    if INFERENCE_THREADS:
+        return max(1, int(INFERENCE_THREADS))
+
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+
+    limit = cgroup_cpu_limit()
+    if limit:
+        cpus = min(cpus, max(1, math.ceil(limit)))
+
+    return cpus
+
+
+def configure_torch_threads():
+    """
+    Size torch's intra-op pool to available_cpus() (once per process)
+    """
+    global _threads_configured
+
+    if _threads_configured:
+        return
+
+    import torch
+
+    threads = available_cpus()
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(max(1, min(4, threads // 2)))
+    except RuntimeError:
+        # Only allowed before the first parallel op; keep the default
+        pass
+
+    _threads_configured = True
+    print(f"torch using {threads} threads")
+
+
+def cpu_supports_bf16() -> bool:
+    """Whether the CPU has native bf16 support (AVX512-BF16 / AMX)"""
+    try:
+        import torch
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except Exception:
+        return False
+
+
+def cpu_precision() -> str:
+    """
+    Effective CPU precision: CPU_PRECISION, with bf16 downgraded to fp32
+    on CPUs without bf16 support
+    """
+    if CPU_PRECISION == "bf16" and not cpu_supports_bf16():
+        print("CPU has no native bf16 support, using fp32")
+        return "fp32"
+    if CPU_PRECISION not in ("fp32", "bf16", "int8"):
+        print(f"Unknown CPU_PRECISION {CPU_PRECISION!r}, using fp32")
+        return "fp32"
+    return CPU_PRECISION
+
+
+def quantize_int8(module):
+    """
+    Dynamically quantize a torch module's Linear layers to int8 (CPU only)
+
+    Transformer blocks (SAM's ViT, the UNet's attention and feed-forward
+    layers) spend most of their time in Linear layers. Only exact nn.Linear
+    modules are swapped: without peft, diffusers builds the UNet from
+    LoRACompatibleLinear subclasses, which stay in float.
+    """
+    import torch
+
+    return torch.ao.quantization.quantize_dynamic(
+        module, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+    )
+
+
+def ort_session_options():
+    """ONNX Runtime session options sized to available_cpus()"""
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = available_cpus()
+    options.inter_op_num_threads = 1
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return options
@@ -0,0 +1,107 @@
+"""
+transformers SamModel predictor (SlimSAM and other Hub SAM checkpoints)
+
+TransformersSamPredictor stands in for the parts of
+segment_anything.SamPredictor this repo uses: set_image / predict /
+reset_image, plus the features / original_size / input_size state read by the
+embedding cache in sam_segmentation.py. Coordinates are in original image
+pixels, as with SamPredictor.
+"""
+import numpy as np
+
+
+class TransformersSamPredictor:
+    """
+    SamPredictor-compatible wrapper around transformers' SamModel/SamProcessor
+    """
+
+    def __init__(self, model_id: str, device: str = "cpu"):
+        from transformers import SamModel, SamProcessor
+
+        self.processor = SamProcessor.from_pretrained(model_id)
+        self.model = SamModel.from_pretrained(model_id).to(device).eval()
+        self.device = device
+        self.reset_image()
+
+    def reset_image(self):
+        self.features = None
+        self.original_size = None
+        self.input_size = None
+        self.is_image_set = False
+
+    def set_image(self, image: np.ndarray, image_format: str = "RGB"):
+        """
+        Run the image encoder on an HxWx3 uint8 RGB image
+        """
+        import torch
+
+        inputs = self.processor(images=image, return_tensors="pt")
+        with torch.no_grad():
+            self.features = self.model.get_image_embeddings(inputs["pixel_values"].to(self.device))
+        self.original_size = tuple(int(v) for v in inputs["original_sizes"][0])
+        self.input_size = tuple(int(v) for v in inputs["reshaped_input_sizes"][0])
+        self.is_image_set = True
+
+    def _apply_coords(self, coords: np.ndarray) -> np.ndarray:
+        h, w = self.original_size
+        new_h, new_w = self.input_size
+        coords = coords.astype(np.float32).copy()
+        coords[..., 0] *= new_w / w
+        coords[..., 1] *= new_h / h
+        return coords
+
+    def predict(
+        self,
+        point_coords=None,
+        point_labels=None,
+        box=None,
+        mask_input=None,
+        multimask_output: bool = True,
+        return_logits: bool = False
+    ):
+        """
+        Predict masks for the current image (same contract as SamPredictor.predict)
+
+        Returns:
+            (masks CxHxW, scores C, low_res_logits Cx256x256)
+        """
+        import torch
+
+        if not self.is_image_set:
+            raise RuntimeError("An image must be set with set_image() before mask prediction")
+
+        prompts = {}
+        if point_coords is not None:
+            coords = self._apply_coords(np.asarray(point_coords).reshape(-1, 2))
+            prompts["input_points"] = torch.from_numpy(coords)[None, None].to(self.device)
+            prompts["input_labels"] = torch.as_tensor(
+                np.asarray(point_labels).reshape(-1), dtype=torch.long
+            )[None, None].to(self.device)
+        if box is not None:
+            corners = self._apply_coords(np.asarray(box).reshape(2, 2)).reshape(4)
+            prompts["input_boxes"] = torch.from_numpy(corners)[None, None].to(self.device)
+        if mask_input is not None:
+            prompts["input_masks"] = torch.as_tensor(
+                np.asarray(mask_input, dtype=np.float32)
+            ).reshape(1, 1, 256, 256).to(self.device)
+
+        with torch.no_grad():
+            outputs = self.model(
+                image_embeddings=self.features,
+                multimask_output=multimask_output,
+                **prompts
+            )
+
+        low_res = outputs.pred_masks[0, 0]
+        masks = self.processor.image_processor.post_process_masks(
+            [low_res[None].cpu()],
+            [self.original_size],
+            [self.input_size],
+            binarize=not return_logits
+        )[0][0]
+
+        return (
+            masks.numpy(),
+            outputs.iou_scores[0, 0].float().cpu().numpy(),
+            low_res.float().cpu().numpy()
+        )
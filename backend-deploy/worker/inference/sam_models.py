@@ -0,0 +1,78 @@
+"""
+SAM model registry - quality / latency trade-off for mask generation
+
+Every model here is loaded lazily and cached on its own (see
+sam_segmentation.load_sam_model), so interactive requests can use a small
+model while batch pipelines keep vit_h on the same node.
+
+    vit_h / vit_l / vit_b   segment_anything checkpoints
+    mobile_sam              MobileSAM (TinyViT encoder, SamPredictor API)
+    slimsam                 SlimSAM via transformers' SamModel
+
+Requests pick a model through a quality level:
+
+    fast        SAM_FAST_MODEL (default mobile_sam)
+    balanced    SAM_BALANCED_MODEL (default vit_b)
+    best        SAM_BEST_MODEL (default vit_h)
+
+Requests without a quality use SAM_MODEL_TYPE. Kept free of torch imports so
+the API can validate quality names.
+"""
+import os
+
+DEFAULT_SAM_MODEL = os.getenv("SAM_MODEL_TYPE", "vit_h")
+
+SAM_MODELS = {
+    "vit_h": {
+        "family": "segment_anything",
+        "model_type": "vit_h",
+        "checkpoint": os.getenv("SAM_VIT_H_CHECKPOINT", "/weights/sam_vit_h.pth"),
+    },
+    "vit_l": {
+        "family": "segment_anything",
+        "model_type": "vit_l",
+        "checkpoint": os.getenv("SAM_VIT_L_CHECKPOINT", "/weights/sam_vit_l.pth"),
+    },
+    "vit_b": {
+        "family": "segment_anything",
+        "model_type": "vit_b",
+        "checkpoint": os.getenv("SAM_VIT_B_CHECKPOINT", "/weights/sam_vit_b.pth"),
+    },
+    "mobile_sam": {
+        "family": "mobile_sam",
+        "model_type": "vit_t",
+        "checkpoint": os.getenv("MOBILE_SAM_CHECKPOINT", "/weights/mobile_sam.pt"),
+    },
+    "slimsam": {
+        "family": "transformers",
+        "model_id": os.getenv("SLIMSAM_MODEL_ID", "nielsr/slimsam-50-uniform"),
+    },
+}
+
+# SAM_CHECKPOINT keeps pointing at the default model's weights
+if os.getenv("SAM_CHECKPOINT") and "checkpoint" in SAM_MODELS.get(DEFAULT_SAM_MODEL, {}):
+    SAM_MODELS[DEFAULT_SAM_MODEL]["checkpoint"] = os.getenv("SAM_CHECKPOINT")
+
+SAM_QUALITY = {
+    "fast": os.getenv("SAM_FAST_MODEL", "mobile_sam"),
+    "balanced": os.getenv("SAM_BALANCED_MODEL", "vit_b"),
+    "best": os.getenv("SAM_BEST_MODEL", "vit_h"),
+}
+
+
+def resolve_sam_model(quality: str = None) -> str:
+    """
+    Model name for a request's quality level
+
+    Args:
+        quality: "fast", "balanced", "best" or None for SAM_MODEL_TYPE
+
+    Returns:
+        Key into SAM_MODELS
+    """
+    model = DEFAULT_SAM_MODEL if quality is None else SAM_QUALITY.get(quality)
+    if model is None:
+        raise ValueError(f"Unknown SAM quality {quality!r}, expected one of {sorted(SAM_QUALITY)}")
+    if model not in SAM_MODELS:
+        raise ValueError(f"Unknown SAM model {model!r}, expected one of {sorted(SAM_MODELS)}")
+    return model
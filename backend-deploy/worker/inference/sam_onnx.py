@@ -0,0 +1,196 @@
+"""
+ONNX Runtime predictor for SAM (CPU backend)
+
+SamOnnxPredictor stands in for the parts of segment_anything.SamPredictor this
+repo uses: set_image / predict / reset_image, plus the features /
+original_size / input_size state read by the embedding cache in
+sam_segmentation.py. It runs an ONNX export of the ViT image encoder and the
+official ONNX prompt decoder (all mask outputs, not just the best one).
+
+Export once per checkpoint with export_sam_onnx(), then set
+INFERENCE_BACKEND=onnx (or openvino, which uses ONNX Runtime's OpenVINO
+execution provider when installed) and point SAM_ONNX_ENCODER /
+SAM_ONNX_DECODER at the files. quantize=True also writes an int8 encoder.
+"""
+import os
+
+import cv2
+import numpy as np
+
+IMG_SIZE = 1024
+PIXEL_MEAN = np.array([123.675, 116.28, 103.53], dtype=np.float32)
+PIXEL_STD = np.array([58.395, 57.12, 57.375], dtype=np.float32)
+MASK_INPUT_SIZE = (256, 256)
+
+
+class SamOnnxPredictor:
+    """
+    SamPredictor-compatible wrapper around ONNX encoder/decoder sessions
+    """
+
+    def __init__(self, encoder_path: str, decoder_path: str, session_options=None, providers=None):
+        import onnxruntime as ort
+
+        providers = providers or ["CPUExecutionProvider"]
+        self.encoder = ort.InferenceSession(encoder_path, sess_options=session_options, providers=providers)
+        self.decoder = ort.InferenceSession(decoder_path, sess_options=session_options, providers=providers)
+        self.device = "cpu"
+        self.reset_image()
+
+    def reset_image(self):
+        self.features = None
+        self.original_size = None
+        self.input_size = None
+        self.is_image_set = False
+
+    def set_image(self, image: np.ndarray, image_format: str = "RGB"):
+        """
+        Run the image encoder on an HxWx3 uint8 RGB image
+        """
+        import torch
+
+        h, w = image.shape[:2]
+        scale = IMG_SIZE / max(h, w)
+        new_h, new_w = int(h * scale + 0.5), int(w * scale + 0.5)
+        interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+        resized = cv2.resize(image, (new_w, new_h), interpolation=interpolation)
+
+        padded = np.zeros((IMG_SIZE, IMG_SIZE, 3), dtype=np.float32)
+        padded[:new_h, :new_w] = (resized.astype(np.float32) - PIXEL_MEAN) / PIXEL_STD
+        tensor = np.ascontiguousarray(padded.transpose(2, 0, 1)[None])
+
+        features = self.encoder.run(None, {self.encoder.get_inputs()[0].name: tensor})[0]
+
+        # Kept as a torch tensor so the embedding cache treats both backends alike
+        self.features = torch.from_numpy(features)
+        self.original_size = (h, w)
+        self.input_size = (new_h, new_w)
+        self.is_image_set = True
+
+    def _apply_coords(self, coords: np.ndarray) -> np.ndarray:
+        h, w = self.original_size
+        new_h, new_w = self.input_size
+        coords = coords.astype(np.float32).copy()
+        coords[..., 0] *= new_w / w
+        coords[..., 1] *= new_h / h
+        return coords
+
+    def predict(
+        self,
+        point_coords=None,
+        point_labels=None,
+        box=None,
+        mask_input=None,
+        multimask_output: bool = True,
+        return_logits: bool = False
+    ):
+        """
+        Predict masks for the current image (same contract as SamPredictor.predict)
+
+        Returns:
+            (masks CxHxW, scores C, low_res_logits Cx256x256)
+        """
+        if not self.is_image_set:
+            raise RuntimeError("An image must be set with set_image() before mask prediction")
+
+        coords = np.zeros((0, 2), dtype=np.float32)
+        labels = np.zeros((0,), dtype=np.float32)
+        if point_coords is not None:
+            coords = np.asarray(point_coords, dtype=np.float32).reshape(-1, 2)
+            labels = np.asarray(point_labels, dtype=np.float32).reshape(-1)
+
+        if box is not None:
+            coords = np.concatenate([coords, np.asarray(box, dtype=np.float32).reshape(2, 2)])
+            labels = np.concatenate([labels, np.array([2, 3], dtype=np.float32)])
+        else:
+            # Padding point, as the torch prompt encoder adds without a box
+            coords = np.concatenate([coords, np.zeros((1, 2), dtype=np.float32)])
+            labels = np.concatenate([labels, np.array([-1], dtype=np.float32)])
+
+        has_mask_input = mask_input is not None
+        if has_mask_input:
+            mask_input = np.asarray(mask_input, dtype=np.float32).reshape(1, 1, *MASK_INPUT_SIZE)
+        else:
+            mask_input = np.zeros((1, 1, *MASK_INPUT_SIZE), dtype=np.float32)
+
+        masks, scores, low_res = self.decoder.run(None, {
+            "image_embeddings": self.features.numpy(),
+            "point_coords": self._apply_coords(coords)[None],
+            "point_labels": labels[None],
+            "mask_input": mask_input,
+            "has_mask_input": np.array([1 if has_mask_input else 0], dtype=np.float32),
+            "orig_im_size": np.array(self.original_size, dtype=np.float32),
+        })
+
+        # Output 0 is the single-mask token, 1-3 the multimask outputs
+        outputs = slice(1, None) if multimask_output else slice(0, 1)
+        masks, scores, low_res = masks[0, outputs], scores[0, outputs], low_res[0, outputs]
+
+        if not return_logits:
+            masks = masks > 0.0
+        return masks, scores, low_res
+
+
+def export_sam_onnx(checkpoint: str, model_type: str, out_dir: str, quantize: bool = False) -> dict:
+    """
+    Export a SAM checkpoint's image encoder and prompt decoder to ONNX
+
+    Args:
+        checkpoint: Path to the segment_anything checkpoint
+        model_type: vit_h, vit_l or vit_b
+        out_dir: Output directory
+        quantize: Also write a dynamically int8-quantized encoder
+
+    Returns:
+        dict with "encoder", "decoder" (and "encoder_int8") paths
+    """
+    import torch
+    from segment_anything import sam_model_registry
+    from segment_anything.utils.onnx import SamOnnxModel
+
+    os.makedirs(out_dir, exist_ok=True)
+    sam = sam_model_registry[model_type](checkpoint=checkpoint).eval()
+    paths = {
+        "encoder": os.path.join(out_dir, f"sam_{model_type}_encoder.onnx"),
+        "decoder": os.path.join(out_dir, f"sam_{model_type}_decoder.onnx"),
+    }
+
+    with torch.no_grad():
+        torch.onnx.export(
+            sam.image_encoder,
+            torch.randn(1, 3, IMG_SIZE, IMG_SIZE),
+            paths["encoder"],
+            input_names=["image"],
+            output_names=["image_embeddings"],
+            opset_version=17
+        )
+
+        embed_size = sam.prompt_encoder.image_embedding_size
+        dummy = {
+            "image_embeddings": torch.randn(1, sam.prompt_encoder.embed_dim, *embed_size),
+            "point_coords": torch.randint(0, IMG_SIZE, (1, 5, 2), dtype=torch.float),
+            "point_labels": torch.randint(0, 4, (1, 5), dtype=torch.float),
+            "mask_input": torch.randn(1, 1, *MASK_INPUT_SIZE),
+            "has_mask_input": torch.tensor([1], dtype=torch.float),
+            "orig_im_size": torch.tensor([1500, 2250], dtype=torch.float),
+        }
+        torch.onnx.export(
+            SamOnnxModel(sam, return_single_mask=False),
+            tuple(dummy.values()),
+            paths["decoder"],
+            input_names=list(dummy),
+            output_names=["masks", "iou_predictions", "low_res_masks"],
+            dynamic_axes={
+                "point_coords": {1: "num_points"},
+                "point_labels": {1: "num_points"},
+            },
+            opset_version=17
+        )
+
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+
+        paths["encoder_int8"] = os.path.join(out_dir, f"sam_{model_type}_encoder.int8.onnx")
+        quantize_dynamic(paths["encoder"], paths["encoder_int8"], weight_type=QuantType.QInt8)
+
+    return paths
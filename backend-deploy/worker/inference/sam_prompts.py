@@ -0,0 +1,246 @@
+"""
+Guided SAM prompts for top/bottom garment masks
+
+Instead of a promptless decoder call followed by a centroid guess, guided
+mode gives SAM one prompt per garment - a box plus a positive point on the
+garment and a negative point on the other one - and decodes both prompts in
+a single batched call.
+
+Prompts come from the client (normalized [0, 1] image coordinates, so they
+are independent of the variant SAM runs on) or from OpenCV's HOG person
+detector: the torso and leg boxes are fixed fractions of the person box.
+When no person is found the whole frame is used, which suits the usual
+full-body fashion shot.
+"""
+import cv2
+import numpy as np
+
+GARMENTS = ("top", "bottom")
+
+# Vertical extent of each garment as fractions of the person box height
+GARMENT_SPANS = {
+    "top": (0.15, 0.55),
+    "bottom": (0.45, 1.0),
+}
+
+# HOG runs on a downscaled copy; the people detector's window is 64x128
+DETECT_MAX_SIDE = 512
+
+_hog = None
+
+
+def detect_person_box(image: np.ndarray):
+    """
+    Largest person in an RGB image via OpenCV's HOG people detector
+
+    Args:
+        image: HxWx3 RGB array
+
+    Returns:
+        (x0, y0, x1, y1) in image pixels, or None when nobody is found
+    """
+    global _hog
+
+    if _hog is None:
+        if not hasattr(cv2, "HOGDescriptor"):
+            # Not in every OpenCV build (e.g. 5.x without contrib)
+            print("OpenCV HOG detector unavailable, using whole-frame garment prompts")
+            _hog = False
+        else:
+            _hog = cv2.HOGDescriptor()
+            _hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+    if _hog is False:
+        return None
+
+    h, w = image.shape[:2]
+    scale = min(1.0, DETECT_MAX_SIDE / max(h, w))
+    small = cv2.resize(image, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA) if scale < 1 else image
+    gray = cv2.cvtColor(small, cv2.COLOR_RGB2GRAY)
+
+    rects, _ = _hog.detectMultiScale(gray, winStride=(8, 8), padding=(16, 16), scale=1.05)
+    if len(rects) == 0:
+        return None
+
+    x, y, bw, bh = max(rects, key=lambda r: r[2] * r[3])
+    box = np.array([x, y, x + bw, y + bh], dtype=np.float32) / scale
+    return tuple(np.clip(box, 0, [w, h, w, h]).tolist())
+
+
+def garment_prompts(image_size: tuple, person_box: tuple = None) -> dict:
+    """
+    Box and point prompts for the top and bottom garments
+
+    Args:
+        image_size: (height, width) of the image
+        person_box: (x0, y0, x1, y1) from detect_person_box, or None for the
+            whole frame
+
+    Returns:
+        dict of garment -> {"box": [4], "points": Nx2, "labels": [N]} in pixels
+    """
+    h, w = image_size
+    x0, y0, x1, y1 = person_box or (0, 0, w, h)
+    person_h = y1 - y0
+
+    boxes = {}
+    for garment, (start, end) in GARMENT_SPANS.items():
+        boxes[garment] = np.array([x0, y0 + start * person_h, x1, y0 + end * person_h], dtype=np.float32)
+
+    centers = {
+        garment: np.array([(box[0] + box[2]) / 2, (box[1] + box[3]) / 2], dtype=np.float32)
+        for garment, box in boxes.items()
+    }
+
+    prompts = {}
+    for garment in GARMENTS:
+        other = "bottom" if garment == "top" else "top"
+        prompts[garment] = {
+            "box": boxes[garment],
+            "points": np.stack([centers[garment], centers[other]]),
+            "labels": np.array([1, 0], dtype=np.int64),
+        }
+    return prompts
+
+
+def normalize_prompts(prompts: dict) -> dict:
+    """
+    Validate client prompts (normalized coordinates)
+
+    Args:
+        prompts: {"top": {"box": [x0, y0, x1, y1], "points": [[x, y], ...],
+            "labels": [1, 0, ...]}, "bottom": {...}}; each garment needs a
+            box or points, labels default to positive
+
+    Returns:
+        Same structure with numpy arrays (coordinates still normalized)
+
+    Raises:
+        ValueError: On an unknown garment or malformed coordinates
+    """
+    normalized = {}
+    for garment, prompt in prompts.items():
+        if garment not in GARMENTS:
+            raise ValueError(f"Unknown garment {garment!r}, expected one of {list(GARMENTS)}")
+
+        box = prompt.get("box")
+        points = prompt.get("points")
+        if box is None and not points:
+            raise ValueError(f"{garment} prompt needs a box or points")
+
+        entry = {}
+        if box is not None:
+            box = np.asarray(box, dtype=np.float32)
+            if box.shape != (4,) or box[2] <= box[0] or box[3] <= box[1]:
+                raise ValueError(f"{garment} box must be [x0, y0, x1, y1] with x1 > x0 and y1 > y0")
+            entry["box"] = box
+        if points:
+            points = np.asarray(points, dtype=np.float32).reshape(-1, 2)
+            labels = prompt.get("labels")
+            labels = np.ones(len(points), dtype=np.int64) if labels is None else np.asarray(labels, dtype=np.int64)
+            if labels.shape != (len(points),) or not np.isin(labels, (0, 1)).all():
+                raise ValueError(f"{garment} labels must be 0/1, one per point")
+            entry["points"] = points
+            entry["labels"] = labels
+
+        coords = np.concatenate([entry.get("box", np.zeros(0)), entry.get("points", np.zeros((0, 2))).ravel()])
+        if ((coords < 0) | (coords > 1)).any():
+            raise ValueError(f"{garment} coordinates must be normalized to [0, 1]")
+
+        normalized[garment] = entry
+    return normalized
+
+
+def scale_prompts(prompts: dict, image_size: tuple) -> dict:
+    """Convert normalized prompts to pixel coordinates of an (h, w) image"""
+    h, w = image_size
+    scaled = {}
+    for garment, prompt in prompts.items():
+        entry = dict(prompt)
+        if "box" in entry:
+            entry["box"] = entry["box"] * np.array([w, h, w, h], dtype=np.float32)
+        if "points" in entry:
+            entry["points"] = entry["points"] * np.array([w, h], dtype=np.float32)
+        scaled[garment] = entry
+    return scaled
+
+
+def predict_garments(predictor, prompts: dict) -> dict:
+    """
+    Decode one mask per garment prompt in a single batched decoder call
+
+    Args:
+        predictor: SamPredictor-compatible predictor with an image set
+        prompts: garment -> {"box"?, "points"?, "labels"?} in pixels
+
+    Returns:
+        dict of garment -> boolean HxW mask (highest-scoring candidate)
+    """
+    garments = list(prompts)
+    if not hasattr(predictor, "predict_torch"):
+        # ONNX / transformers predictors: one decoder call per prompt
+        masks = {}
+        for garment in garments:
+            prompt = prompts[garment]
+            candidates, scores, _ = predictor.predict(
+                point_coords=prompt.get("points"),
+                point_labels=prompt.get("labels"),
+                box=prompt.get("box"),
+                multimask_output=True
+            )
+            masks[garment] = candidates[int(np.argmax(scores))]
+        return masks
+
+    import torch
+
+    device = predictor.device
+    size = predictor.original_size
+
+    # Pad point lists to a common length; label -1 is SAM's "not a point"
+    num_points = max(len(prompts[g].get("points", ())) for g in garments)
+    coords = labels = None
+    if num_points:
+        coords = np.zeros((len(garments), num_points, 2), dtype=np.float32)
+        labels = -np.ones((len(garments), num_points), dtype=np.int64)
+        for i, garment in enumerate(garments):
+            points = prompts[garment].get("points")
+            if points is not None:
+                coords[i, :len(points)] = points
+                labels[i, :len(points)] = prompts[garment]["labels"]
+        coords = torch.as_tensor(predictor.transform.apply_coords(coords, size), device=device)
+        labels = torch.as_tensor(labels, device=device)
+
+    boxes = None
+    if all("box" in prompts[g] for g in garments):
+        boxes = np.stack([prompts[g]["box"] for g in garments])
+        boxes = torch.as_tensor(predictor.transform.apply_boxes(boxes, size), device=device)
+    elif any("box" in prompts[g] for g in garments):
+        # Boxes cannot be mixed with box-less prompts in one batch; use each
+        # box's center as a positive point instead
+        return predict_garments(predictor, {
+            g: _box_as_points(prompts[g]) for g in garments
+        })
+
+    with torch.no_grad():
+        candidates, scores, _ = predictor.predict_torch(
+            point_coords=coords,
+            point_labels=labels,
+            boxes=boxes,
+            multimask_output=True
+        )
+
+    best = scores.argmax(dim=1)
+    return {
+        garment: candidates[i, best[i]].cpu().numpy()
+        for i, garment in enumerate(garments)
+    }
+
+
+def _box_as_points(prompt: dict) -> dict:
+    if "box" not in prompt:
+        return prompt
+    box = prompt["box"]
+    corners = np.array([[box[0], box[1]], [box[2], box[3]]], dtype=np.float32)
+    center = corners.mean(axis=0, keepdims=True)
+    points = np.concatenate([prompt.get("points", np.zeros((0, 2), dtype=np.float32)), center])
+    labels = np.concatenate([prompt.get("labels", np.zeros(0, dtype=np.int64)), [1]])
+    return {"points": points, "labels": labels}
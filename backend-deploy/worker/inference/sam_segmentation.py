@@ -1,155 +1,521 @@
 """
 SAM (Segment Anything Model) segmentation for generating top/bottom masks
 
-This module uses segment-anything or SlimSAM to generate segmentation masks.
-Place your SAM checkpoint at /weights/sam_vit_h.pth or update MODEL_CHECKPOINT path.
+This module uses segment-anything, MobileSAM or SlimSAM to generate
+segmentation masks; see sam_models.py for the registry and the per-request
+quality levels. Place your SAM checkpoint at /weights/sam_vit_h.pth or update
+SAM_CHECKPOINT. Each model is loaded once and cached with its own lock.
 
-For SlimSAM, adapt the model loading code accordingly.
+Image embeddings (the output of the ViT image encoder) are cached per upload,
+in memory and optionally on disk under SAM_EMBEDDING_DIR, so re-running mask
+generation for an image that has already been seen only runs the prompt
+decoder.
 """
 import numpy as np
 import cv2
-import requests
 import os
+import threading
 import uuid
+from collections import OrderedDict
 from PIL import Image
 
-# Model configuration
-# Update these paths to match your SAM checkpoint location
-MODEL_CHECKPOINT = os.getenv("SAM_CHECKPOINT", "/weights/sam_vit_h.pth")
-MODEL_TYPE = os.getenv("SAM_MODEL_TYPE", "vit_h")  # Options: vit_h, vit_l, vit_b
+from core.image_cache import get_image_cache, cache_key_for_url
+from worker.inference.runtime import (
+    INFERENCE_BACKEND,
+    configure_torch_threads,
+    cpu_precision,
+    ort_session_options,
+    quantize_int8,
+)
 
-# Global model cache
-_sam_model = None
-_predictor = None
+from worker.inference.sam_models import SAM_MODELS, DEFAULT_SAM_MODEL, resolve_sam_model
+from worker.inference.mask_postprocess import auto_refine as mask_auto_refine, select_top_bottom
+from worker.inference.sam_prompts import (
+    GARMENTS,
+    detect_person_box,
+    garment_prompts,
+    predict_garments,
+    scale_prompts,
+)
 
+# Model configuration (checkpoint paths per model live in sam_models.py)
+MODEL_TYPE = DEFAULT_SAM_MODEL  # Options: vit_h, vit_l, vit_b, mobile_sam, slimsam
 
-def download_file(url: str, dest: str):
-    """Download a file from URL to local path"""
-    response = requests.get(url, stream=True)
-    response.raise_for_status()
-    os.makedirs(os.path.dirname(dest) if os.path.dirname(dest) else ".", exist_ok=True)
-    with open(dest, "wb") as f:
-        for chunk in response.iter_content(chunk_size=8192):
-            f.write(chunk)
+# ONNX exports of MODEL_TYPE for INFERENCE_BACKEND=onnx|openvino
+# (see sam_onnx.export_sam_onnx)
+SAM_ONNX_ENCODER = os.getenv("SAM_ONNX_ENCODER")
+SAM_ONNX_DECODER = os.getenv("SAM_ONNX_DECODER")
 
+# Default mask mode: "guided" (garment box/point prompts) or "auto"
+# (promptless prediction + centroid heuristic)
+SAM_MASK_MODE = os.getenv("SAM_MASK_MODE", "guided")
 
-def load_sam_model():
+# Embedding cache configuration
+SAM_EMBEDDING_DIR = os.getenv("SAM_EMBEDDING_DIR")  # unset = memory only
+SAM_EMBEDDING_CACHE_SIZE = int(os.getenv("SAM_EMBEDDING_CACHE_SIZE", "32"))
+SAM_MASK_LOGITS_CACHE_SIZE = int(os.getenv("SAM_MASK_LOGITS_CACHE_SIZE", "64"))
+
+# Global model cache: model name -> predictor
+_predictors = {}
+
+# Model name -> model/backend/precision tag, part of the embedding key
+_predictor_tags = {}
+
+# SamPredictor holds per-image state, so set_image/predict must not interleave
+# across executor threads; each model has its own lock
+_predictor_locks = {}
+_locks_guard = threading.Lock()
+
+# Global embedding cache: key -> {"features", "original_size", "input_size"}.
+# Shared by all models, whose threads hold different predictor locks, so the
+# LRU has its own lock
+_embedding_cache = OrderedDict()
+_embedding_cache_lock = threading.Lock()
+
+# Person-detector garment prompts per image: cache key -> pixel prompts. Like
+# the embedding, they depend only on the image, so HOG runs once per upload
+_detected_prompts = OrderedDict()
+_detected_prompts_lock = threading.Lock()
+
+# Low-res decoder logits of recent masks: mask id -> 1x256x256 array, fed back
+# as mask_input when that mask is refined
+_mask_logits = OrderedDict()
+
+# Logit magnitude used when a mask_input has to be rebuilt from a binary mask
+MASK_INPUT_LOGIT = 8.0
+
+
+def get_predictor_lock(model: str = None) -> threading.Lock:
     """
-    Load SAM model (lazy loading, cached)
+    Lock guarding a model's predictor (hold it around load/set_image/predict)
+    """
+    model = model or MODEL_TYPE
+    with _locks_guard:
+        return _predictor_locks.setdefault(model, threading.Lock())
+
+
+def load_sam_model(model: str = None):
+    """
+    Load a SAM model's predictor (lazy loading, cached per model)
+    
+    INFERENCE_BACKEND=onnx|openvino uses SamOnnxPredictor for MODEL_TYPE when
+    SAM_ONNX_ENCODER and SAM_ONNX_DECODER are set, falling back to torch
+    otherwise. On CPU the torch models honour CPU_PRECISION (int8 dynamically
+    quantized image encoder, bf16 autocast) and the cgroup-aware thread count.
+    
+    Args:
+        model: Key into SAM_MODELS (defaults to SAM_MODEL_TYPE)
     
-    To use SlimSAM instead:
-    1. Install: pip install slimsam
-    2. Replace segment_anything import with slimsam
-    3. Update model loading code
+    Returns:
+        SamPredictor-compatible predictor
     """
-    global _sam_model, _predictor
+    model = model or MODEL_TYPE
     
-    if _predictor is not None:
-        return _predictor
+    predictor = _predictors.get(model)
+    if predictor is not None:
+        return predictor
     
-    try:
-        from segment_anything import sam_model_registry, SamPredictor
-        
-        # Check if checkpoint exists
-        if not os.path.exists(MODEL_CHECKPOINT):
-            raise FileNotFoundError(
-                f"SAM checkpoint not found at {MODEL_CHECKPOINT}. "
-                "Please download SAM checkpoint and place it in the weights directory."
-            )
-        
-        # Load model
-        _sam_model = sam_model_registry[MODEL_TYPE](checkpoint=MODEL_CHECKPOINT)
-        _predictor = SamPredictor(_sam_model)
-        
-        return _predictor
+    if model not in SAM_MODELS:
+        raise ValueError(f"Unknown SAM model {model!r}, expected one of {sorted(SAM_MODELS)}")
+    spec = SAM_MODELS[model]
+    
+    if INFERENCE_BACKEND in ("onnx", "openvino") and model == MODEL_TYPE:
+        predictor = _load_onnx_predictor(model)
     
+    if predictor is None:
+        predictor = _SAM_LOADERS[spec["family"]](model, spec)
+    
+    _predictors[model] = predictor
+    print(f"Loaded SAM model {model} ({_predictor_tags[model]})")
+    return predictor
+
+
+def _cpu_precision_setup():
+    """Device and CPU precision for a torch SAM model"""
+    import torch
+    
+    if torch.cuda.is_available():
+        return "cuda", "fp32"
+    configure_torch_threads()
+    return "cpu", cpu_precision()
+
+
+def _load_registry_predictor(model: str, spec: dict):
+    """
+    segment_anything / MobileSAM checkpoint (both ship sam_model_registry
+    and SamPredictor)
+    """
+    try:
+        if spec["family"] == "mobile_sam":
+            from mobile_sam import sam_model_registry, SamPredictor
+        else:
+            from segment_anything import sam_model_registry, SamPredictor
     except ImportError:
+        if spec["family"] == "mobile_sam":
+            raise ImportError(
+                "mobile_sam not installed. Install with: "
+                "pip install timm git+https://github.com/ChaoningZhang/MobileSAM.git"
+            )
         raise ImportError(
             "segment-anything not installed. Install with: "
             "pip install git+https://github.com/facebookresearch/segment-anything.git"
         )
+    
+    # Check if checkpoint exists
+    checkpoint = spec["checkpoint"]
+    if not os.path.exists(checkpoint):
+        raise FileNotFoundError(
+            f"SAM checkpoint for {model} not found at {checkpoint}. "
+            "Please download SAM checkpoint and place it in the weights directory."
+        )
+    
+    # Load model
+    sam_model = sam_model_registry[spec["model_type"]](checkpoint=checkpoint)
+    
+    device, precision = _cpu_precision_setup()
+    sam_model.to(device)
+    if precision == "int8":
+        sam_model.image_encoder = quantize_int8(sam_model.image_encoder.eval())
+    
+    _predictor_tags[model] = model if precision == "fp32" else f"{model}-{precision}"
+    return SamPredictor(sam_model)
+
+
+def _load_transformers_predictor(model: str, spec: dict):
+    """
+    transformers SamModel checkpoint from the Hub (SlimSAM)
+    """
+    from worker.inference.sam_hf import TransformersSamPredictor
+    
+    device, precision = _cpu_precision_setup()
+    predictor = TransformersSamPredictor(spec["model_id"], device=device)
+    if precision == "int8":
+        quantize_int8(predictor.model.vision_encoder)
+    
+    _predictor_tags[model] = model if precision == "fp32" else f"{model}-{precision}"
+    return predictor
+
+
+# SAM_MODELS "family" -> loader(model, spec)
+_SAM_LOADERS = {
+    "segment_anything": _load_registry_predictor,
+    "mobile_sam": _load_registry_predictor,
+    "transformers": _load_transformers_predictor,
+}
+
+
+def _load_onnx_predictor(model: str):
+    """
+    SamOnnxPredictor for the configured exports, or None to fall back to torch
+    """
+    if not (SAM_ONNX_ENCODER and SAM_ONNX_DECODER):
+        print(f"INFERENCE_BACKEND={INFERENCE_BACKEND} but SAM_ONNX_ENCODER/SAM_ONNX_DECODER unset, using torch SAM")
+        return None
+    
+    try:
+        import onnxruntime as ort
+        from worker.inference.sam_onnx import SamOnnxPredictor
+        
+        providers = ["CPUExecutionProvider"]
+        if INFERENCE_BACKEND == "openvino" and "OpenVINOExecutionProvider" in ort.get_available_providers():
+            providers.insert(0, "OpenVINOExecutionProvider")
+        
+        predictor = SamOnnxPredictor(
+            SAM_ONNX_ENCODER,
+            SAM_ONNX_DECODER,
+            session_options=ort_session_options(),
+            providers=providers
+        )
+        encoder_name = os.path.splitext(os.path.basename(SAM_ONNX_ENCODER))[0]
+        _predictor_tags[model] = f"{model}-onnx-{encoder_name}"
+        print(f"Loaded SAM ONNX predictor ({providers[0]})")
+        return predictor
+    
+    except Exception as e:
+        print(f"SAM ONNX backend unavailable, using torch SAM: {e}")
+        return None
+
+
+def _encode_image(model: str, predictor, image: np.ndarray):
+    """
+    Run the image encoder, under bf16 autocast when CPU_PRECISION=bf16
+    """
+    if _predictor_tags.get(model, "").endswith("-bf16"):
+        import torch
+        
+        with torch.autocast("cpu", dtype=torch.bfloat16):
+            predictor.set_image(image)
+        # The prompt decoder runs in fp32
+        predictor.features = predictor.features.float()
+    else:
+        predictor.set_image(image)
+
+
+def _embedding_path(key: str):
+    if not SAM_EMBEDDING_DIR:
+        return None
+    return os.path.join(SAM_EMBEDDING_DIR, f"{key}.npz")
+
+
+def get_cached_embedding(key: str):
+    """
+    Look up a cached image embedding (memory first, then disk)
+    
+    Args:
+        key: Embedding key (see set_image_cached)
+    
+    Returns:
+        Embedding dict or None on a miss
+    """
+    with _embedding_cache_lock:
+        embedding = _embedding_cache.get(key)
+        if embedding is not None:
+            _embedding_cache.move_to_end(key)
+            return embedding
+    
+    path = _embedding_path(key)
+    if path and os.path.exists(path):
+        import torch
+        
+        try:
+            data = np.load(path)
+            embedding = {
+                "features": torch.from_numpy(data["features"]),
+                "original_size": tuple(int(v) for v in data["original_size"]),
+                "input_size": tuple(int(v) for v in data["input_size"]),
+            }
+        except Exception as e:
+            print(f"Ignoring unreadable SAM embedding {path}: {e}")
+            return None
+        _remember_embedding(key, embedding)
+        return embedding
+    
+    return None
+
+
+def _remember_embedding(key: str, embedding: dict):
+    with _embedding_cache_lock:
+        _embedding_cache[key] = embedding
+        _embedding_cache.move_to_end(key)
+        while len(_embedding_cache) > SAM_EMBEDDING_CACHE_SIZE:
+            _embedding_cache.popitem(last=False)
+
+
+def store_embedding(key: str, predictor):
+    """
+    Capture the current image embedding of a predictor into the cache
+    
+    Args:
+        key: Embedding key
+        predictor: SamPredictor on which set_image has been called
+    
+    Returns:
+        The stored embedding dict
+    """
+    embedding = {
+        "features": predictor.features,
+        "original_size": tuple(predictor.original_size),
+        "input_size": tuple(predictor.input_size),
+    }
+    _remember_embedding(key, embedding)
+    
+    path = _embedding_path(key)
+    if path:
+        try:
+            os.makedirs(SAM_EMBEDDING_DIR, exist_ok=True)
+            tmp_path = f"{path}.{uuid.uuid4().hex}.tmp.npz"
+            np.savez(
+                tmp_path,
+                features=predictor.features.detach().cpu().numpy(),
+                original_size=np.array(embedding["original_size"]),
+                input_size=np.array(embedding["input_size"])
+            )
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"Failed to persist SAM embedding {path}: {e}")
+    
+    return embedding
 
 
-def run_sam_on_image_from_url(img_url: str, auto_refine: bool = True):
+def restore_embedding(predictor, embedding: dict):
+    """
+    Load a cached embedding into a predictor, skipping the image encoder
+    
+    Args:
+        predictor: SamPredictor instance
+        embedding: Embedding dict from get_cached_embedding/store_embedding
+    """
+    predictor.reset_image()
+    predictor.features = embedding["features"].to(predictor.device)
+    predictor.original_size = embedding["original_size"]
+    predictor.input_size = embedding["input_size"]
+    predictor.is_image_set = True
+
+
+def set_image_cached(predictor, cache_key: str, load_image, model: str = None):
+    """
+    Prepare a predictor for an image, reusing a cached embedding when possible
+    
+    Args:
+        predictor: SamPredictor instance
+        cache_key: Image cache key of the upload
+        load_image: Callable returning the RGB image array (only called on a miss)
+        model: SAM_MODELS key the predictor was loaded for (embeddings are per model)
+    
+    Returns:
+        (height, width) of the original image
+    """
+    model = model or MODEL_TYPE
+    key = f"{_predictor_tags.get(model, model)}-{cache_key}"
+    
+    embedding = get_cached_embedding(key)
+    if embedding is not None:
+        restore_embedding(predictor, embedding)
+    else:
+        _encode_image(model, predictor, load_image())
+        embedding = store_embedding(key, predictor)
+    
+    return embedding["original_size"]
+
+
+def detected_garment_prompts(cache_key: str, load_image) -> dict:
+    """
+    Person-detector garment prompts for an image, cached per image
+    
+    Args:
+        cache_key: Image cache key of the upload
+        load_image: Callable returning the RGB image array (only called on a miss)
+    
+    Returns:
+        dict of garment -> prompt in pixels (see sam_prompts.garment_prompts)
+    """
+    with _detected_prompts_lock:
+        prompts = _detected_prompts.get(cache_key)
+        if prompts is not None:
+            _detected_prompts.move_to_end(cache_key)
+            return prompts
+    
+    image = load_image()
+    prompts = garment_prompts(image.shape[:2], detect_person_box(image))
+    
+    with _detected_prompts_lock:
+        _detected_prompts[cache_key] = prompts
+        _detected_prompts.move_to_end(cache_key)
+        while len(_detected_prompts) > SAM_EMBEDDING_CACHE_SIZE:
+            _detected_prompts.popitem(last=False)
+    return prompts
+
+
+def warm_up(model: str = None):
+    """
+    Load SAM and run one encoder + decoder pass on a dummy image
+    
+    Called at startup (see PRELOAD_SAM in app.py) so the first real request
+    does not pay for weight loading and first-call kernel setup. The dummy
+    image's embedding is discarded, not cached.
+    
+    Args:
+        model: SAM_MODELS key (defaults to SAM_MODEL_TYPE)
+    """
+    model = model or MODEL_TYPE
+    with get_predictor_lock(model):
+        predictor = load_sam_model(model)
+        _encode_image(model, predictor, np.zeros((64, 64, 3), dtype=np.uint8))
+        predictor.predict(
+            point_coords=np.array([[32, 32]]),
+            point_labels=np.array([1]),
+            multimask_output=True
+        )
+        predictor.reset_image()
+
+
+def run_sam_on_image_from_url(
+    img_url: str,
+    auto_refine: bool = True,
+    cache_key: str = None,
+    quality: str = None,
+    mode: str = None,
+    prompts: dict = None
+):
     """
     Run SAM segmentation on an image from URL
     
     Args:
         img_url: URL of the model image
-        auto_refine: Whether to apply auto-refinement (future enhancement)
+        auto_refine: Whether to clean up and feather the masks (see mask_postprocess)
+        cache_key: Image cache key for the upload (defaults to one derived from the URL)
+        quality: "fast", "balanced" or "best" (see sam_models.SAM_QUALITY);
+            None uses SAM_MODEL_TYPE
+        mode: "guided" or "auto" (defaults to SAM_MASK_MODE)
+        prompts: Client prompts from sam_prompts.normalize_prompts (implies
+            guided mode); garments without one use the person detector
     
     Returns:
         dict with "top" and "bottom" keys pointing to local mask file paths
     """
+    model = resolve_sam_model(quality)
+    guided = (mode or SAM_MASK_MODE) == "guided" or bool(prompts)
+    
     # Create temporary directory
     tmp_dir = os.path.join("/tmp", uuid.uuid4().hex)
     os.makedirs(tmp_dir, exist_ok=True)
     
-    try:
-        # Download image
-        img_path = os.path.join(tmp_dir, "model.jpg")
-        download_file(img_url, img_path)
+    cache_key = cache_key or cache_key_for_url(img_url)
+    
+    loaded = {}
+    
+    def load_image():
+        if "image" in loaded:
+            return loaded["image"]
+        
+        # Fetch image (served from the local image cache after the first hit)
+        img_path = get_image_cache().fetch(img_url, key=cache_key)
         
         # Load image (BGR -> RGB for SAM)
         img_bgr = cv2.imread(img_path)
         if img_bgr is None:
             raise ValueError(f"Failed to load image from {img_url}")
         
-        img_rgb = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB)
-        
-        # Load SAM model
-        predictor = load_sam_model()
-        predictor.set_image(img_rgb)
-        
-        # Generate masks
-        # Using automatic mask generation - you can also provide bounding boxes
-        # For better results, consider using pose detection to guide mask selection
-        masks, scores, logits = predictor.predict(
-            point_coords=None,
-            point_labels=None,
-            box=None,
-            multimask_output=True
-        )
-        
-        # Heuristic to select top and bottom masks
-        # This is a simple approach - for production, use pose keypoints
-        # to identify which masks correspond to top/bottom regions
+        loaded["image"] = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB)
+        return loaded["image"]
+    
+    try:
+        # Detector prompts for garments the client did not prompt (outside the
+        # predictor lock). Cached per image like the embedding, so a repeat
+        # request decodes nothing when both are cached
+        detected = None
+        if guided and not all(garment in (prompts or {}) for garment in GARMENTS):
+            detected = detected_garment_prompts(cache_key, load_image)
         
-        if len(masks) == 0:
-            # No masks found, return empty masks
-            h, w = img_rgb.shape[:2]
-            top_mask = np.zeros((h, w), dtype=np.uint8)
-            bottom_mask = np.zeros((h, w), dtype=np.uint8)
-        else:
-            # Sort masks by centroid Y coordinate
-            centroids = []
-            for i, mask in enumerate(masks):
-                ys, xs = np.where(mask)
-                if len(xs) == 0:
-                    centroids.append((9999, mask, scores[i]))
-                    continue
-                cy = ys.mean()
-                centroids.append((cy, mask, scores[i]))
-            
-            # Sort by Y coordinate (top to bottom)
-            centroids.sort(key=lambda x: x[0])
-            
-            # Select top and bottom masks
-            # Upper half of image -> top, lower half -> bottom
-            img_height = img_rgb.shape[0]
-            top_masks = [m for cy, m, s in centroids if cy < img_height * 0.5]
-            bottom_masks = [m for cy, m, s in centroids if cy >= img_height * 0.5]
-            
-            # Combine masks (use highest scoring if multiple)
-            if top_masks:
-                top_mask = top_masks[0].astype(np.uint8) * 255
-            else:
-                top_mask = np.zeros((img_rgb.shape[0], img_rgb.shape[1]), dtype=np.uint8)
+        with get_predictor_lock(model):
+            # Load SAM model; the image encoder only runs if no embedding is cached
+            predictor = load_sam_model(model)
+            img_h, img_w = set_image_cached(predictor, cache_key, load_image, model=model)
             
-            if bottom_masks:
-                bottom_mask = bottom_masks[0].astype(np.uint8) * 255
+            if guided:
+                # One prompt per garment, decoded in a single batch
+                garment_prompt = dict(detected or {})
+                garment_prompt.update(scale_prompts(prompts or {}, (img_h, img_w)))
+                garment_masks = predict_garments(predictor, garment_prompt)
             else:
-                bottom_mask = np.zeros((img_rgb.shape[0], img_rgb.shape[1]), dtype=np.uint8)
+                # Promptless prediction, top/bottom picked by centroid below
+                masks, scores, logits = predictor.predict(
+                    point_coords=None,
+                    point_labels=None,
+                    box=None,
+                    multimask_output=True
+                )
+        
+        if guided:
+            top_mask = garment_masks["top"].astype(np.uint8) * 255
+            bottom_mask = garment_masks["bottom"].astype(np.uint8) * 255
+        else:
+            # Highest mask in the upper half -> top, in the lower half -> bottom
+            top_mask, bottom_mask = select_top_bottom(masks, (img_h, img_w))
+        
+        if auto_refine:
+            # Morphological cleanup, component selection, hole fill, feather
+            top_mask, bottom_mask = mask_auto_refine(np.stack([top_mask, bottom_mask]))
         
         # Save masks
         top_mask_path = os.path.join(tmp_dir, "mask_top.png")
@@ -174,17 +540,100 @@ def run_sam_on_image_from_url(img_url: str, auto_refine: bool = True):
         raise Exception(f"SAM segmentation failed: {str(e)}")
 
 
-# Alternative: SlimSAM implementation (commented out - uncomment and adapt if using SlimSAM)
-"""
-def load_slimsam_model():
-    from slimsam import build_slimsam
-    model = build_slimsam("slimsam-77")
-    model.eval()
-    return model
-
-def run_slimsam_on_image_from_url(img_url: str, auto_refine: bool = True):
-    # SlimSAM implementation
-    # See your notebook for exact usage
-    pass
-"""
+def remember_mask_logits(mask_id: str, logits: np.ndarray):
+    """Keep a mask's low-res logits for later refinement"""
+    _mask_logits[mask_id] = logits
+    _mask_logits.move_to_end(mask_id)
+    while len(_mask_logits) > SAM_MASK_LOGITS_CACHE_SIZE:
+        _mask_logits.popitem(last=False)
 
+
+def get_mask_logits(mask_id: str):
+    """Cached low-res logits for a mask id, or None"""
+    logits = _mask_logits.get(mask_id)
+    if logits is not None:
+        _mask_logits.move_to_end(mask_id)
+    return logits
+
+
+def mask_to_logits(mask: np.ndarray, input_size: tuple) -> np.ndarray:
+    """
+    Rebuild a decoder mask_input from a binary mask at original resolution
+    
+    The mask is mapped into SAM's padded 1024x1024 input frame and downscaled
+    to the decoder's 256x256 mask resolution.
+    
+    Args:
+        mask: HxW uint8 mask, 0-255 (feathered edges are cut at 127)
+        input_size: (height, width) of the resized image inside the padded frame
+    
+    Returns:
+        1x256x256 float32 logits
+    """
+    new_h, new_w = input_size
+    resized = cv2.resize((mask > 127).astype(np.float32), (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    
+    side = max(new_h, new_w, 1024)
+    padded = np.zeros((side, side), dtype=np.float32)
+    padded[:new_h, :new_w] = resized
+    low_res = cv2.resize(padded, (256, 256), interpolation=cv2.INTER_AREA)
+    
+    return ((low_res * 2 - 1) * MASK_INPUT_LOGIT)[None].astype(np.float32)
+
+
+def refine_mask(
+    img_url: str,
+    cache_key: str,
+    points: np.ndarray,
+    labels: np.ndarray,
+    mask_logits: np.ndarray = None,
+    previous_mask: np.ndarray = None,
+    model: str = None
+):
+    """
+    Refine a mask with click points, running only the prompt decoder
+    
+    The image embedding comes from the embedding cache (the encoder only runs
+    if it was evicted), and the previous mask is passed as mask_input so the
+    clicks correct it rather than start over.
+    
+    Args:
+        img_url: URL of the model image (only fetched on an embedding miss)
+        cache_key: Image cache key of the upload
+        points: Nx2 click points in normalized [0, 1] coordinates
+        labels: N labels, 1 = add to mask, 0 = remove from mask
+        mask_logits: Low-res logits of the mask being refined (preferred)
+        previous_mask: Binary mask being refined, used when no logits are cached
+        model: SAM_MODELS key the mask was generated with
+    
+    Returns:
+        (mask as HxW uint8 0/255, low-res logits 1x256x256)
+    """
+    model = model or MODEL_TYPE
+    
+    def load_image():
+        img_path = get_image_cache().fetch(img_url, key=cache_key)
+        img_bgr = cv2.imread(img_path)
+        if img_bgr is None:
+            raise ValueError(f"Failed to load image from {img_url}")
+        return cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB)
+    
+    try:
+        with get_predictor_lock(model):
+            predictor = load_sam_model(model)
+            img_h, img_w = set_image_cached(predictor, cache_key, load_image, model=model)
+            
+            if mask_logits is None and previous_mask is not None:
+                mask_logits = mask_to_logits(previous_mask, predictor.input_size)
+            
+            masks, scores, low_res = predictor.predict(
+                point_coords=np.asarray(points, dtype=np.float32) * np.array([img_w, img_h], dtype=np.float32),
+                point_labels=np.asarray(labels),
+                mask_input=mask_logits,
+                multimask_output=False
+            )
+        
+        return masks[0].astype(np.uint8) * 255, np.asarray(low_res[:1], dtype=np.float32)
+    
+    except Exception as e:
+        raise Exception(f"SAM mask refinement failed: {str(e)}")
@@ -1,14 +1,31 @@
 """
 Classical texture application using OpenCV (fast preview, no GPU required)
 
-This uses texture tiling and seamless cloning for fast, deterministic results.
+This tiles the fabric into the garment mask and alpha-blends it with shading
+transferred from the original garment, for fast, deterministic results.
 Perfect for preview mode before running expensive GPU-based inpainting.
+
+The shading is the model's luminance relative to its mean over the mask,
+split into a low-pass lighting term and a high-pass detail term (folds,
+seams), each with its own strength. All work happens inside the mask's
+bounding box; no Poisson solve is involved.
+
+Fabric uploads carry a precomputed seamless texture with mip levels (see
+core.fabric_texture); tiling samples the level matching the swatch scale
+with modular indexing, so its cost follows the mask, not the swatch scale.
 """
 import cv2
 import numpy as np
 import os
+import uuid
 from PIL import Image
 
+# Shading transfer from the original garment
+PREVIEW_LIGHT_STRENGTH = float(os.getenv("PREVIEW_LIGHT_STRENGTH", "0.7"))
+PREVIEW_DETAIL_STRENGTH = float(os.getenv("PREVIEW_DETAIL_STRENGTH", "1.0"))
+# Lighting blur sigma as a fraction of the mask's bounding box long edge
+PREVIEW_SHADING_SIGMA = float(os.getenv("PREVIEW_SHADING_SIGMA", "0.03"))
+
 
 def tile_image_to_bbox(texture: np.ndarray, bbox_w: int, bbox_h: int):
     """
@@ -37,6 +54,232 @@ def tile_image_to_bbox(texture: np.ndarray, bbox_w: int, bbox_h: int):
     return tiled
 
 
+def sample_tiled(
+    levels: list,
+    bbox_w: int,
+    bbox_h: int,
+    scale: float = 1.0,
+    dtype=np.uint8
+):
+    """
+    Fill a bounding box with a repeating texture by modular indexing
+    
+    Picks the mip level closest to (and not smaller than) the requested
+    scale, resizes only that tile by the remaining factor and fills the box
+    with modular (wrapped) indexing into it - no oversized tiled canvas is
+    built or resized. At scale 1.0 the result equals tile_image_to_bbox.
+    
+    Args:
+        levels: Mip levels, largest first (see core.fabric_texture), or a
+            single-element list with a raw swatch
+        bbox_w: Target width
+        bbox_h: Target height
+        scale: Scale factor for the texture (2.0 = pattern twice as large)
+        dtype: Output dtype (converted while copying, no extra pass)
+    
+    Returns:
+        bbox_h x bbox_w texture array
+    """
+    base_w = levels[0].shape[1]
+    level = 0
+    while level + 1 < len(levels) and levels[level + 1].shape[1] >= base_w * scale:
+        level += 1
+    
+    texture = levels[level]
+    residual = scale * base_w / texture.shape[1]
+    if abs(residual - 1.0) > 1e-3:
+        th, tw = texture.shape[:2]
+        texture = cv2.resize(
+            texture,
+            (max(1, int(round(tw * residual))), max(1, int(round(th * residual)))),
+            interpolation=cv2.INTER_AREA if residual < 1.0 else cv2.INTER_LINEAR
+        )
+    
+    # Output pixel (r, c) is texture[r % th, c % tw]; done as one wrapped
+    # slice copy per tile period (converting dtype on the fly), which is much
+    # faster than a per-pixel gather
+    th, tw = texture.shape[:2]
+    tiled = np.empty((bbox_h, bbox_w) + texture.shape[2:], dtype=dtype)
+    strip = tiled[:min(th, bbox_h)]
+    for x in range(0, bbox_w, tw):
+        strip[:, x:x + tw] = texture[:len(strip), :bbox_w - x]
+    for y in range(th, bbox_h, th):
+        tiled[y:y + th] = strip[:bbox_h - y]
+    return tiled
+
+
+def shading_map(model_crop: np.ndarray, inside: np.ndarray):
+    """
+    Relative shading of the original garment inside a crop
+    
+    Args:
+        model_crop: BGR crop of the model image
+        inside: uint8 binary mask of the crop (non-zero = garment)
+    
+    Returns:
+        Float32 HxW multiplier, 1.0 = garment mean luminance
+    """
+    gray = cv2.cvtColor(model_crop, cv2.COLOR_BGR2GRAY)
+    mean = max(cv2.mean(gray, mask=inside)[0], 1.0)
+    
+    # Low-pass lighting on a quarter-resolution copy (cheap large blur)
+    h, w = gray.shape
+    small = cv2.resize(gray, (max(1, w // 4), max(1, h // 4)), interpolation=cv2.INTER_AREA)
+    sigma = max(1.0, PREVIEW_SHADING_SIGMA * max(h, w) / 4)
+    small = cv2.GaussianBlur(small.astype(np.float32), (0, 0), sigma)
+    light = cv2.resize(small, (w, h), interpolation=cv2.INTER_LINEAR)
+    
+    # 1 + light_strength * (light / mean - 1) + detail_strength * (gray - light) / mean,
+    # folded into a single weighted sum
+    shading = cv2.addWeighted(
+        light, (PREVIEW_LIGHT_STRENGTH - PREVIEW_DETAIL_STRENGTH) / mean,
+        gray.astype(np.float32), PREVIEW_DETAIL_STRENGTH / mean,
+        1.0 - PREVIEW_LIGHT_STRENGTH
+    )
+    return np.clip(shading, 0.0, 2.0, out=shading)
+
+
+def _composite_layer(
+    output: np.ndarray,
+    model: np.ndarray,
+    fabric: np.ndarray,
+    mask: np.ndarray,
+    scale: float = 1.0
+) -> bool:
+    """
+    Blend one fabric layer into `output` in place
+    
+    Shading is always taken from the original `model`, so layers composited
+    earlier do not darken or pattern the ones on top of them.
+    
+    Args:
+        output: Output image being composited (BGR, same size as model)
+        model: Original model image (BGR)
+        fabric: Fabric swatch (BGR), or its mip levels from a tileable
+            texture atlas (see core.fabric_texture)
+        mask: Mask image (grayscale, white = region to apply fabric; soft
+            edges are used as blend weights)
+        scale: Scale factor for the fabric swatch (2.0 = pattern twice as large)
+    
+    Returns:
+        False if the mask is empty and nothing was drawn
+    """
+    h, w = model.shape[:2]
+    
+    # Resize mask to match model if needed
+    if mask.shape[:2] != (h, w):
+        mask = cv2.resize(mask, (w, h))
+    
+    # Bounding box of every pixel with any weight (feathered edges included)
+    x, y, bbox_w, bbox_h = cv2.boundingRect(mask)
+    if bbox_w == 0 or bbox_h == 0:
+        return False
+    
+    mask_crop = mask[y:y + bbox_h, x:x + bbox_w]
+    _, inside = cv2.threshold(mask_crop, 127, 255, cv2.THRESH_BINARY)
+    if not cv2.countNonZero(inside):
+        return False
+    
+    # Sample the (scaled) fabric over the bounding box straight into float32
+    levels = fabric if isinstance(fabric, (list, tuple)) else [fabric]
+    shaded = sample_tiled(levels, bbox_w, bbox_h, scale, dtype=np.float32)
+    
+    alpha = mask_crop.astype(np.float32) * (1.0 / 255.0)
+    
+    # Fabric lit like the original garment, alpha-blended into the mask only
+    # (in-place float ops, no full-size temporaries)
+    shaded *= shading_map(model[y:y + bbox_h, x:x + bbox_w], inside)[..., None]
+    blended = output[y:y + bbox_h, x:x + bbox_w].astype(np.float32)
+    shaded -= blended
+    shaded *= alpha[..., None]
+    blended += shaded
+    np.clip(blended, 0, 255, out=blended)
+    
+    output[y:y + bbox_h, x:x + bbox_w] = blended
+    return True
+
+
+def apply_texture_layers(model: np.ndarray, layers: list):
+    """
+    Composite several fabric layers onto a decoded model image in one pass
+    
+    The model is copied once and every layer is blended into that copy;
+    later layers are drawn over earlier ones where masks overlap. Inputs are
+    never modified.
+    
+    Args:
+        model: Model image (BGR)
+        layers: List of (fabric, mask, scale) tuples, bottom-most first
+    
+    Returns:
+        Output image array (BGR); `model` itself if every mask is empty
+    """
+    output = model.copy()
+    drawn = False
+    for fabric, mask, scale in layers:
+        drawn |= _composite_layer(output, model, fabric, mask, scale)
+    
+    return output if drawn else model
+
+
+def apply_texture_layers_low_res(model: np.ndarray, layers: list, max_side: int, base_width: int = None):
+    """
+    Composite layers onto a downscaled copy of the model (progressive preview)
+    
+    The model and masks are reduced to `max_side` on the long edge and the
+    fabric scales shrink by the same factor, so the pattern keeps its size
+    relative to the garment.
+    
+    Args:
+        model: Model image (BGR); a smaller variant of the image the layer
+            scales refer to is fine (see base_width)
+        layers: List of (fabric, mask, scale) tuples, bottom-most first
+        max_side: Long edge of the output
+        base_width: Width of the model image the layer scales were chosen
+            for (defaults to model's own width)
+    
+    Returns:
+        Output image array (BGR) of at most max_side on the long edge
+    """
+    h, w = model.shape[:2]
+    factor = min(1.0, max_side / max(h, w))
+    size = (max(1, int(round(w * factor))), max(1, int(round(h * factor))))
+    fabric_factor = size[0] / (base_width or w)
+    
+    small = model if size == (w, h) else cv2.resize(model, size, interpolation=cv2.INTER_AREA)
+    small_layers = [
+        (fabric, cv2.resize(mask, size, interpolation=cv2.INTER_AREA), scale * fabric_factor)
+        for fabric, mask, scale in layers
+    ]
+    return apply_texture_layers(small, small_layers)
+
+
+def apply_texture_preview_arrays(
+    model: np.ndarray,
+    fabric: np.ndarray,
+    mask: np.ndarray,
+    scale: float = 1.0
+):
+    """
+    Apply fabric texture to an already-decoded model image
+    
+    Array-based variant of apply_texture_preview for callers that keep decoded
+    images in memory (see core.image_cache.load_upload_image). Inputs are never
+    modified. Single-layer form of apply_texture_layers.
+    
+    Args:
+        model: Model image (BGR)
+        fabric: Fabric texture image (BGR)
+        mask: Mask image (grayscale, white = region to apply fabric; soft
+            edges are used as blend weights)
+        scale: Scale factor for the fabric swatch (2.0 = pattern twice as large)
+    
+    Returns:
+        Output image array (BGR); `model` itself if the mask is empty
+    """
+    return apply_texture_layers(model, [(fabric, mask, scale)])
+
+
 def apply_texture_preview(
     model_path: str,
     fabric_path: str,
@@ -48,92 +291,62 @@ def apply_texture_preview(
     
     This is a fast, deterministic method using:
     1. Texture tiling to fill the masked region
-    2. Seamless cloning for natural blending
+    2. Shading transfer and alpha blending within the mask
     
     Args:
         model_path: Path to model image
         fabric_path: Path to fabric texture image
         mask_path: Path to mask image (white = region to apply fabric)
-        scale: Scale factor for texture (1.0 = original size)
+        scale: Scale factor for the fabric swatch (1.0 = original size)
     
     Returns:
         Path to output image
     """
-    # Load images
-    model = cv2.imread(model_path)
-    if model is None:
-        raise ValueError(f"Failed to load model image: {model_path}")
-    
-    h, w = model.shape[:2]
-    
     if fabric_path is None or mask_path is None:
         # No fabric/mask provided, return original
         return model_path
     
-    fabric = cv2.imread(fabric_path)
-    if fabric is None:
-        raise ValueError(f"Failed to load fabric image: {fabric_path}")
+    return apply_texture_preview_layers(model_path, [(fabric_path, mask_path, scale)])
+
+
+def apply_texture_preview_layers(model_path: str, layers: list):
+    """
+    Apply several fabric layers to a model image file
     
-    mask = cv2.imread(mask_path, cv2.IMREAD_GRAYSCALE)
-    if mask is None:
-        raise ValueError(f"Failed to load mask image: {mask_path}")
+    The model is decoded once, all layers are composited in one pass (see
+    apply_texture_layers) and the result is encoded once.
     
-    # Resize mask to match model if needed
-    if mask.shape[:2] != (h, w):
-        mask = cv2.resize(mask, (w, h))
+    Args:
+        model_path: Path to model image
+        layers: List of (fabric_path, mask_path, scale), bottom-most first
     
-    # Find bounding box of mask
-    ys, xs = np.where(mask > 127)
-    if len(xs) == 0:
-        # Empty mask, return original
-        return model_path
+    Returns:
+        Path to output image (`model_path` if nothing was applied)
+    """
+    # Load images
+    model = cv2.imread(model_path)
+    if model is None:
+        raise ValueError(f"Failed to load model image: {model_path}")
     
-    minx, maxx = xs.min(), xs.max()
-    miny, maxy = ys.min(), ys.max()
-    bbox_w = maxx - minx + 1
-    bbox_h = maxy - miny + 1
-    
-    # Tile fabric to bounding box size
-    tiled = tile_image_to_bbox(fabric, bbox_w, bbox_h)
-    
-    # Apply scale if needed
-    if scale != 1.0:
-        new_w = int(bbox_w * scale)
-        new_h = int(bbox_h * scale)
-        tiled = cv2.resize(tiled, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
-        bbox_w, bbox_h = new_w, new_h
-    
-    # Create canvas with tiled fabric placed at bbox position
-    canvas = model.copy()
-    
-    # Ensure we don't go out of bounds
-    end_x = min(minx + bbox_w, w)
-    end_y = min(miny + bbox_h, h)
-    actual_w = end_x - minx
-    actual_h = end_y - miny
-    
-    # Place tiled fabric on canvas
-    canvas[miny:end_y, minx:end_x] = tiled[:actual_h, :actual_w]
-    
-    # Create mask for seamless cloning (only the bbox region)
-    mask_crop = np.zeros((h, w), dtype=np.uint8)
-    mask_crop[miny:end_y, minx:end_x] = 255
-    
-    # Calculate center point for seamless cloning
-    center = (minx + actual_w // 2, miny + actual_h // 2)
-    
-    # Apply seamless cloning for natural blending
-    output = cv2.seamlessClone(
-        canvas,
-        model,
-        mask_crop,
-        center,
-        cv2.NORMAL_CLONE
-    )
+    decoded = []
+    for fabric_path, mask_path, scale in layers:
+        fabric = cv2.imread(fabric_path)
+        if fabric is None:
+            raise ValueError(f"Failed to load fabric image: {fabric_path}")
+        
+        mask = cv2.imread(mask_path, cv2.IMREAD_GRAYSCALE)
+        if mask is None:
+            raise ValueError(f"Failed to load mask image: {mask_path}")
+        
+        decoded.append((fabric, mask, scale))
+    
+    output = apply_texture_layers(model, decoded)
+    if output is model:
+        # No layers or empty masks, return original
+        return model_path
     
     # Save output
     out_path = os.path.join("/tmp", f"preview_{os.getpid()}_{uuid.uuid4().hex}.jpg")
     cv2.imwrite(out_path, output)
     
     return out_path
-
@@ -2,58 +2,183 @@
 Celery tasks for background job processing
 """
 import os
-import uuid
-import requests
+import sys
+import time
 from celery import Celery
-from pymongo import MongoClient
+from celery.signals import worker_process_init
+from pymongo import MongoClient, ReturnDocument
 from datetime import datetime
-import shutil
-
-# Import cloudinary utils (create a lightweight version for worker)
-import cloudinary
-import cloudinary.uploader
-
-# Configure Cloudinary in worker
-cloudinary.config(
-    cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
-    api_key=os.getenv("CLOUDINARY_API_KEY"),
-    api_secret=os.getenv("CLOUDINARY_API_SECRET"),
-    secure=True
-)
 
 # Celery configuration
 REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
 celery = Celery("worker", broker=REDIS_URL, backend=REDIS_URL)
 
+# Preload and warm up the HD pipeline in each pool process before it takes tasks
+WORKER_PRELOAD = os.getenv("WORKER_PRELOAD", "true").lower() == "true"
+WORKER_WARMUP_TIMEOUT = int(os.getenv("WORKER_WARMUP_TIMEOUT", "900"))
+
+# A pool process only reports itself up once worker_process_init handlers
+# return, so allow for the model load
+celery.conf.worker_proc_alive_timeout = WORKER_WARMUP_TIMEOUT
+
 # MongoDB connection (using pymongo for worker)
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://mongo:27017/styleweave")
 mongo = MongoClient(MONGO_URI)
 db = mongo.styleweave
 
+# Smallest long edge worth feeding to SD inpainting (native 512px)
+SD_INPUT_MIN_SIDE = int(os.getenv("SD_INPUT_MIN_SIDE", "512"))
 
-def download_file(url: str, dest: str):
-    """Download a file from URL to local path"""
-    response = requests.get(url, stream=True)
-    response.raise_for_status()
-    os.makedirs(os.path.dirname(dest), exist_ok=True)
-    with open(dest, "wb") as f:
-        for chunk in response.iter_content(chunk_size=8192):
-            f.write(chunk)
+# Cross-job batching: a task claims up to HD_BATCH_MAX queued HD jobs with the
+# same sampling settings, waiting HD_BATCH_WINDOW_MS for more to arrive
+HD_BATCH_MAX = int(os.getenv("HD_BATCH_MAX", "4"))
+HD_BATCH_WINDOW_MS = int(os.getenv("HD_BATCH_WINDOW_MS", "250"))
 
 
-def upload_file_to_cloudinary(file_path: str, folder: str = "styleweave/results"):
-    """Upload file to Cloudinary"""
+@worker_process_init.connect
+def preload_models(**kwargs):
+    """
+    Load the SD pipeline and run a tiny warm-up inference at process start
+    
+    Runs in the pool child (after fork), so CUDA is initialized in the
+    process that uses it. Tasks are only routed to the process afterwards,
+    so the first job does not pay for the load. Failures are logged and the
+    pipeline is loaded lazily on the first job instead.
+    """
+    if not WORKER_PRELOAD:
+        return
+    
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from worker.inference.inpaint_sd import warm_up
+    
+    start = time.time()
     try:
-        res = cloudinary.uploader.upload(
-            file_path,
-            folder=folder,
-            resource_type="image",
-            use_filename=True,
-            unique_filename=True
-        )
-        return res
+        warm_up()
+        print(f"HD pipeline warmed up in {time.time() - start:.1f}s")
     except Exception as e:
-        raise Exception(f"Cloudinary upload failed: {str(e)}")
+        print(f"HD pipeline warm-up failed: {e}")
+
+
+def hd_sampling(params: dict) -> dict:
+    """
+    Sampling settings of an HD job (shared by every job in a batch)
+    
+    Jobs created before presets existed have no "preset" and render with the
+    model's default scheduler.
+    """
+    return {
+        "preset": params.get("preset"),
+        "guidance_scale": params.get("guidance_scale", 7.5),
+        "steps": params.get("steps", 30),
+        "strength": params.get("strength", 0.8),
+    }
+
+
+def hd_batch_key(params: dict) -> str:
+    """
+    Key identifying HD jobs that can be rendered in one batched pipeline call
+    
+    Resolution is not part of the key: jobs whose crops denoise at different
+    sizes are split into separate pipeline calls inside the batch.
+    """
+    sampling = hd_sampling(params)
+    return ":".join(str(sampling[key]) for key in ("preset", "steps", "guidance_scale", "strength"))
+
+
+def claim_batch(leader: dict) -> list:
+    """
+    Claim queued HD jobs compatible with `leader` for one batched render
+    
+    Jobs are claimed atomically (queued -> running), oldest first, so each job
+    is rendered by exactly one task. If the batch is not full, waits once for
+    HD_BATCH_WINDOW_MS to give concurrent submissions a chance to join.
+    
+    Args:
+        leader: Job document already claimed by this task
+    
+    Returns:
+        List of additionally claimed job documents
+    """
+    claimed = []
+    if HD_BATCH_MAX <= 1:
+        return claimed
+    
+    def claim_more():
+        while len(claimed) < HD_BATCH_MAX - 1:
+            job = db.jobs.find_one_and_update(
+                {"type": "hd_render", "status": "queued", "batch_key": leader.get("batch_key")},
+                {
+                    "$set": {
+                        "status": "running",
+                        "progress": 10,
+                        "batch_leader": str(leader["_id"]),
+                        "updated_at": datetime.utcnow()
+                    }
+                },
+                sort=[("created_at", 1)],
+                return_document=ReturnDocument.AFTER
+            )
+            if not job:
+                return
+            claimed.append(job)
+    
+    claim_more()
+    if len(claimed) < HD_BATCH_MAX - 1 and HD_BATCH_WINDOW_MS > 0:
+        time.sleep(HD_BATCH_WINDOW_MS / 1000)
+        claim_more()
+    
+    return claimed
+
+
+def load_job_inputs(params: dict) -> dict:
+    """
+    Fetch the model, fabric(s) and mask(s) of an HD job
+    
+    Inputs are served from the local image cache after the first hit.
+    
+    Returns:
+        Job dict for run_inpainting_batch
+    """
+    from bson import ObjectId
+    from worker.inference.inpaint_sd import SD_CROP_TO_MASK
+    from core.image_cache import fetch_upload
+    from core.variants import select_variant, WORKING_MAX_SIDE
+    
+    def find(upload_id):
+        return db.uploads.find_one({"_id": ObjectId(upload_id)}) if upload_id else None
+    
+    model_doc = find(params["model_upload_id"])
+    if not model_doc:
+        raise Exception("Model upload not found")
+    
+    # Crop-to-mask only resizes the garment box for the UNet and pastes it
+    # back, so the composite keeps the working (EXIF-normalized) resolution
+    model_min_side = WORKING_MAX_SIDE if SD_CROP_TO_MASK else SD_INPUT_MIN_SIDE
+    inputs = {
+        "model_img_path": fetch_upload(select_variant(model_doc, model_min_side)),
+        "prompt": params.get("prompt"),
+    }
+    
+    # Fabrics at SD input resolution, masks as-is
+    for key, param in [("top_fabric_path", "top_fabric_upload_id"), ("bottom_fabric_path", "bottom_fabric_upload_id")]:
+        doc = find(params.get(param))
+        inputs[key] = fetch_upload(select_variant(doc, SD_INPUT_MIN_SIDE)) if doc else None
+    
+    for key, param in [("mask_top_path", "mask_top_id"), ("mask_bottom_path", "mask_bottom_id")]:
+        doc = find(params.get(param))
+        inputs[key] = fetch_upload(doc) if doc else None
+    
+    return inputs
+
+
+def mark_jobs(job_ids: list, fields: dict):
+    """Set fields (and updated_at) on several jobs at once"""
+    from bson import ObjectId
+    
+    db.jobs.update_many(
+        {"_id": {"$in": [ObjectId(job_id) for job_id in job_ids]}},
+        {"$set": dict(fields, updated_at=datetime.utcnow())}
+    )
 
 
 @celery.task(bind=True, max_retries=3)
@@ -62,141 +187,109 @@ def generate_hd_task(self, job_id: str):
     Generate HD render using Stable Diffusion inpainting
     
     This task:
-    1. Loads job from MongoDB
-    2. Downloads model, fabric(s), mask(s) from Cloudinary
-    3. Runs inpainting via diffusers
-    4. Uploads result to Cloudinary
-    5. Updates job status
+    1. Claims the job (skipped if another task's batch already took it)
+    2. Claims compatible queued jobs to render in the same batch
+    3. Downloads model, fabric(s), mask(s) for each job
+    4. Runs batched inpainting via diffusers
+    5. Uploads each result to Cloudinary and updates its job
     """
-    try:
-        from bson import ObjectId
-        import sys
-        sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-        from worker.inference.inpaint_sd import run_inpainting
-        
-        # Load job
-        job = db.jobs.find_one({"_id": ObjectId(job_id)})
-        if not job:
+    from bson import ObjectId
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from worker.inference.inpaint_sd import run_inpainting_batch
+    from core.cloudinary_utils import upload_file_to_cloudinary
+    
+    # Claim the job
+    job = db.jobs.find_one_and_update(
+        {"_id": ObjectId(job_id), "status": "queued"},
+        {"$set": {"status": "running", "progress": 10, "updated_at": datetime.utcnow()}},
+        return_document=ReturnDocument.AFTER
+    )
+    if not job:
+        existing = db.jobs.find_one({"_id": ObjectId(job_id)}, {"status": 1})
+        if not existing:
             raise Exception(f"Job {job_id} not found")
+        # Rendered (or being rendered) as part of another task's batch
+        return {"skipped": True, "status": existing["status"]}
+    
+    batch = [job] + claim_batch(job)
+    if len(batch) > 1:
+        print(f"Rendering batch of {len(batch)} HD jobs led by {job_id}")
+    
+    errors = {}
+    results = {}
+    out_paths = []
+    
+    try:
+        # Download inputs; a broken job fails alone
+        inputs = {}
+        for item in batch:
+            item_id = str(item["_id"])
+            try:
+                inputs[item_id] = load_job_inputs(item["params"])
+            except Exception as e:
+                errors[item_id] = str(e)
         
-        # Update status to running
-        db.jobs.update_one(
-            {"_id": ObjectId(job_id)},
-            {"$set": {"status": "running", "progress": 10, "updated_at": datetime.utcnow()}}
-        )
-        
-        params = job["params"]
-        tmp_dir = os.path.join("/tmp", uuid.uuid4().hex)
-        os.makedirs(tmp_dir, exist_ok=True)
+        ready = list(inputs)
+        mark_jobs(ready, {"progress": 30})
         
+        # Run batched inpainting (GPU)
         try:
-            # Download model image
-            model_doc = db.uploads.find_one({"_id": ObjectId(params["model_upload_id"])})
-            if not model_doc:
-                raise Exception("Model upload not found")
-            
-            model_path = os.path.join(tmp_dir, "model.jpg")
-            download_file(model_doc["cloudinary"]["secure_url"], model_path)
-            
-            # Download top fabric if provided
-            top_path = None
-            if params.get("top_fabric_upload_id"):
-                top_doc = db.uploads.find_one({"_id": ObjectId(params["top_fabric_upload_id"])})
-                if top_doc:
-                    top_path = os.path.join(tmp_dir, "top.jpg")
-                    download_file(top_doc["cloudinary"]["secure_url"], top_path)
-            
-            # Download bottom fabric if provided
-            bottom_path = None
-            if params.get("bottom_fabric_upload_id"):
-                bottom_doc = db.uploads.find_one({"_id": ObjectId(params["bottom_fabric_upload_id"])})
-                if bottom_doc:
-                    bottom_path = os.path.join(tmp_dir, "bottom.jpg")
-                    download_file(bottom_doc["cloudinary"]["secure_url"], bottom_path)
-            
-            # Download masks
-            mask_top_path = None
-            if params.get("mask_top_id"):
-                mask_top_doc = db.uploads.find_one({"_id": ObjectId(params["mask_top_id"])})
-                if mask_top_doc:
-                    mask_top_path = os.path.join(tmp_dir, "mask_top.png")
-                    download_file(mask_top_doc["cloudinary"]["secure_url"], mask_top_path)
-            
-            mask_bottom_path = None
-            if params.get("mask_bottom_id"):
-                mask_bottom_doc = db.uploads.find_one({"_id": ObjectId(params["mask_bottom_id"])})
-                if mask_bottom_doc:
-                    mask_bottom_path = os.path.join(tmp_dir, "mask_bottom.png")
-                    download_file(mask_bottom_doc["cloudinary"]["secure_url"], mask_bottom_path)
-            
-            # Update progress
-            db.jobs.update_one(
-                {"_id": ObjectId(job_id)},
-                {"$set": {"progress": 30, "updated_at": datetime.utcnow()}}
-            )
-            
-            # Run inpainting (GPU)
-            prompt = params.get("prompt", "Realistic clothing fabric matching reference")
-            out_path = run_inpainting(
-                model_img_path=model_path,
-                top_fabric_path=top_path,
-                bottom_fabric_path=bottom_path,
-                mask_top_path=mask_top_path,
-                mask_bottom_path=mask_bottom_path,
-                prompt=prompt
-            )
-            
-            # Update progress
-            db.jobs.update_one(
-                {"_id": ObjectId(job_id)},
-                {"$set": {"progress": 80, "updated_at": datetime.utcnow()}}
+            out_paths = run_inpainting_batch(
+                [inputs[item_id] for item_id in ready],
+                max_batch=HD_BATCH_MAX,
+                **hd_sampling(job["params"])
             )
-            
-            # Upload result to Cloudinary
-            folder = f"{os.getenv('CLOUDINARY_FOLDER', 'styleweave')}/results/{job.get('project_id', 'default')}"
-            res = upload_file_to_cloudinary(out_path, folder=folder)
-            
-            # Update job as done
-            db.jobs.update_one(
-                {"_id": ObjectId(job_id)},
-                {
-                    "$set": {
-                        "status": "done",
-                        "progress": 100,
-                        "result": {
-                            "cloudinary": {
-                                "public_id": res["public_id"],
-                                "secure_url": res["secure_url"],
-                                "width": res.get("width"),
-                                "height": res.get("height")
-                            }
-                        },
-                        "updated_at": datetime.utcnow()
-                    }
-                }
-            )
-            
-            return {"result": res}
+        except Exception as e:
+            for item_id in ready:
+                errors[item_id] = str(e)
+            ready = []
+        
+        mark_jobs(ready, {"progress": 80})
         
-        finally:
-            # Cleanup temporary files
+        # Upload each result to Cloudinary and fan out to its job
+        jobs_by_id = {str(item["_id"]): item for item in batch}
+        for item_id, out_path in zip(ready, out_paths):
             try:
-                if os.path.exists(tmp_dir):
-                    shutil.rmtree(tmp_dir)
+                project_id = jobs_by_id[item_id].get("project_id", "default")
+                folder = f"{os.getenv('CLOUDINARY_FOLDER', 'styleweave')}/results/{project_id}"
+                res = upload_file_to_cloudinary(out_path, folder=folder)
+                
+                mark_jobs([item_id], {
+                    "status": "done",
+                    "progress": 100,
+                    "result": {
+                        "cloudinary": {
+                            "public_id": res["public_id"],
+                            "secure_url": res["secure_url"],
+                            "width": res.get("width"),
+                            "height": res.get("height")
+                        }
+                    }
+                })
+                results[item_id] = res
+            except Exception as e:
+                errors[item_id] = str(e)
+    
+    except Exception as e:
+        for item in batch:
+            item_id = str(item["_id"])
+            if item_id not in results:
+                errors.setdefault(item_id, str(e))
+    
+    finally:
+        # Cleanup rendered outputs (inputs live in the shared image cache)
+        for out_path in out_paths:
+            try:
+                if os.path.exists(out_path):
+                    os.remove(out_path)
             except:
                 pass
+        
+        # Update failed jobs
+        for item_id, error in errors.items():
+            mark_jobs([item_id], {"status": "failed", "error": error})
     
-    except Exception as e:
-        # Update job as failed
-        db.jobs.update_one(
-            {"_id": ObjectId(job_id)},
-            {
-                "$set": {
-                    "status": "failed",
-                    "error": str(e),
-                    "updated_at": datetime.utcnow()
-                }
-            }
-        )
-        raise
-
+    if job_id in errors:
+        raise Exception(errors[job_id])
+    
+    return {"result": results[job_id], "batch": [str(item["_id"]) for item in batch]}
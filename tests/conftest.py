@@ -2,17 +2,28 @@
 Pytest configuration and fixtures
 """
 import pytest
+import io
 import os
 import sys
 from pathlib import Path
+from types import SimpleNamespace
 from unittest.mock import MagicMock
 
+from bson import ObjectId
+from PIL import Image
+from pymongo.errors import BulkWriteError
+
 # Add vercel-deploy/api to Python path for imports
 project_root = Path(__file__).parent.parent
 api_path = project_root / "vercel-deploy" / "api"
 if str(api_path) not in sys.path:
     sys.path.insert(0, str(api_path))
 
+# Add backend-deploy to Python path for core/worker imports
+backend_path = project_root / "backend-deploy"
+if str(backend_path) not in sys.path:
+    sys.path.insert(0, str(backend_path))
+
 
 @pytest.fixture
 def mock_cloudinary():
@@ -42,3 +53,129 @@ def sample_image_path(tmp_path):
     image_path.write_bytes(b"fake image data")
     return str(image_path)
 
+
+def _matches(doc, query):
+    for key, value in query.items():
+        if isinstance(value, dict) and "$in" in value:
+            if doc.get(key) not in value["$in"]:
+                return False
+        elif doc.get(key) != value:
+            return False
+    return True
+
+
+class FakeCursor:
+    """Query result iterable like a pymongo cursor, with motor's to_list"""
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    def __iter__(self):
+        return iter(self.docs)
+
+    async def to_list(self, length=None):
+        return self.docs[:length] if length else list(self.docs)
+
+
+class FakeCollection:
+    """
+    In-memory pymongo collection (equality and $in queries)
+
+    - docs: Stored documents
+    - calls: Names of the methods called, in order
+    - script: Documents find_one returns in turn instead of querying (the
+      last one repeats), for polling loops
+    - reject: Queries; documents matching one fail insert_many with a
+      duplicate key error
+    """
+
+    def __init__(self, docs=()):
+        self.docs = [dict(doc) for doc in docs]
+        self.calls = []
+        self.script = []
+        self.reject = []
+
+    def by_id(self, _id):
+        return next((doc for doc in self.docs if doc["_id"] == _id), None)
+
+    def find(self, query):
+        self.calls.append("find")
+        return FakeCursor([dict(doc) for doc in self.docs if _matches(doc, query)])
+
+    def find_one(self, query):
+        self.calls.append("find_one")
+        if self.script:
+            return self.script.pop(0) if len(self.script) > 1 else self.script[0]
+        doc = next((doc for doc in self.docs if _matches(doc, query)), None)
+        return dict(doc) if doc else None
+
+    def insert_one(self, doc):
+        self.calls.append("insert_one")
+        doc.setdefault("_id", ObjectId())
+        self.docs.append(dict(doc))
+        return SimpleNamespace(inserted_id=doc["_id"])
+
+    def insert_many(self, docs, ordered=True):
+        self.calls.append("insert_many")
+        errors, inserted = [], 0
+        for index, doc in enumerate(docs):
+            doc.setdefault("_id", ObjectId())
+            if any(_matches(doc, query) for query in self.reject):
+                errors.append({"index": index, "code": 11000, "errmsg": "E11000 duplicate key error"})
+                if ordered:
+                    break
+            else:
+                self.docs.append(dict(doc))
+                inserted += 1
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "nInserted": inserted})
+        return SimpleNamespace(inserted_ids=[doc["_id"] for doc in docs])
+
+    def update_one(self, query, update):
+        self.calls.append("update_one")
+        doc = next((doc for doc in self.docs if _matches(doc, query)), None)
+        if doc:
+            doc.update(update.get("$set", {}))
+        return SimpleNamespace(matched_count=int(doc is not None))
+
+
+class AsyncFakeCollection(FakeCollection):
+    """In-memory motor collection"""
+
+    async def find_one(self, query):
+        return super().find_one(query)
+
+    async def insert_one(self, doc):
+        return super().insert_one(doc)
+
+    async def insert_many(self, docs, ordered=True):
+        return super().insert_many(docs, ordered)
+
+    async def update_one(self, query, update):
+        return super().update_one(query, update)
+
+
+@pytest.fixture
+def fake_db():
+    """
+    Build an in-memory database
+
+    Call as fake_db(uploads=[...], jobs=[...]) with the initial documents of
+    each collection; pass sync=True for pymongo (worker) instead of motor.
+    """
+    def build(sync=False, **collections):
+        collection = FakeCollection if sync else AsyncFakeCollection
+        return SimpleNamespace(**{
+            name: collection(docs) for name, docs in collections.items()
+        })
+    return build
+
+
+@pytest.fixture
+def png():
+    """Encode a solid-color PNG: png(color=(200, 30, 30), size=(32, 32)) -> bytes"""
+    def encode(color=(200, 30, 30), size=(32, 32)):
+        buf = io.BytesIO()
+        Image.new("RGB", size, color).save(buf, "PNG")
+        return buf.getvalue()
+    return encode
@@ -0,0 +1,80 @@
+"""
+Unit tests for Cloudinary upload retries
+"""
+import io
+import json
+
+import pytest
+import cloudinary
+from core import cloudinary_utils
+
+
+class _FakeResponse:
+    def __init__(self, status, body):
+        self.status = status
+        self.data = json.dumps(body).encode("utf-8")
+
+
+class _FakeHttp:
+    """PoolManager stand-in replaying scripted Cloudinary API responses"""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = 0
+
+    def request(self, **kwargs):
+        self.calls += 1
+        return self.responses.pop(0)
+
+
+@pytest.fixture
+def fake_api(monkeypatch):
+    """Route the real SDK upload through a fake HTTP connector"""
+    config = cloudinary.config()
+    for key, value in (("cloud_name", "demo"), ("api_key", "key"), ("api_secret", "secret")):
+        monkeypatch.setattr(config, key, value, raising=False)
+    monkeypatch.setattr(cloudinary_utils, "CLOUDINARY_RETRY_BACKOFF", 0)
+
+    def install(responses):
+        http = _FakeHttp(responses)
+        monkeypatch.setattr(
+            cloudinary_utils.cloudinary.uploader, "_http", cloudinary_utils._StatusRecordingHttp(http)
+        )
+        return http
+
+    return install
+
+
+def test_upload_retries_transient_errors(fake_api):
+    """5xx / rate-limited responses are retried until the upload succeeds"""
+    http = fake_api([
+        _FakeResponse(500, {"error": {"message": "General Error"}}),
+        _FakeResponse(420, {"error": {"message": "Rate Limit Exceeded"}}),
+        _FakeResponse(200, {"public_id": "p", "secure_url": "https://res.cloudinary.com/p.jpg"}),
+    ])
+
+    res = cloudinary_utils.upload_file_to_cloudinary(io.BytesIO(b"img"), retries=3)
+
+    assert res["public_id"] == "p"
+    assert http.calls == 3
+
+
+def test_upload_does_not_retry_client_errors(fake_api):
+    """4xx responses (raised by the SDK as a plain Error) fail immediately"""
+    http = fake_api([_FakeResponse(400, {"error": {"message": "Invalid image file"}})] * 4)
+
+    with pytest.raises(Exception, match="Cloudinary upload failed: Invalid image file"):
+        cloudinary_utils.upload_file_to_cloudinary(io.BytesIO(b"not an image"), retries=3)
+    assert http.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_async_upload_runs_off_loop(monkeypatch):
+    """The async wrapper returns the upload response"""
+    monkeypatch.setattr(
+        cloudinary_utils.cloudinary.uploader, "upload",
+        lambda file, **kwargs: {"public_id": "a", "folder": kwargs["folder"]}
+    )
+
+    res = await cloudinary_utils.upload_file_to_cloudinary_async("/tmp/x.jpg", folder="f")
+    assert res == {"public_id": "a", "folder": "f"}
@@ -0,0 +1,58 @@
+"""
+Unit tests for the bounded executor
+"""
+import asyncio
+import threading
+import pytest
+from core.executor import BoundedExecutor, ExecutorBusy
+
+
+@pytest.mark.asyncio
+async def test_run_returns_result():
+    """Work runs on the pool and its result is awaited"""
+    executor = BoundedExecutor("test", max_workers=1, max_queue=0)
+    assert await executor.run(lambda a, b=0: a + b, 1, b=2) == 3
+    assert executor.pending == 0
+
+
+@pytest.mark.asyncio
+async def test_run_rejects_when_full():
+    """Jobs beyond workers + queue are rejected immediately"""
+    executor = BoundedExecutor("test", max_workers=1, max_queue=1)
+    release = threading.Event()
+
+    first = asyncio.ensure_future(executor.run(release.wait))
+    second = asyncio.ensure_future(executor.run(release.wait))
+    await asyncio.sleep(0.05)
+
+    with pytest.raises(ExecutorBusy):
+        await executor.run(release.wait)
+
+    release.set()
+    await asyncio.gather(first, second)
+    assert executor.pending == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_call_keeps_its_slot_until_work_finishes():
+    """Cancelling the awaiting coroutine does not free capacity early"""
+    executor = BoundedExecutor("test", max_workers=1, max_queue=0)
+    release = threading.Event()
+
+    running = asyncio.ensure_future(executor.run(release.wait))
+    await asyncio.sleep(0.05)
+    running.cancel()
+    await asyncio.sleep(0.05)
+
+    for _ in range(3):
+        with pytest.raises(ExecutorBusy):
+            await executor.run(release.wait)
+    assert executor.pending == 1
+
+    release.set()
+    for _ in range(100):
+        if executor.pending == 0:
+            break
+        await asyncio.sleep(0.01)
+    assert executor.pending == 0
+    assert await executor.run(lambda: "ok") == "ok"
@@ -0,0 +1,79 @@
+"""
+Unit tests for upload-time fabric textures and mip sampling
+"""
+import numpy as np
+from PIL import Image
+
+from core.fabric_texture import atlas_levels, make_fabric_texture, make_tileable, texture_source
+from worker.inference.texture_apply import sample_tiled, tile_image_to_bbox
+
+
+def _gradient(h=64, w=96):
+    ys, xs = np.mgrid[0:h, 0:w]
+    return np.stack([xs * 2, ys * 3, (xs + ys)], axis=-1).astype(np.uint8)
+
+
+def test_make_tileable_removes_wrap_seam():
+    """The jump across the tile border is no larger than inside the tile"""
+    img = _gradient()
+    tile = make_tileable(img).astype(np.int16)
+
+    wrap_x = np.abs(tile[:, 0] - tile[:, -1]).max()
+    wrap_y = np.abs(tile[0] - tile[-1]).max()
+    inner = np.abs(np.diff(tile, axis=1)).max()
+
+    assert np.abs(img[:, 0].astype(np.int16) - img[:, -1]).max() > 100
+    assert wrap_x <= inner + 1
+    assert wrap_y <= np.abs(np.diff(tile, axis=0)).max() + 1
+
+
+def test_make_fabric_texture_packs_halving_mips(tmp_path):
+    """Atlas levels halve exactly and round-trip through atlas_levels"""
+    src = tmp_path / "fabric.png"
+    Image.fromarray(_gradient(100, 150)).save(src)
+
+    texture = make_fabric_texture(str(src))
+
+    tile_w, tile_h = texture["tile"]
+    assert tile_w % 8 == 0 and tile_h % 8 == 0
+    assert [r[2:] for r in texture["mips"]] == [
+        [tile_w >> i, tile_h >> i] for i in range(len(texture["mips"]))
+    ]
+
+    atlas = np.asarray(Image.open(texture["path"]))
+    assert atlas.shape[:2] == (texture["height"], texture["width"])
+    levels = atlas_levels(atlas, texture["mips"])
+    assert levels[0].shape[:2] == (tile_h, tile_w)
+
+
+def test_sample_tiled_matches_np_tile_at_unit_scale():
+    """Modular indexing reproduces the legacy tiled canvas"""
+    swatch = _gradient(7, 11)
+
+    sampled = sample_tiled([swatch], 50, 30)
+
+    np.testing.assert_array_equal(sampled, tile_image_to_bbox(swatch, 50, 30))
+
+
+def test_sample_tiled_uses_matching_mip_level():
+    """Half scale samples level 1 directly, with its period"""
+    base = np.zeros((16, 16, 3), dtype=np.uint8)
+    level1 = np.full((8, 8, 3), 200, dtype=np.uint8)
+    level1[0, 0] = 10
+
+    sampled = sample_tiled([base, level1], 20, 20, scale=0.5, dtype=np.float32)
+
+    assert sampled.dtype == np.float32
+    assert sampled[0, 0, 0] == 10 and sampled[8, 16, 0] == 10
+    assert sampled[1, 1, 0] == 200
+
+
+def test_texture_source_only_for_textured_uploads():
+    """Uploads without a texture fall back to their variants"""
+    doc = {"_id": "abc", "type": "top_fabric", "cloudinary": {}, "variants": {}}
+    assert texture_source(doc) is None
+
+    doc["texture"] = {"secure_url": "https://x/t.jpg", "mips": [[0, 0, 8, 8]]}
+    source = texture_source(doc)
+    assert source["_id"] == "abc-texture"
+    assert source["cloudinary"] is doc["texture"]
@@ -0,0 +1,78 @@
+"""
+Unit tests for cross-job HD batching in the worker
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from worker import tasks
+
+
+class _FakeJobs:
+    """Minimal stand-in for db.jobs supporting the claim query"""
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find_one_and_update(self, query, update, sort=None, return_document=None):
+        matches = [
+            doc for doc in self.docs
+            if all(doc.get(key) == value for key, value in query.items())
+        ]
+        if sort:
+            field, _ = sort[0]
+            matches.sort(key=lambda doc: doc[field])
+        if not matches:
+            return None
+        matches[0].update(update["$set"])
+        return matches[0]
+
+
+class _FakeDb:
+    def __init__(self, docs):
+        self.jobs = _FakeJobs(docs)
+
+
+def _job(i, status="queued", batch_key="30:7.5:0.8"):
+    return {
+        "_id": f"job{i}",
+        "type": "hd_render",
+        "status": status,
+        "batch_key": batch_key,
+        "created_at": datetime(2024, 1, 1) + timedelta(seconds=i),
+    }
+
+
+@pytest.fixture
+def no_window(monkeypatch):
+    monkeypatch.setattr(tasks, "HD_BATCH_WINDOW_MS", 0)
+
+
+def test_batch_key_follows_sampling_settings():
+    """Jobs only share a key when steps, guidance and strength match"""
+    assert tasks.hd_batch_key({}) == tasks.hd_batch_key({"steps": 30, "prompt": "silk"})
+    assert tasks.hd_batch_key({"steps": 8}) != tasks.hd_batch_key({})
+
+
+def test_claim_batch_takes_compatible_queued_jobs(monkeypatch, no_window):
+    """Oldest compatible queued jobs are claimed up to the batch size"""
+    leader = _job(0, status="running")
+    docs = [leader, _job(3), _job(1), _job(2, batch_key="8:1.5:0.8"), _job(4, status="done"), _job(5)]
+    monkeypatch.setattr(tasks, "db", _FakeDb(docs))
+    monkeypatch.setattr(tasks, "HD_BATCH_MAX", 3)
+
+    claimed = tasks.claim_batch(leader)
+
+    assert [job["_id"] for job in claimed] == ["job1", "job3"]
+    assert all(job["status"] == "running" and job["batch_leader"] == "job0" for job in claimed)
+    assert docs[5]["status"] == "queued"
+
+
+def test_claim_batch_disabled_with_batch_size_one(monkeypatch, no_window):
+    """HD_BATCH_MAX=1 renders every job on its own"""
+    docs = [_job(0, status="running"), _job(1)]
+    monkeypatch.setattr(tasks, "db", _FakeDb(docs))
+    monkeypatch.setattr(tasks, "HD_BATCH_MAX", 1)
+
+    assert tasks.claim_batch(docs[0]) == []
+    assert docs[1]["status"] == "queued"
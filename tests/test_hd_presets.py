@@ -0,0 +1,63 @@
+"""
+Unit tests for HD render presets and in-place scheduler swapping
+"""
+import pytest
+
+diffusers = pytest.importorskip("diffusers")
+
+from worker.inference import inpaint_sd
+from worker.inference.presets import HD_PRESETS, HD_DRAFT_FALLBACK
+
+
+class _Pipe:
+    def __init__(self):
+        self.scheduler = diffusers.PNDMScheduler(skip_prk_steps=True)
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(inpaint_sd, "_schedulers", {})
+    monkeypatch.setattr(inpaint_sd, "_lcm_loaded", None)
+    monkeypatch.setattr(inpaint_sd, "LCM_LORA_ID", None)
+
+
+def test_presets_swap_scheduler_in_place():
+    """Each preset installs its scheduler on the same pipeline object"""
+    pipe = _Pipe()
+    default = pipe.scheduler
+
+    settings = inpaint_sd.use_preset(pipe, "standard")
+    assert settings == HD_PRESETS["standard"]
+    assert isinstance(pipe.scheduler, diffusers.DPMSolverMultistepScheduler)
+    assert pipe.scheduler.config.algorithm_type == "dpmsolver++"
+
+    inpaint_sd.use_preset(pipe, "final")
+    assert isinstance(pipe.scheduler, diffusers.UniPCMultistepScheduler)
+
+    assert inpaint_sd.use_preset(pipe, None) is None
+    assert pipe.scheduler is default
+
+
+def test_schedulers_are_reused():
+    """Switching back to a preset reuses the scheduler built earlier"""
+    pipe = _Pipe()
+    first = (inpaint_sd.use_preset(pipe, "standard"), pipe.scheduler)[1]
+    inpaint_sd.use_preset(pipe, "final")
+    inpaint_sd.use_preset(pipe, "standard")
+
+    assert pipe.scheduler is first
+
+
+def test_draft_falls_back_without_lcm_lora():
+    """Without LCM_LORA_ID the draft preset uses a short DPM-Solver++ run"""
+    pipe = _Pipe()
+
+    settings = inpaint_sd.use_preset(pipe, "draft")
+
+    assert settings == HD_DRAFT_FALLBACK
+    assert isinstance(pipe.scheduler, diffusers.DPMSolverMultistepScheduler)
+
+
+def test_unknown_preset_rejected():
+    with pytest.raises(ValueError):
+        inpaint_sd.use_preset(_Pipe(), "ultra")
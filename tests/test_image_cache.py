@@ -0,0 +1,96 @@
+"""
+Unit tests for the on-disk image cache
+"""
+import os
+import pytest
+from core.image_cache import ImageCache, cache_key_for_upload
+
+
+def test_put_and_lookup_by_key(tmp_path):
+    """Stored content is found again by key and by content hash"""
+    cache = ImageCache(root=str(tmp_path), max_bytes=1024 * 1024)
+    path = cache.put_stream("upload-1", [b"fake ", b"image"])
+
+    assert open(path, "rb").read() == b"fake image"
+    assert cache.lookup("upload-1") == path
+    assert cache.lookup(content_hash=os.path.basename(path)) == path
+    assert cache.lookup("missing") is None
+
+
+def test_identical_content_shares_blob(tmp_path):
+    """Two keys with the same bytes point at one blob"""
+    cache = ImageCache(root=str(tmp_path), max_bytes=1024 * 1024)
+    a = cache.put_stream("a", [b"same bytes"])
+    b = cache.put_stream("b", [b"same bytes"])
+
+    assert a == b
+    assert len(os.listdir(cache.blob_dir)) == 1
+
+
+def test_eviction_drops_least_recently_used(tmp_path):
+    """Blobs over budget are evicted oldest-first"""
+    cache = ImageCache(root=str(tmp_path), max_bytes=250)
+    old = cache.put_stream("old", [b"o" * 100])
+    os.utime(old, (1, 1))
+    recent = cache.put_stream("recent", [b"r" * 100])
+    cache.put_stream("new", [b"n" * 100])
+
+    assert cache.lookup("old") is None
+    assert cache.lookup("recent") == recent
+
+
+def test_fetch_hits_cache_without_network(tmp_path):
+    """A cached key is served without touching the URL"""
+    cache = ImageCache(root=str(tmp_path), max_bytes=1024 * 1024)
+    path = cache.put_stream("k", [b"cached"])
+
+    assert cache.fetch("http://invalid.invalid/image.jpg", key="k") == path
+
+
+def test_cache_key_for_upload_is_filesystem_safe():
+    """Upload keys contain no path separators"""
+    key = cache_key_for_upload({"_id": "abc", "cloudinary": {"public_id": "styleweave/model/x y"}})
+    assert "/" not in key and " " not in key
+
+
+def test_decoded_cache_evicts_by_bytes():
+    """Decoded arrays are evicted LRU once the byte budget is exceeded"""
+    import numpy as np
+    from core.image_cache import DecodedImageCache
+
+    cache = DecodedImageCache(max_bytes=250)
+    a = cache.put("a", np.zeros(100, dtype=np.uint8))
+    cache.put("b", np.zeros(100, dtype=np.uint8))
+    cache.get("a")
+    cache.put("c", np.zeros(100, dtype=np.uint8))
+
+    assert cache.get("a") is a
+    assert cache.get("b") is None
+    assert cache.current_bytes == 200
+    assert not a.flags.writeable
+
+
+@pytest.mark.asyncio
+async def test_fetch_async_streams_miss_into_cache(tmp_path, monkeypatch):
+    """An async miss is downloaded once and then served locally"""
+    import httpx
+    from core import image_cache
+
+    calls = []
+
+    def handler(request):
+        calls.append(request.url)
+        return httpx.Response(200, content=b"remote image")
+
+    monkeypatch.setattr(
+        image_cache, "_async_client", httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    )
+    cache = ImageCache(root=str(tmp_path), max_bytes=1024 * 1024)
+
+    first = await cache.fetch_async("https://cdn.example/img.jpg", key="k")
+    second = await cache.fetch_async("https://cdn.example/img.jpg", key="k")
+
+    assert first == second
+    assert open(first, "rb").read() == b"remote image"
+    assert len(calls) == 1
+    await image_cache.close_async_client()
@@ -0,0 +1,148 @@
+"""
+Unit tests for crop-to-mask inpainting
+"""
+import numpy as np
+import pytest
+from PIL import Image
+
+pytest.importorskip("diffusers")
+
+from worker.inference import inpaint_sd
+
+
+class _FakeUnet:
+    config = {"sample_size": 64}
+
+
+class _FakeOutput:
+    def __init__(self, images):
+        self.images = images
+
+
+class _FakePipe:
+    """Records call sizes and paints every frame white"""
+    unet = _FakeUnet()
+    vae_scale_factor = 8
+    scheduler = None
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, image, mask_image, height, width, **kwargs):
+        self.calls.append((width, height, [img.size for img in image]))
+        return _FakeOutput([Image.new("RGB", (width, height), (255, 255, 255)) for _ in image])
+
+
+def _write_job(tmp_path, name, size, box):
+    """Save a model image and top mask; returns a run_inpainting_batch job"""
+    model_path = tmp_path / f"{name}.png"
+    mask_path = tmp_path / f"{name}_mask.png"
+    Image.new("RGB", size, (10, 20, 30)).save(model_path)
+    mask = np.zeros((size[1], size[0]), np.uint8)
+    mask[box[1]:box[3], box[0]:box[2]] = 255
+    Image.fromarray(mask).save(mask_path)
+    return {
+        "model_img_path": str(model_path),
+        "top_fabric_path": str(model_path),
+        "mask_top_path": str(mask_path),
+        "prompt": "cotton",
+    }
+
+
+@pytest.fixture
+def fake_pipe(monkeypatch):
+    pipe = _FakePipe()
+    monkeypatch.setattr(inpaint_sd, "get_pipeline", lambda: pipe)
+    monkeypatch.setattr(inpaint_sd, "_schedulers", {})
+    return pipe
+
+
+def test_mask_bbox_pads_and_clamps():
+    """Box is padded by a fraction of its size and clamped to the image"""
+    mask = np.zeros((100, 200), np.uint8)
+    mask[10:50, 100:180] = 255
+
+    assert inpaint_sd.mask_bbox(mask, padding=0.25) == (80, 0, 200, 60)
+    assert inpaint_sd.mask_bbox(np.zeros((10, 10), np.uint8)) is None
+
+
+def test_native_size_keeps_aspect_on_latent_grid():
+    """Long edge matches native resolution, both sides multiples of 8"""
+    assert inpaint_sd.native_size((300, 150), 512) == (512, 256)
+    width, height = inpaint_sd.native_size((333, 1000), 512)
+    assert height == 512 and width % 8 == 0 and abs(width - 170) <= 8
+
+
+def test_crop_inpaint_leaves_outside_pixels_untouched(tmp_path, fake_pipe):
+    """Only the padded box around the mask is denoised and composited"""
+    job = _write_job(tmp_path, "model", (1200, 1600), (300, 400, 700, 800))
+
+    out_path, = inpaint_sd.run_inpainting_batch([job], crop_to_mask=True)
+
+    out = np.asarray(Image.open(out_path))
+    assert out.shape == (1600, 1200, 3)
+    assert fake_pipe.calls == [(512, 512, [(512, 512)])]
+    assert (out[600, 500] == 255).all()
+    assert (out[100, 100] == (10, 20, 30)).all()
+    assert (out[1500, 1100] == (10, 20, 30)).all()
+
+
+def test_crop_inpaint_skips_empty_mask(tmp_path, fake_pipe):
+    """An empty mask leaves the image as-is without running the pipeline"""
+    job = _write_job(tmp_path, "model", (64, 64), (0, 0, 0, 0))
+
+    out_path, = inpaint_sd.run_inpainting_batch([job], crop_to_mask=True)
+
+    assert fake_pipe.calls == []
+    assert (np.asarray(Image.open(out_path)) == (10, 20, 30)).all()
+
+
+def test_compatible_jobs_share_one_pipeline_call(tmp_path, fake_pipe):
+    """Jobs denoising at the same size are batched; others run separately"""
+    square_a = _write_job(tmp_path, "a", (800, 800), (100, 100, 500, 500))
+    square_b = _write_job(tmp_path, "b", (600, 600), (50, 50, 350, 350))
+    tall = _write_job(tmp_path, "c", (800, 800), (100, 100, 300, 700))
+
+    paths = inpaint_sd.run_inpainting_batch([square_a, square_b, tall], crop_to_mask=True)
+
+    assert len(paths) == 3
+    assert sorted(len(images) for _, _, images in fake_pipe.calls) == [1, 2]
+
+
+def test_hd_job_keeps_working_resolution(tmp_path, fake_pipe, monkeypatch, fake_db):
+    """The composite target is the working variant; only the crop is downscaled"""
+    from core import image_cache
+    from worker import tasks
+
+    files = {}
+    for name, size in (("working", (2048, 1536)), ("preview", (1024, 768))):
+        path = tmp_path / f"{name}.png"
+        Image.new("RGB", size, (10, 20, 30)).save(path)
+        files[name] = str(path)
+    mask = np.zeros((768, 1024), np.uint8)
+    mask[200:500, 300:700] = 255
+    files["mask"] = str(tmp_path / "mask.png")
+    Image.fromarray(mask).save(files["mask"])
+
+    def entry(name, size):
+        return {"secure_url": name, "width": size[0], "height": size[1]}
+
+    db = fake_db(sync=True, uploads=[
+        {"_id": "m", "cloudinary": {"secure_url": "original", "width": 4096, "height": 3072},
+         "variants": {"working": entry("working", (2048, 1536)), "preview": entry("preview", (1024, 768))}},
+        {"_id": "f", "cloudinary": entry("preview", (1024, 768)), "variants": {}},
+        {"_id": "k", "cloudinary": entry("mask", (1024, 768))},
+    ])
+
+    monkeypatch.setattr(tasks, "db", db)
+    monkeypatch.setattr(inpaint_sd, "SD_CROP_TO_MASK", True)
+    monkeypatch.setattr("bson.ObjectId", str)
+    monkeypatch.setattr(image_cache, "fetch_upload", lambda doc: files[doc["cloudinary"]["secure_url"]])
+
+    inputs = tasks.load_job_inputs({
+        "model_upload_id": "m", "top_fabric_upload_id": "f", "mask_top_id": "k", "prompt": "silk"
+    })
+    out_path, = inpaint_sd.run_inpainting_batch([inputs])
+
+    assert Image.open(out_path).size == (2048, 1536)
+    assert max(fake_pipe.calls[0][:2]) == 512
@@ -0,0 +1,48 @@
+"""
+Unit tests for the server-sent job events stream
+"""
+import json
+
+from bson import ObjectId
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routes import jobs
+
+
+def _client(monkeypatch, fake_db, docs):
+    db = fake_db(jobs=[])
+    db.jobs.script = list(docs)
+    monkeypatch.setattr(jobs, "db", db)
+    monkeypatch.setattr(jobs, "JOB_EVENTS_POLL_SECONDS", 0)
+    app = FastAPI()
+    app.include_router(jobs.router, prefix="/v1")
+    return TestClient(app)
+
+
+def _events(body):
+    return [
+        (block.split("\n")[0][len("event: "):], json.loads(block.split("\n")[1][len("data: "):]))
+        for block in body.strip().split("\n\n")
+    ]
+
+
+def test_events_stream_until_job_is_done(monkeypatch, fake_db):
+    """Status changes are emitted once each and the stream ends on done"""
+    oid = ObjectId()
+    running = {"_id": oid, "status": "running", "progress": 0}
+    done = {"_id": oid, "status": "done", "progress": 100, "result": {"cloudinary": {}}}
+    client = _client(monkeypatch, fake_db, [None, dict(running), dict(running), dict(done)])
+
+    response = client.get(f"/v1/job/{oid}/events")
+
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = _events(response.text)
+    assert [data["status"] for _, data in events] == ["running", "done"]
+    assert events[-1][1]["_id"] == str(oid)
+
+
+def test_events_reject_malformed_ids(monkeypatch, fake_db):
+    client = _client(monkeypatch, fake_db, [None])
+
+    assert client.get("/v1/job/not-an-id/events").status_code == 400
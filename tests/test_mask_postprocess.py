@@ -0,0 +1,76 @@
+"""
+Unit tests for mask post-processing
+"""
+import numpy as np
+
+from worker.inference import mask_postprocess
+
+
+def _legacy_select(masks, img_h, img_w):
+    """The per-mask np.where/sort heuristic the vectorized version replaces"""
+    centroids = []
+    for mask in masks:
+        ys, _ = np.where(mask)
+        centroids.append((9999 if len(ys) == 0 else ys.mean(), mask))
+    centroids.sort(key=lambda x: x[0])
+    top = [m for cy, m in centroids if cy < img_h * 0.5]
+    bottom = [m for cy, m in centroids if cy >= img_h * 0.5]
+    empty = np.zeros((img_h, img_w), dtype=np.uint8)
+    return (
+        top[0].astype(np.uint8) * 255 if top else empty,
+        bottom[0].astype(np.uint8) * 255 if bottom else empty,
+    )
+
+
+def test_select_top_bottom_matches_legacy_heuristic():
+    rng = np.random.default_rng(0)
+    masks = np.zeros((4, 120, 80), dtype=bool)
+    masks[0, 70:110, 10:70] = True
+    masks[1, 10:50, 20:60] = True
+    masks[2, 30:45, 5:15] = True
+    masks[3] = rng.random((120, 80)) > 0.995
+
+    for expected, actual in zip(_legacy_select(masks, 120, 80), mask_postprocess.select_top_bottom(masks, (120, 80))):
+        np.testing.assert_array_equal(actual, expected)
+
+
+def test_select_top_bottom_handles_no_masks():
+    top, bottom = mask_postprocess.select_top_bottom(np.zeros((0, 30, 20), dtype=bool), (30, 20))
+    assert top.shape == bottom.shape == (30, 20) and not top.any() and not bottom.any()
+
+
+def test_centroids_on_subsampled_stack():
+    masks = np.zeros((2, 2048, 1024), dtype=bool)
+    masks[0, 100:300] = True
+    centroids = mask_postprocess.mask_centroids_y(masks)
+    assert abs(centroids[0] - 199.5) <= 4 and np.isinf(centroids[1])
+
+
+def test_auto_refine_cleans_masks():
+    """Specks removed, holes filled, both trouser legs kept, edges feathered"""
+    masks = np.zeros((2, 1024, 768), dtype=np.uint8)
+    masks[0, 200:500, 150:600] = 255
+    masks[0, 300:340, 300:340] = 0          # hole
+    masks[0, 20:26, 20:26] = 255            # speck
+    masks[1, 550:1000, 180:360] = 255       # left leg
+    masks[1, 550:1000, 400:580] = 255       # right leg
+    masks[1, 980:1000, 700:720] = 255       # small stray blob
+
+    refined = mask_postprocess.auto_refine(masks, work_side=256, feather_radius=2)
+
+    assert refined.shape == masks.shape and refined.dtype == np.uint8
+    top, bottom = refined
+    assert top[320, 320] == 255 and top[23, 23] == 0
+    assert bottom[800, 250] == 255 and bottom[800, 500] == 255 and bottom[990, 710] == 0
+    edge = top[350, 140:160]
+    assert ((edge > 0) & (edge < 255)).any()
+
+
+def test_auto_refine_hard_edges_and_empty_masks():
+    masks = np.zeros((2, 64, 64), dtype=bool)
+    masks[0, 10:50, 10:50] = True
+
+    refined = mask_postprocess.auto_refine(masks, feather_radius=0)
+
+    assert set(np.unique(refined)) <= {0, 255}
+    assert refined[0, 30, 30] == 255 and not refined[1].any()
@@ -0,0 +1,89 @@
+"""
+Unit tests for click-to-refine mask decoding
+"""
+import numpy as np
+import pytest
+import torch
+
+from worker.inference import sam_segmentation
+
+
+class _DecoderOnlyPredictor:
+    """Fails if the image encoder runs; records the decoder prompts"""
+
+    device = "cpu"
+
+    def __init__(self):
+        self.calls = []
+
+    def reset_image(self):
+        pass
+
+    def set_image(self, image):
+        raise AssertionError("image encoder should not run on a cached embedding")
+
+    def predict(self, point_coords=None, point_labels=None, box=None, mask_input=None, multimask_output=True):
+        self.calls.append((point_coords, point_labels, mask_input))
+        h, w = self.original_size
+        mask = np.zeros((1, h, w), dtype=bool)
+        x, y = point_coords[0].astype(int)
+        mask[0, :y + 1, :x + 1] = True
+        return mask, np.array([0.9]), np.ones((1, 256, 256), dtype=np.float32)
+
+
+@pytest.fixture
+def cached_image(monkeypatch):
+    predictor = _DecoderOnlyPredictor()
+    monkeypatch.setattr(sam_segmentation, "_predictors", {"vit_h": predictor})
+    monkeypatch.setattr(sam_segmentation, "_predictor_tags", {"vit_h": "vit_h"})
+    monkeypatch.setattr(sam_segmentation, "_embedding_cache", sam_segmentation.OrderedDict())
+    monkeypatch.setattr(sam_segmentation, "_mask_logits", sam_segmentation.OrderedDict())
+    sam_segmentation._remember_embedding("vit_h-upload1", {
+        "features": torch.zeros(1),
+        "original_size": (40, 20),
+        "input_size": (1024, 512),
+    })
+    return predictor
+
+
+def test_refine_runs_decoder_only_with_previous_logits(cached_image):
+    """Clicks are scaled to pixels and the previous logits become mask_input"""
+    previous = np.full((1, 256, 256), 3.0, dtype=np.float32)
+
+    mask, logits = sam_segmentation.refine_mask(
+        "http://unused", "upload1",
+        points=np.array([[0.5, 0.5]]), labels=np.array([1]),
+        mask_logits=previous, model="vit_h"
+    )
+
+    coords, labels, mask_input = cached_image.calls[0]
+    np.testing.assert_allclose(coords, [[10, 20]])
+    assert mask_input is previous
+    assert mask.shape == (40, 20) and mask.dtype == np.uint8 and mask[20, 10] == 255
+    assert logits.shape == (1, 256, 256)
+
+
+def test_refine_rebuilds_mask_input_from_binary_mask(cached_image):
+    previous_mask = np.zeros((40, 20), dtype=np.uint8)
+    previous_mask[:20] = 255
+
+    sam_segmentation.refine_mask(
+        "http://unused", "upload1",
+        points=np.array([[0.1, 0.1]]), labels=np.array([0]),
+        previous_mask=previous_mask, model="vit_h"
+    )
+
+    mask_input = cached_image.calls[0][2]
+    assert mask_input.shape == (1, 256, 256)
+    # Upper half of the 512-wide image sits in the top-left of the padded frame
+    assert mask_input[0, 50, 50] > 0 and mask_input[0, 200, 50] < 0 and mask_input[0, 50, 200] < 0
+
+
+def test_mask_logits_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(sam_segmentation, "_mask_logits", sam_segmentation.OrderedDict())
+    monkeypatch.setattr(sam_segmentation, "SAM_MASK_LOGITS_CACHE_SIZE", 2)
+    for i in range(3):
+        sam_segmentation.remember_mask_logits(f"m{i}", np.zeros(1))
+
+    assert sam_segmentation.get_mask_logits("m0") is None
+    assert sam_segmentation.get_mask_logits("m2") is not None
@@ -0,0 +1,21 @@
+"""
+Unit tests for in-memory preview encoding
+"""
+import cv2
+import numpy as np
+import pytest
+
+from routes.outfit import encode_preview
+
+
+@pytest.mark.parametrize("image_format,media_type", [("jpeg", "image/jpeg"), ("webp", "image/webp")])
+def test_encode_preview_round_trips(image_format, media_type):
+    """Previews are encoded to bytes of the requested format"""
+    image = np.full((40, 60, 3), (30, 120, 200), dtype=np.uint8)
+
+    data, mime = encode_preview(image, image_format)
+
+    assert mime == media_type
+    decoded = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    assert decoded.shape == image.shape
+    assert np.abs(decoded.astype(int) - image).max() < 8
@@ -0,0 +1,100 @@
+"""
+Unit tests for superseding stale progressive preview refinements
+"""
+import numpy as np
+import pytest
+from bson import ObjectId
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routes import outfit
+
+
+@pytest.fixture
+def fake_backend(monkeypatch, fake_db):
+    db = fake_db(jobs=[], uploads=[])
+    uploads = []
+
+    async def upload(file, folder=None):
+        uploads.append(file.read())
+        return {"public_id": "p", "secure_url": "https://res.cloudinary.com/p.jpg"}
+
+    monkeypatch.setattr(outfit, "db", db)
+    monkeypatch.setattr(outfit, "upload_file_to_cloudinary_async", upload)
+    monkeypatch.setattr(outfit, "_latest_refinements", {})
+    return db.jobs, uploads
+
+
+@pytest.mark.asyncio
+async def test_stale_refinements_are_skipped(fake_backend):
+    """Only the latest progressive request for a key renders and uploads"""
+    jobs, uploads = fake_backend
+    key = ("model", "top", None)
+    renders = []
+    old, new = ObjectId(), ObjectId()
+
+    outfit._latest_refinements[key] = old
+    outfit._latest_refinements[key] = new
+
+    for job_id in (old, new):
+        await jobs.insert_one({"_id": job_id, "status": "running"})
+        await outfit._persist_preview(
+            job_id,
+            render=lambda job_id=job_id: renders.append(job_id) or b"img",
+            refinement_key=key
+        )
+
+    assert renders == [new]
+    assert uploads == [b"img"]
+    assert jobs.by_id(old)["status"] == "superseded"
+    assert jobs.by_id(old)["superseded_by"] == str(new)
+    assert jobs.by_id(new)["status"] == "done"
+    assert outfit._latest_refinements == {}
+
+
+@pytest.mark.asyncio
+async def test_refinement_superseded_while_rendering_skips_upload(fake_backend):
+    """A newer request arriving mid-render prevents the stale upload"""
+    jobs, uploads = fake_backend
+    key = ("model", "top", "bottom")
+    job_id, newer = ObjectId(), ObjectId()
+    outfit._latest_refinements[key] = job_id
+
+    def render():
+        outfit._latest_refinements[key] = newer
+        return b"img"
+
+    await jobs.insert_one({"_id": job_id, "status": "running"})
+    await outfit._persist_preview(job_id, render=render, refinement_key=key)
+
+    assert uploads == []
+    assert jobs.by_id(job_id)["status"] == "superseded"
+    assert outfit._latest_refinements == {key: newer}
+
+
+def test_progressive_job_is_recorded_before_the_response(fake_backend, monkeypatch):
+    """GET /v1/job/{id} finds the job as soon as the low-resolution image is returned"""
+    jobs, _ = fake_backend
+    model_id = ObjectId()
+    outfit.db.uploads.docs.append({"_id": model_id, "cloudinary": {"width": 64, "height": 64}})
+    deferred = []
+
+    async def load_image(source, flags=None):
+        return np.zeros((64, 64, 3), np.uint8)
+
+    async def persist(job_id, *args, **kwargs):
+        deferred.append(job_id)
+
+    monkeypatch.setattr(outfit, "load_upload_image_async", load_image)
+    monkeypatch.setattr(outfit, "_persist_preview", persist)
+    app = FastAPI()
+    app.include_router(outfit.router, prefix="/v1")
+
+    response = TestClient(app).post("/v1/outfit/apply_preview", json={
+        "project_id": "p", "model_upload_id": str(model_id), "progressive": True
+    })
+
+    job_id = ObjectId(response.headers["X-Job-Id"])
+    assert response.status_code == 200
+    assert jobs.by_id(job_id)["status"] == "running"
+    assert deferred == [job_id]
@@ -0,0 +1,56 @@
+"""
+Unit tests for readiness tracking and the /ready endpoint
+"""
+import pytest
+from fastapi.testclient import TestClient
+
+from core import readiness
+
+
+@pytest.fixture(autouse=True)
+def clean_components(monkeypatch):
+    monkeypatch.setattr(readiness, "_components", {})
+
+
+@pytest.fixture
+def client():
+    from app import app
+    return TestClient(app)
+
+
+def test_ready_without_components(client):
+    """A node with nothing to preload is ready immediately"""
+    response = client.get("/ready")
+
+    assert response.status_code == 200
+    assert response.json()["status"] == "ready"
+
+
+def test_ready_waits_for_registered_components(client):
+    """/ready is 503 until every registered component is warm; /health is not"""
+    readiness.register("sam")
+    readiness.mark_loading("sam")
+
+    assert client.get("/ready").status_code == 503
+    assert client.get("/health").status_code == 200
+
+    readiness.mark_ready("sam")
+    response = client.get("/ready")
+
+    assert response.status_code == 200
+    assert response.json()["components"]["sam"]["status"] == "ready"
+
+
+@pytest.mark.asyncio
+async def test_warm_up_records_failure():
+    """A failing warm-up keeps the node unready and reports the error"""
+    readiness.register("sam")
+
+    async def broken():
+        raise FileNotFoundError("no checkpoint")
+
+    await readiness.warm_up("sam", broken)
+    ready, components = readiness.readiness()
+
+    assert not ready
+    assert components["sam"] == {"status": "failed", "error": "no checkpoint"}
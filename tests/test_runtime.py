@@ -0,0 +1,49 @@
+"""
+Unit tests for CPU runtime sizing
+"""
+import builtins
+import io
+
+from worker.inference import runtime
+
+
+def _fake_files(monkeypatch, files):
+    real_open = builtins.open
+
+    def fake_open(path, *args, **kwargs):
+        if path in files:
+            return io.StringIO(files[path])
+        if str(path).startswith("/sys/fs/cgroup"):
+            raise FileNotFoundError(path)
+        return real_open(path, *args, **kwargs)
+
+    monkeypatch.setattr(builtins, "open", fake_open)
+
+
+def test_cgroup_v2_quota(monkeypatch):
+    """cpu.max quota/period is reported in cores"""
+    _fake_files(monkeypatch, {"/sys/fs/cgroup/cpu.max": "150000 100000\n"})
+    assert runtime.cgroup_cpu_limit() == 1.5
+
+
+def test_cgroup_v1_quota_and_unlimited(monkeypatch):
+    """v1 cfs files are used without v2; "max" means no limit"""
+    _fake_files(monkeypatch, {
+        "/sys/fs/cgroup/cpu/cpu.cfs_quota_us": "200000",
+        "/sys/fs/cgroup/cpu/cpu.cfs_period_us": "100000",
+    })
+    assert runtime.cgroup_cpu_limit() == 2.0
+
+    _fake_files(monkeypatch, {"/sys/fs/cgroup/cpu.max": "max 100000\n"})
+    assert runtime.cgroup_cpu_limit() is None
+
+
+def test_available_cpus_respects_quota_and_override(monkeypatch):
+    """The quota caps the thread count; INFERENCE_THREADS overrides it"""
+    monkeypatch.setattr(runtime, "INFERENCE_THREADS", None)
+    monkeypatch.setattr(runtime.os, "sched_getaffinity", lambda pid: set(range(16)), raising=False)
+    monkeypatch.setattr(runtime, "cgroup_cpu_limit", lambda: 2.5)
+    assert runtime.available_cpus() == 3
+
+    monkeypatch.setattr(runtime, "INFERENCE_THREADS", "6")
+    assert runtime.available_cpus() == 6
@@ -0,0 +1,153 @@
+"""
+Unit tests for SAM model selection and per-model predictor caching
+"""
+import numpy as np
+import pytest
+
+from worker.inference import sam_models
+from worker.inference import sam_segmentation
+
+
+class _FakePredictor:
+    """Records set_image calls; features stand in for an embedding"""
+
+    device = "cpu"
+
+    def __init__(self, name):
+        self.name = name
+        self.encoded = 0
+
+    def reset_image(self):
+        self.features = None
+
+    def set_image(self, image):
+        import torch
+
+        self.encoded += 1
+        self.features = torch.zeros(1)
+        self.original_size = image.shape[:2]
+        self.input_size = image.shape[:2]
+
+
+@pytest.fixture
+def fake_loaders(monkeypatch):
+    loaded = []
+
+    def loader(model, spec):
+        loaded.append(model)
+        sam_segmentation._predictor_tags[model] = model
+        return _FakePredictor(model)
+
+    monkeypatch.setattr(sam_segmentation, "_predictors", {})
+    monkeypatch.setattr(sam_segmentation, "_predictor_tags", {})
+    monkeypatch.setattr(sam_segmentation, "_embedding_cache", sam_segmentation.OrderedDict())
+    monkeypatch.setattr(sam_segmentation, "SAM_EMBEDDING_DIR", None)
+    monkeypatch.setattr(sam_segmentation, "INFERENCE_BACKEND", "torch")
+    monkeypatch.setattr(
+        sam_segmentation,
+        "_SAM_LOADERS",
+        {family: loader for family in sam_segmentation._SAM_LOADERS}
+    )
+    return loaded
+
+
+def test_resolve_quality_levels():
+    """Quality levels map to registry models; None keeps SAM_MODEL_TYPE"""
+    assert sam_models.resolve_sam_model() == sam_models.DEFAULT_SAM_MODEL
+    for quality in ("fast", "balanced", "best"):
+        assert sam_models.resolve_sam_model(quality) in sam_models.SAM_MODELS
+    with pytest.raises(ValueError):
+        sam_models.resolve_sam_model("ultra")
+
+
+def test_models_are_loaded_and_cached_independently(fake_loaders):
+    """Each model loads once and gets its own predictor and lock"""
+    fast = sam_segmentation.load_sam_model("mobile_sam")
+    best = sam_segmentation.load_sam_model("vit_h")
+
+    assert fast is not best
+    assert sam_segmentation.load_sam_model("mobile_sam") is fast
+    assert fake_loaders == ["mobile_sam", "vit_h"]
+    assert sam_segmentation.get_predictor_lock("mobile_sam") is not sam_segmentation.get_predictor_lock("vit_h")
+
+    with pytest.raises(ValueError):
+        sam_segmentation.load_sam_model("vit_xl")
+
+
+def test_embeddings_are_cached_per_model(fake_loaders):
+    """The same upload is encoded once per model, not shared across models"""
+    image = np.zeros((8, 8, 3), dtype=np.uint8)
+    fast = sam_segmentation.load_sam_model("mobile_sam")
+    best = sam_segmentation.load_sam_model("vit_h")
+
+    for _ in range(2):
+        sam_segmentation.set_image_cached(fast, "upload1", lambda: image, model="mobile_sam")
+        sam_segmentation.set_image_cached(best, "upload1", lambda: image, model="vit_h")
+
+    assert fast.encoded == 1 and best.encoded == 1
+
+
+def test_embedding_cache_is_thread_safe(monkeypatch):
+    """Concurrent lookups and inserts from several model threads keep the LRU consistent"""
+    import threading
+
+    monkeypatch.setattr(sam_segmentation, "_embedding_cache", sam_segmentation.OrderedDict())
+    monkeypatch.setattr(sam_segmentation, "SAM_EMBEDDING_CACHE_SIZE", 4)
+    monkeypatch.setattr(sam_segmentation, "SAM_EMBEDDING_DIR", None)
+    errors = []
+
+    def hammer(model):
+        try:
+            for i in range(2000):
+                key = f"{model}-{i % 7}"
+                sam_segmentation._remember_embedding(key, {"original_size": (1, 1)})
+                sam_segmentation.get_cached_embedding(f"{model}-{(i + 3) % 7}")
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=hammer, args=(m,)) for m in ("vit_h", "vit_b", "mobile_sam", "slimsam")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert len(sam_segmentation._embedding_cache) <= 4
+
+
+def test_embeddings_are_restored_from_disk(fake_loaders, monkeypatch, tmp_path):
+    """With SAM_EMBEDDING_DIR set, an embedding evicted from memory is read back from its .npz"""
+    import torch
+
+    monkeypatch.setattr(sam_segmentation, "SAM_EMBEDDING_DIR", str(tmp_path))
+    predictor = sam_segmentation.load_sam_model("vit_b")
+    predictor.set_image(np.zeros((6, 8, 3), dtype=np.uint8))
+    predictor.features = torch.arange(4, dtype=torch.float32)
+
+    sam_segmentation.store_embedding("vit_b-upload1", predictor)
+    sam_segmentation._embedding_cache.clear()
+    embedding = sam_segmentation.get_cached_embedding("vit_b-upload1")
+
+    assert (tmp_path / "vit_b-upload1.npz").exists()
+    assert torch.equal(embedding["features"], predictor.features)
+    assert embedding["original_size"] == (6, 8)
+    assert embedding["input_size"] == (6, 8)
+    assert "vit_b-upload1" in sam_segmentation._embedding_cache
+
+
+def test_unreadable_embedding_file_falls_back_to_encoding(fake_loaders, monkeypatch, tmp_path):
+    """A corrupt .npz is ignored and the image is encoded again"""
+    monkeypatch.setattr(sam_segmentation, "SAM_EMBEDDING_DIR", str(tmp_path))
+    (tmp_path / "vit_b-upload1.npz").write_bytes(b"not an npz")
+    predictor = sam_segmentation.load_sam_model("vit_b")
+
+    size = sam_segmentation.set_image_cached(
+        predictor, "upload1", lambda: np.zeros((6, 8, 3), dtype=np.uint8), model="vit_b"
+    )
+
+    assert predictor.encoded == 1
+    assert size == (6, 8)
+    # The re-encoded embedding replaces the corrupt file
+    assert sam_segmentation.get_cached_embedding("vit_b-upload1") is not None
+    sam_segmentation._embedding_cache.clear()
+    assert sam_segmentation.get_cached_embedding("vit_b-upload1") is not None
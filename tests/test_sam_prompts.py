@@ -0,0 +1,167 @@
+"""
+Unit tests for guided SAM prompts
+"""
+import numpy as np
+import pytest
+import torch
+
+from worker.inference import sam_prompts
+
+
+class _IdentityTransform:
+    def apply_coords(self, coords, original_size):
+        return coords
+
+    def apply_boxes(self, boxes, original_size):
+        return boxes
+
+
+class _BatchPredictor:
+    """Records predict_torch calls; mask i covers the rows of prompt i's box"""
+
+    device = "cpu"
+    original_size = (100, 50)
+    transform = _IdentityTransform()
+
+    def __init__(self):
+        self.calls = []
+
+    def predict_torch(self, point_coords, point_labels, boxes=None, multimask_output=True):
+        self.calls.append((point_coords, point_labels, boxes))
+        batch = point_coords.shape[0]
+        masks = torch.zeros(batch, 3, *self.original_size, dtype=torch.bool)
+        scores = torch.tensor([[0.1, 0.9, 0.5]] * batch)
+        for i in range(batch):
+            y0, y1 = int(boxes[i, 1]), int(boxes[i, 3])
+            masks[i, 1, y0:y1] = True
+        return masks, scores, None
+
+
+def test_garment_prompts_split_person_box():
+    """Top sits above bottom inside the person box, each negating the other"""
+    prompts = sam_prompts.garment_prompts((200, 100), person_box=(20, 10, 80, 190))
+    top, bottom = prompts["top"], prompts["bottom"]
+
+    assert top["box"][1] < bottom["box"][1] and top["box"][3] < bottom["box"][3]
+    assert top["box"][0] == 20 and bottom["box"][3] == 190
+    assert list(top["labels"]) == [1, 0]
+    np.testing.assert_allclose(top["points"][1], bottom["points"][0])
+
+
+def test_detector_finds_nobody_in_blank_image():
+    assert sam_prompts.detect_person_box(np.zeros((256, 128, 3), dtype=np.uint8)) is None
+
+
+def test_normalize_prompts_validates_and_scales():
+    prompts = sam_prompts.normalize_prompts({
+        "top": {"box": [0.1, 0.1, 0.9, 0.5]},
+        "bottom": {"points": [[0.5, 0.8]]},
+    })
+    assert list(prompts["bottom"]["labels"]) == [1]
+
+    scaled = sam_prompts.scale_prompts(prompts, (100, 50))
+    np.testing.assert_allclose(scaled["top"]["box"], [5, 10, 45, 50])
+    np.testing.assert_allclose(scaled["bottom"]["points"], [[25, 80]])
+
+    for bad in (
+        {"shoes": {"box": [0, 0, 1, 1]}},
+        {"top": {}},
+        {"top": {"box": [0.5, 0.5, 0.2, 0.9]}},
+        {"top": {"points": [[10, 20]]}},
+        {"top": {"points": [[0.1, 0.2]], "labels": [1, 0]}},
+    ):
+        with pytest.raises(ValueError):
+            sam_prompts.normalize_prompts(bad)
+
+
+def test_predict_garments_uses_one_batched_call():
+    """Both garments decode in one predict_torch call, padding short point lists"""
+    predictor = _BatchPredictor()
+    prompts = {
+        "top": {"box": np.array([0, 10, 50, 40], dtype=np.float32),
+                "points": np.array([[25, 25], [25, 70]], dtype=np.float32),
+                "labels": np.array([1, 0])},
+        "bottom": {"box": np.array([0, 50, 50, 95], dtype=np.float32),
+                   "points": np.array([[25, 70]], dtype=np.float32),
+                   "labels": np.array([1])},
+    }
+
+    masks = sam_prompts.predict_garments(predictor, prompts)
+
+    assert len(predictor.calls) == 1
+    coords, labels, boxes = predictor.calls[0]
+    assert coords.shape == (2, 2, 2) and labels[1].tolist() == [1, -1]
+    assert masks["top"][10:40].all() and not masks["top"][50:].any()
+    assert masks["bottom"][50:95].all() and not masks["bottom"][:50].any()
+
+
+class _CachedPredictor:
+    """Per-prompt predictor that fails if the image encoder runs"""
+
+    device = "cpu"
+
+    def reset_image(self):
+        pass
+
+    def set_image(self, image):
+        raise AssertionError("image encoder should not run on a cached embedding")
+
+    def predict(self, point_coords=None, point_labels=None, box=None, multimask_output=True):
+        h, w = self.original_size
+        return np.ones((1, h, w), dtype=bool), np.array([0.9]), None
+
+
+def test_guided_masks_skip_decode_and_detection_when_cached(monkeypatch):
+    """Repeat guided requests reuse the embedding and the detector prompts"""
+    from worker.inference import sam_segmentation
+
+    monkeypatch.setattr(sam_segmentation, "_predictors", {"vit_h": _CachedPredictor()})
+    monkeypatch.setattr(sam_segmentation, "_predictor_tags", {"vit_h": "vit_h"})
+    monkeypatch.setattr(sam_segmentation, "_embedding_cache", sam_segmentation.OrderedDict())
+    monkeypatch.setattr(sam_segmentation, "_detected_prompts", sam_segmentation.OrderedDict())
+    monkeypatch.setattr(sam_segmentation, "resolve_sam_model", lambda quality=None: "vit_h")
+    sam_segmentation._remember_embedding("vit_h-upload1", {
+        "features": torch.zeros(1),
+        "original_size": (40, 20),
+        "input_size": (1024, 512),
+    })
+
+    fetches, detections = [], []
+
+    class _Cache:
+        def fetch(self, url, key=None):
+            fetches.append(url)
+            raise AssertionError("image should not be decoded")
+
+    monkeypatch.setattr(sam_segmentation, "get_image_cache", lambda: _Cache())
+    monkeypatch.setattr(
+        sam_segmentation, "detect_person_box", lambda image: detections.append(image) or None
+    )
+    sam_segmentation._detected_prompts["upload1"] = sam_prompts.garment_prompts((40, 20))
+
+    for _ in range(2):
+        masks = sam_segmentation.run_sam_on_image_from_url(
+            "https://x/model.jpg", auto_refine=False, cache_key="upload1", mode="guided"
+        )
+        assert set(masks) == {"top", "bottom"}
+
+    assert fetches == [] and detections == []
+
+
+def test_detected_prompts_run_detector_once_per_image(monkeypatch):
+    """The first call decodes and detects; later calls hit the cache"""
+    from worker.inference import sam_segmentation
+
+    monkeypatch.setattr(sam_segmentation, "_detected_prompts", sam_segmentation.OrderedDict())
+    calls = []
+    monkeypatch.setattr(sam_segmentation, "detect_person_box", lambda image: calls.append(1) or (2, 4, 18, 36))
+
+    def load_image():
+        calls.append("decode")
+        return np.zeros((40, 20, 3), dtype=np.uint8)
+
+    first = sam_segmentation.detected_garment_prompts("k", load_image)
+    second = sam_segmentation.detected_garment_prompts("k", load_image)
+
+    assert first is second
+    assert calls == ["decode", 1]
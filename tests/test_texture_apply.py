@@ -0,0 +1,105 @@
+"""
+Unit tests for the mask-aware preview compositor
+"""
+import numpy as np
+
+from worker.inference import texture_apply
+
+
+def _scene():
+    model = np.full((120, 90, 3), 128, dtype=np.uint8)
+    model[:, 45:] = 64                      # darker right half (shadow)
+    mask = np.zeros((120, 90), dtype=np.uint8)
+    mask[30:90, 20:70] = 255
+    fabric = np.zeros((8, 8, 3), dtype=np.uint8)
+    fabric[:, :4] = (0, 0, 200)
+    fabric[:, 4:] = (200, 0, 0)
+    return model, mask, fabric
+
+
+def test_fabric_stays_inside_mask():
+    """Pixels outside the mask are untouched and inputs are not modified"""
+    model, mask, fabric = _scene()
+    before = model.copy()
+
+    out = texture_apply.apply_texture_preview_arrays(model, fabric, mask)
+
+    np.testing.assert_array_equal(out[mask == 0], model[mask == 0])
+    np.testing.assert_array_equal(model, before)
+    assert (out[mask == 255] != model[mask == 255]).any(axis=1).all()
+
+
+def test_shading_follows_original_luminance():
+    """The shadowed half of the garment renders the fabric darker"""
+    model, mask, fabric = _scene()
+    flat = np.full_like(fabric, 150)
+
+    out = texture_apply.apply_texture_preview_arrays(model, flat, mask)
+
+    assert out[60, 30].mean() > out[60, 60].mean()
+
+
+def test_scale_enlarges_swatch_and_empty_mask_is_noop():
+    model, mask, fabric = _scene()
+    neutral = np.full_like(model, 128)
+
+    small = texture_apply.apply_texture_preview_arrays(neutral, fabric, mask)
+    large = texture_apply.apply_texture_preview_arrays(neutral, fabric, mask, scale=2.0)
+
+    row_small = small[60, 20:70, 2] > small[60, 20:70, 0]
+    row_large = large[60, 20:70, 2] > large[60, 20:70, 0]
+    assert np.count_nonzero(np.diff(row_large)) < np.count_nonzero(np.diff(row_small))
+
+    empty = np.zeros_like(mask)
+    assert texture_apply.apply_texture_preview_arrays(model, fabric, empty) is model
+
+
+def test_soft_mask_edges_blend_partially():
+    model, mask, fabric = _scene()
+    mask[30:90, 19] = 128
+    white = np.full_like(fabric, 255)
+
+    out = texture_apply.apply_texture_preview_arrays(model, white, mask)
+
+    assert model[60, 19, 0] < out[60, 19, 0] < out[60, 25, 0]
+
+
+def test_layers_composite_top_and_bottom_in_one_pass():
+    """Both garments are applied; the later layer wins where masks overlap"""
+    model = np.full((120, 90, 3), 128, dtype=np.uint8)
+    top_mask = np.zeros((120, 90), dtype=np.uint8)
+    top_mask[10:60, 10:80] = 255
+    bottom_mask = np.zeros((120, 90), dtype=np.uint8)
+    bottom_mask[50:110, 10:80] = 255
+    red = np.full((4, 4, 3), (0, 0, 200), dtype=np.uint8)
+    blue = np.full((4, 4, 3), (200, 0, 0), dtype=np.uint8)
+
+    out = texture_apply.apply_texture_layers(model, [(blue, bottom_mask, 1.0), (red, top_mask, 1.0)])
+
+    assert out[30, 40, 2] > 150 and out[30, 40, 0] < 50      # top only
+    assert out[90, 40, 0] > 150 and out[90, 40, 2] < 50      # bottom only
+    assert out[55, 40, 2] > 150                              # overlap: top drawn last
+    np.testing.assert_array_equal(out[115], model[115])
+
+
+def test_layers_with_only_empty_masks_return_model():
+    model = np.full((20, 20, 3), 128, dtype=np.uint8)
+    empty = np.zeros((20, 20), dtype=np.uint8)
+    fabric = np.zeros((4, 4, 3), dtype=np.uint8)
+
+    assert texture_apply.apply_texture_layers(model, []) is model
+    assert texture_apply.apply_texture_layers(model, [(fabric, empty, 1.0)] * 2) is model
+
+
+def test_low_res_layers_keep_pattern_relative_size():
+    """Low-res composites are capped and shrink the swatch with the model"""
+    model, mask, fabric = _scene()
+    big_model = np.repeat(np.repeat(model, 4, axis=0), 4, axis=1)
+    big_mask = np.repeat(np.repeat(mask, 4, axis=0), 4, axis=1)
+    big_fabric = np.repeat(np.repeat(fabric, 4, axis=0), 4, axis=1)
+
+    out = texture_apply.apply_texture_layers_low_res(big_model, [(big_fabric, big_mask, 1.0)], 120)
+    full = texture_apply.apply_texture_preview_arrays(model, fabric, mask)
+
+    assert out.shape == full.shape
+    assert np.abs(out.astype(int) - full).mean() < 4
@@ -0,0 +1,91 @@
+"""
+Unit tests for batch uploads
+"""
+import hashlib
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routes import upload
+
+
+def test_mixed_batch_reports_per_item_status(monkeypatch, fake_db, png):
+    """New, duplicate, known and failed files each get a status; one insert_many"""
+    new, known, broken = png((255, 0, 0)), png((0, 255, 0)), png((0, 0, 255))
+    db = fake_db(uploads=[{
+        "_id": "existing-id",
+        "type": "model",
+        "content_hash": hashlib.sha256(known).hexdigest(),
+    }])
+    cloudinary_calls = []
+
+    async def fake_upload(file_path, folder=None, filename=None):
+        cloudinary_calls.append(filename)
+        if filename == "broken.png":
+            raise Exception("Cloudinary upload failed: Invalid image file")
+        return {"public_id": f"{folder}/{filename}", "secure_url": "https://res.cloudinary.com/x.png"}
+
+    monkeypatch.setattr(upload, "db", db)
+    monkeypatch.setattr(upload, "upload_file_to_cloudinary_async", fake_upload)
+    app = FastAPI()
+    app.include_router(upload.router, prefix="/v1")
+
+    response = TestClient(app).post(
+        "/v1/upload/batch",
+        files=[
+            ("files", ("a.png", new, "image/png")),
+            ("files", ("a-copy.png", new, "image/png")),
+            ("files", ("known.png", known, "image/png")),
+            ("files", ("notes.txt", b"not an image", "text/plain")),
+            ("files", ("broken.png", broken, "image/png")),
+        ],
+        data={"type": "model"}
+    )
+    body = response.json()
+
+    assert [item["status"] for item in body["items"]] == [
+        "uploaded", "deduplicated", "deduplicated", "failed", "failed"
+    ]
+    assert body["success"] is False
+    assert body["counts"] == {"uploaded": 1, "deduplicated": 2, "failed": 2}
+    assert body["items"][1]["upload"]["_id"] == body["items"][0]["upload"]["_id"]
+    assert body["items"][2]["upload"]["_id"] == "existing-id"
+    assert body["items"][3]["error"] == "File must be an image"
+    assert "Invalid image file" in body["items"][4]["error"]
+
+    # Distinct new content is uploaded once; all new documents in one insert_many
+    assert sorted(cloudinary_calls) == ["a.png", "broken.png"]
+    assert db.uploads.calls.count("insert_many") == 1
+    assert len(db.uploads.docs) == 2
+
+
+def test_partial_insert_failure_keeps_per_item_status(monkeypatch, fake_db, png):
+    """A document rejected by insert_many fails alone; the others keep their ids"""
+    good, rejected = png((255, 0, 0)), png((0, 255, 0))
+    db = fake_db(uploads=[])
+    db.uploads.reject.append({"content_hash": hashlib.sha256(rejected).hexdigest()})
+
+    async def fake_upload(file_path, folder=None, filename=None):
+        return {"public_id": f"{folder}/{filename}", "secure_url": "https://res.cloudinary.com/x.png"}
+
+    monkeypatch.setattr(upload, "db", db)
+    monkeypatch.setattr(upload, "upload_file_to_cloudinary_async", fake_upload)
+    app = FastAPI()
+    app.include_router(upload.router, prefix="/v1")
+
+    response = TestClient(app).post(
+        "/v1/upload/batch",
+        files=[
+            ("files", ("good.png", good, "image/png")),
+            ("files", ("rejected.png", rejected, "image/png")),
+            ("files", ("rejected-copy.png", rejected, "image/png")),
+        ],
+        data={"type": "model"}
+    )
+    body = response.json()
+
+    assert response.status_code == 200
+    assert [item["status"] for item in body["items"]] == ["uploaded", "failed", "failed"]
+    assert "duplicate key" in body["items"][1]["error"]
+    assert body["items"][2]["error"] == body["items"][1]["error"]
+    assert body["items"][0]["upload"]["_id"] == str(db.uploads.docs[0]["_id"])
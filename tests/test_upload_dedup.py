@@ -0,0 +1,60 @@
+"""
+Unit tests for content-hash deduplication of uploads
+"""
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routes import upload
+
+
+@pytest.fixture
+def client(monkeypatch, fake_db):
+    cloudinary_calls = []
+
+    async def fake_upload(file_path, folder=None, filename=None):
+        cloudinary_calls.append((folder, filename))
+        return {"public_id": f"{folder}/{len(cloudinary_calls)}", "secure_url": "https://res.cloudinary.com/x.png"}
+
+    monkeypatch.setattr(upload, "db", fake_db(uploads=[]))
+    monkeypatch.setattr(upload, "upload_file_to_cloudinary_async", fake_upload)
+    app = FastAPI()
+    app.include_router(upload.router, prefix="/v1")
+    return TestClient(app), cloudinary_calls
+
+
+def _post(client, content, type, filename="shirt.png"):
+    return client.post(
+        "/v1/upload",
+        files={"file": (filename, content, "image/png")},
+        data={"type": type}
+    )
+
+
+def test_identical_bytes_return_existing_upload(client, png):
+    """Re-uploading the same content skips Cloudinary and returns the first upload"""
+    client, cloudinary_calls = client
+    content = png()
+
+    first = _post(client, content, "model").json()
+    calls_after_first = len(cloudinary_calls)
+    second = _post(client, content, "model", filename="renamed.png").json()
+
+    assert first["deduplicated"] is False
+    assert second["deduplicated"] is True
+    assert second["upload"]["_id"] == first["upload"]["_id"]
+    assert len(cloudinary_calls) == calls_after_first
+
+
+def test_same_bytes_under_another_type_are_not_deduped(client, png):
+    """Dedup is per upload type"""
+    client, cloudinary_calls = client
+    content = png()
+
+    model = _post(client, content, "model").json()
+    calls_after_model = len(cloudinary_calls)
+    fabric = _post(client, content, "top_fabric").json()
+
+    assert fabric["deduplicated"] is False
+    assert fabric["upload"]["_id"] != model["upload"]["_id"]
+    assert len(cloudinary_calls) > calls_after_model
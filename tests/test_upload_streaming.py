@@ -0,0 +1,86 @@
+"""
+Unit tests for streaming upload handling
+"""
+import io
+import hashlib
+import os
+import pytest
+from fastapi import FastAPI, File, Form, HTTPException, UploadFile
+from fastapi.testclient import TestClient
+from core.body_limit import BodySizeLimitMiddleware
+from routes.upload import spool_upload
+
+
+@pytest.mark.asyncio
+async def test_spool_upload_hashes_and_measures():
+    """Spooling computes size and sha256 while copying to disk"""
+    content = b"x" * (3 * 1024 * 1024 + 17)
+    file = UploadFile(filename="big.jpg", file=io.BytesIO(content))
+
+    tmp_path, size, content_hash = await spool_upload(file, max_bytes=10 * 1024 * 1024)
+    try:
+        assert size == len(content)
+        assert content_hash == hashlib.sha256(content).hexdigest()
+        assert os.path.getsize(tmp_path) == len(content)
+    finally:
+        os.remove(tmp_path)
+
+
+@pytest.mark.asyncio
+async def test_spool_upload_rejects_oversized_file():
+    """Files over the limit raise 413 and leave no temp file behind"""
+    file = UploadFile(filename="huge.jpg", file=io.BytesIO(b"x" * 2048))
+
+    with pytest.raises(HTTPException) as exc:
+        await spool_upload(file, max_bytes=1024)
+    assert exc.value.status_code == 413
+
+
+def test_body_limit_middleware_rejects_large_content_length():
+    """Bodies declared larger than the path limit are refused before parsing"""
+    app = FastAPI()
+
+    @app.post("/v1/upload")
+    async def upload():
+        return {"ok": True}
+
+    app.add_middleware(BodySizeLimitMiddleware, limits={"/v1/upload": 100})
+    client = TestClient(app)
+
+    assert client.post("/v1/upload", content=b"x" * 50).status_code == 200
+    assert client.post("/v1/upload", content=b"x" * 500).status_code == 413
+
+
+def test_body_limit_middleware_rejects_chunked_multipart_body():
+    """Chunked bodies crossing the limit get a 413, not the form parser's 400"""
+    app = FastAPI()
+
+    @app.post("/v1/upload")
+    async def upload(file: UploadFile = File(...), type: str = Form(...)):
+        return {"ok": True}
+
+    app.add_middleware(BodySizeLimitMiddleware, limits={"/v1/upload": 1000})
+    client = TestClient(app)
+
+    boundary = "limitboundary"
+
+    def multipart(payload: bytes):
+        return (
+            f"--{boundary}\r\n"
+            'Content-Disposition: form-data; name="type"\r\n\r\nmodel\r\n'
+            f"--{boundary}\r\n"
+            'Content-Disposition: form-data; name="file"; filename="a.jpg"\r\n'
+            "Content-Type: image/jpeg\r\n\r\n"
+        ).encode() + payload + f"\r\n--{boundary}--\r\n".encode()
+
+    def chunked(body: bytes):
+        # A generator body is sent with Transfer-Encoding: chunked (no Content-Length)
+        for start in range(0, len(body), 256):
+            yield body[start:start + 256]
+
+    headers = {"content-type": f"multipart/form-data; boundary={boundary}"}
+    small = client.post("/v1/upload", content=chunked(multipart(b"x" * 100)), headers=headers)
+    large = client.post("/v1/upload", content=chunked(multipart(b"x" * 5000)), headers=headers)
+
+    assert small.status_code == 200
+    assert large.status_code == 413
@@ -0,0 +1,63 @@
+"""
+Unit tests for upload-time image variants
+"""
+from PIL import Image
+from core.variants import make_variants, select_variant
+
+
+def test_make_variants_downscales_large_images(tmp_path):
+    """Large images get working and preview variants capped by long edge"""
+    src = tmp_path / "big.jpg"
+    Image.new("RGB", (4000, 3000), (120, 80, 40)).save(src)
+
+    variants = make_variants(str(src))
+
+    assert max(variants["working"]["width"], variants["working"]["height"]) == 2048
+    assert max(variants["preview"]["width"], variants["preview"]["height"]) == 1024
+    assert Image.open(variants["preview"]["path"]).size == (1024, 768)
+
+
+def test_make_variants_applies_exif_rotation(tmp_path):
+    """EXIF-rotated images are normalized even when already small"""
+    src = tmp_path / "rotated.jpg"
+    exif = Image.Exif()
+    exif[0x0112] = 6  # rotate 90 CW on display
+    Image.new("RGB", (800, 600)).save(src, exif=exif)
+
+    variants = make_variants(str(src))
+
+    assert (variants["preview"]["width"], variants["preview"]["height"]) == (600, 800)
+
+
+def test_make_variants_skips_small_upright_images(tmp_path):
+    """Images already within the limits produce no variants"""
+    src = tmp_path / "small.png"
+    Image.new("RGB", (640, 480)).save(src)
+
+    assert make_variants(str(src)) == {}
+
+
+def test_select_variant_picks_smallest_sufficient():
+    """The smallest image meeting the requested size is chosen"""
+    doc = {
+        "_id": "abc",
+        "cloudinary": {"public_id": "orig", "secure_url": "o", "width": 6000, "height": 4000},
+        "variants": {
+            "working": {"public_id": "w", "secure_url": "w", "width": 2048, "height": 1365},
+            "preview": {"public_id": "p", "secure_url": "p", "width": 1024, "height": 683},
+        },
+    }
+
+    assert select_variant(doc, 512)["variant"] == "preview"
+    assert select_variant(doc, 1500)["variant"] == "working"
+    assert select_variant(doc, 5000)["variant"] == "original"
+    assert select_variant(doc, 512)["_id"] != doc["_id"]
+
+
+def test_select_variant_without_variants_returns_original():
+    """Legacy uploads without variants fall back to the original"""
+    doc = {"_id": "abc", "cloudinary": {"public_id": "orig", "secure_url": "o"}}
+
+    chosen = select_variant(doc, 1024)
+    assert chosen["variant"] == "original"
+    assert chosen["cloudinary"] == doc["cloudinary"]